@@ -1,6 +1,6 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
 import os
 from dotenv import load_dotenv
 from routers.upload import router as upload_router
@@ -11,11 +11,60 @@ from routers.ask_mongo import router as ask_mongo_router
 from routers.convert_frontend import router as convert_frontend_router
 from routers.insights import router as insights_router
 from routers.insights_csv import router as insights_csv_router
+from routers.metrics import router as metrics_router
+from routers.results import router as results_router
+from routers.mongo_schema import router as mongo_schema_router
+from routers.admin import router as admin_router
+from services.executor import execution_service
+from services.result_store import result_store
+from services.mongo_executor import mongo_executor
+from services.loop_monitor import loop_monitor
+from services.insight_cache import insight_cache
+from services.chat_history import conversation_compactor
+from services.rollup import rollup_cubes
+from utility.serialization import ORJSONResponse
+from utility.utils import warm_up
+from utility.timing import ServerTimingMiddleware, configure_tracing, shutdown_tracing
+from utility.log import RequestIdMiddleware, configure_logging, shutdown_logging
+import asyncio
+import pandas as pd
 
 # Load environment variables from .env file
 load_dotenv()
+# Structured logs written by a background thread, so requests never wait on stdout
+configure_logging()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Generated code runs against shallow copies of session frames (see
+    # services.executor.run_generated_code); in-process execution relies on this
+    pd.set_option("mode.copy_on_write", True)
+    # Spawn the warm code-execution workers before serving requests
+    execution_service.start()
+    # Event-loop lag sampling, reported at /metrics
+    loop_monitor.start()
+    # Pooled Mongo client for /ask-mongo execute=true; a no-op without MONGO_URI
+    await mongo_executor.start()
+    # Heavy SDKs are imported lazily; warm them in a thread so the port is bound
+    # without waiting for them (WARMUP_ON_STARTUP=0 leaves them to the first request)
+    warm_up_task = None
+    if os.getenv("WARMUP_ON_STARTUP", "1") != "0":
+        warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    yield
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+    await loop_monitor.stop()
+    await insight_cache.close()
+    await conversation_compactor.close()
+    await rollup_cubes.close()
+    await mongo_executor.close()
+    execution_service.shutdown()
+    result_store.clear()
+    shutdown_tracing()
+    shutdown_logging()
+
+# orjson-backed responses for every route, including plain dict returns
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -24,7 +73,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Request-ID"],
 )
+# Per-stage durations of each request in a Server-Timing header
+app.add_middleware(ServerTimingMiddleware)
+# Request and stage spans over OTLP when OTEL_EXPORTER_OTLP_ENDPOINT (or OTEL_TRACES_EXPORTER) is set
+configure_tracing(app)
+# Outermost, so every log record of a request carries its X-Request-ID
+app.add_middleware(RequestIdMiddleware)
 
 app.include_router(upload_router)
 app.include_router(convert_frontend_router)
@@ -34,8 +90,13 @@ app.include_router(root_router)
 app.include_router(ask_mongo_router)
 app.include_router(insights_router)
 app.include_router(insights_csv_router)
+app.include_router(metrics_router)
+app.include_router(results_router)
+app.include_router(mongo_schema_router)
+app.include_router(admin_router)
 
 if __name__ == "__main__":
+    import uvicorn
     # Get port from .env file or default to 8000 for local development
     port = int(os.getenv("PORT", 8000))
     uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""
+Peak memory of the /ask execution path on a large frame.
+
+Compares the old path (a deep df.copy() per question) with the current
+copy-on-write path in services.executor.run_generated_code, for a few
+typical generated snippets. Peak allocations are measured with tracemalloc,
+which sees NumPy buffers.
+
+    python benchmarks/ask_memory.py --rows 5000000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from services.executor import run_generated_code
+
+SNIPPETS = {
+    "groupby_sum": "result = df.groupby('region')['sales'].sum().reset_index()",
+    "filter_top": "result = df[df['sales'] > 900].nlargest(10, 'sales')",
+    "new_column": "df['margin'] = df['sales'] - df['cost']\nresult = df.groupby('region')['margin'].mean()",
+    "inplace_fill": "df['cost'] = df['cost'].fillna(0)\nresult = df['cost'].describe()",
+}
+
+
+def make_frame(rows):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "region": rng.choice(["north", "south", "east", "west"], rows),
+        "product": rng.integers(0, 1000, rows),
+        "sales": rng.random(rows) * 1000,
+        "cost": rng.random(rows) * 800,
+        "units": rng.integers(1, 50, rows),
+        "date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D"),
+    })
+
+
+def old_path(code, df):
+    local_vars = {"df": df.copy()}
+    exec(code, {"pd": pd, "np": np}, local_vars)
+    return local_vars
+
+
+def measure(func, code, df):
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    func(code, df)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    return (peak - before) / 1024 / 1024, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    args = parser.parse_args()
+    # As in the server (app lifespan)
+    pd.set_option("mode.copy_on_write", True)
+
+    df = make_frame(args.rows)
+    frame_mb = df.memory_usage(deep=True).sum() / 1024 / 1024
+    print(f"frame: {args.rows:,} rows, {frame_mb:,.0f} MB\n")
+    print(f"{'snippet':<14} {'copy peak MB':>13} {'cow peak MB':>12} {'copy s':>8} {'cow s':>8}")
+
+    tracemalloc.start()
+    for name, code in SNIPPETS.items():
+        old_mb, old_s = measure(old_path, code, df)
+        new_mb, new_s = measure(run_generated_code, code, df)
+        print(f"{name:<14} {old_mb:>13,.0f} {new_mb:>12,.0f} {old_s:>8.2f} {new_s:>8.2f}")
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Cost to the request of a log line: print() against the queued logging in utility.log.
+
+Both write a chat-sized payload to the same slow sink, which sleeps for
+--sink-delay-us on every write like a busy pipe or log collector. print()
+pays for the write on the calling thread; a logger.info() call only stamps,
+truncates and enqueues the record, and the writer thread pays for formatting
+and the write. Reported are the per-call latencies seen by the caller, and
+how long the writer then took to drain the queue.
+
+    python benchmarks/logging_overhead.py --calls 2000 --payload-chars 20000
+"""
+import argparse
+import logging
+import logging.handlers
+import os
+import queue
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utility.log import JsonFormatter, QueueLogHandler
+
+
+class SlowSink:
+    def __init__(self, delay_s):
+        self.delay_s = delay_s
+        self.written = 0
+
+    def write(self, text):
+        time.sleep(self.delay_s)
+        self.written += len(text)
+
+    def flush(self):
+        pass
+
+
+def caller_latencies(func, calls):
+    timings = []
+    for i in range(calls):
+        start = time.perf_counter()
+        func(i)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+
+def summary(timings):
+    timings = sorted(timings)
+    return f"mean {statistics.fmean(timings):9.1f} us   p99 {timings[int(0.99 * (len(timings) - 1))]:9.1f} us"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--payload-chars", type=int, default=20_000)
+    parser.add_argument("--sink-delay-us", type=float, default=200)
+    parser.add_argument("--max-field-chars", type=int, default=2000)
+    args = parser.parse_args()
+    payload = "x" * args.payload_chars
+
+    print_sink = SlowSink(args.sink_delay_us / 1e6)
+    printed = caller_latencies(lambda i: print(f"Raw AI response: {payload}", file=print_sink), args.calls)
+
+    log_sink = SlowSink(args.sink_delay_us / 1e6)
+    stream = logging.StreamHandler(log_sink)
+    stream.setFormatter(JsonFormatter())
+    handler = QueueLogHandler(queue.Queue(maxsize=args.calls), args.max_field_chars)
+    listener = logging.handlers.QueueListener(handler.queue, stream)
+    logger = logging.getLogger("benchmark")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    listener.start()
+    logged = caller_latencies(lambda i: logger.info("Raw AI response", extra={"response": payload}), args.calls)
+    drain_start = time.perf_counter()
+    listener.stop()
+    drain_ms = (time.perf_counter() - drain_start) * 1000
+
+    print(f"{args.calls} calls, {args.payload_chars:,}-char payload, sink delay {args.sink_delay_us:.0f} us per write")
+    print(f"print():        {summary(printed)}   ({print_sink.written:,} chars written)")
+    print(f"queued logging: {summary(logged)}   ({log_sink.written:,} chars written, {handler.dropped} dropped)")
+    print(f"writer thread drained the rest in {drain_ms:.0f} ms after the last call")
+
+
+if __name__ == "__main__":
+    main()
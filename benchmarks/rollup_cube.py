@@ -0,0 +1,75 @@
+"""
+Group-by answers from the rollup cube against running the generated code.
+
+Builds services.rollup.RollupCube over a synthetic sales frame, then times
+typical generated group-by snippets both through run_generated_code and
+through answer_from_cube, checking that the two results are equal.
+
+    python benchmarks/rollup_cube.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from services.executor import run_generated_code
+from services.rollup import RollupCube, answer_from_cube
+
+SNIPPETS = {
+    "sum_top": "result = df.groupby('region')['sales'].sum().reset_index().sort_values('sales', ascending=False).head(3)",
+    "two_keys_mean": "result = df.groupby(['region', 'channel'])['sales'].mean()",
+    "named_agg": "result = df.groupby('product').agg(total=('sales', 'sum'), orders=('units', 'count')).nlargest(5, 'total')",
+    "size": "result = df.groupby('channel').size()",
+    "agg_list": "result = df.groupby('region')['units'].agg(['sum', 'min', 'max'])",
+    "median": "result = df.groupby('region')['sales'].median()",
+}
+
+
+def make_frame(rows):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "region": rng.choice(["north", "south", "east", "west"], rows),
+        "channel": rng.choice(["online", "store", "partner"], rows),
+        "product": rng.integers(0, 500, rows),
+        "sales": rng.random(rows) * 1000,
+        "units": rng.integers(1, 50, rows),
+    })
+    df.loc[rng.random(rows) < 0.02, "sales"] = np.nan
+    return df
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    value = func(*args)
+    return value, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    # As in the server (app lifespan)
+    pd.set_option("mode.copy_on_write", True)
+
+    df = make_frame(args.rows)
+    cube, build_s = timed(RollupCube, df, 1)
+    print(f"frame: {args.rows:,} rows; cube: {len(cube.cuboids)} cuboids, {cube.cells:,} cells, "
+          f"{cube.nbytes() / 1024 / 1024:,.1f} MB, built in {build_s:.2f} s\n")
+    print(f"{'snippet':<14} {'exec ms':>9} {'cube ms':>9} {'speedup':>8}  result")
+
+    for name, code in SNIPPETS.items():
+        expected, exec_s = timed(run_generated_code, code, df)
+        answer, cube_s = timed(answer_from_cube, cube, code)
+        if answer is None:
+            print(f"{name:<14} {exec_s * 1000:>9.1f} {'-':>9} {'-':>8}  not in cube")
+            continue
+        outcome = "equal" if answer.equals(expected) else "DIFFERENT"
+        print(f"{name:<14} {exec_s * 1000:>9.1f} {cube_s * 1000:>9.2f} {exec_s / cube_s:>7.0f}x  {outcome}")
+
+
+if __name__ == "__main__":
+    main()
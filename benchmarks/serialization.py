@@ -0,0 +1,85 @@
+"""
+Response serialization: the previous path against utility.serialization.
+
+Old path: df.replace({nan: None}) -> to_dict('records') -> sanitize_for_json
+-> stdlib json as used by JSONResponse. New path: frame_to_records -> orjson.
+The frame is 10k rows x 50 columns of floats with NaNs, ints, strings and
+booleans (the old path cannot serialize Timestamps at all, so datetime
+columns are timed for the new path only).
+
+    python benchmarks/serialization.py --rows 10000 --cols 50
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from utility.serialization import dumps, frame_to_records
+from utility.utils import sanitize_for_json
+
+
+def make_frame(rows, cols):
+    rng = np.random.default_rng(0)
+    data = {}
+    for i in range(cols):
+        kind = i % 4
+        if kind == 0:
+            values = rng.random(rows)
+            values[rng.random(rows) < 0.1] = np.nan
+        elif kind == 1:
+            values = rng.integers(0, 1_000_000, rows)
+        elif kind == 2:
+            values = rng.choice(["north", "south", "east", "west", None], rows)
+        else:
+            values = rng.random(rows) < 0.5
+        data[f"col_{i}"] = values
+    return pd.DataFrame(data)
+
+
+def old_path(df):
+    records = sanitize_for_json(df.replace({np.nan: None}).to_dict(orient="records"))
+    # What starlette's JSONResponse.render does
+    return json.dumps(records, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def new_path(df):
+    return dumps(frame_to_records(df))
+
+
+def best_of(func, df, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(df)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--cols", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.cols)
+    assert json.loads(old_path(df)) == json.loads(new_path(df)), "paths disagree"
+
+    old_s = best_of(old_path, df, args.repeat)
+    new_s = best_of(new_path, df, args.repeat)
+    print(f"frame: {args.rows:,} x {args.cols}")
+    print(f"old path (replace/to_dict/sanitize/json): {old_s * 1000:8.1f} ms")
+    print(f"new path (frame_to_records/orjson):       {new_s * 1000:8.1f} ms")
+    print(f"speedup: {old_s / new_s:.1f}x")
+
+    dated = df.assign(**{f"date_{i}": pd.date_range("2024-01-01", periods=args.rows, freq="h") for i in range(5)})
+    print(f"new path with 5 datetime columns added:    {best_of(new_path, dated, args.repeat) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
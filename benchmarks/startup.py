@@ -0,0 +1,138 @@
+"""
+Cold-start cost of the API: import time of app.py and time until the port accepts connections.
+
+Import time comes from `python -X importtime -c "import app"` in a fresh
+interpreter, summed per top-level package so the heaviest imports are listed.
+Time-to-listening starts uvicorn on a free port in a fresh process and polls
+until GET / answers. Every measurement is repeated and the median is
+reported; with thresholds set the script exits with status 1 when a median is
+over its limit, so it can gate CI against startup regressions.
+
+    python benchmarks/startup.py --runs 5
+    python benchmarks/startup.py --max-import-ms 1500 --max-listen-ms 3000 --json
+"""
+import argparse
+import collections
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)")
+
+
+def _env():
+    env = dict(os.environ)
+    # The warm-up thread runs after the port is bound; keep it from competing with the measurement
+    env.setdefault("WARMUP_ON_STARTUP", "0")
+    env.setdefault("PYTHONDONTWRITEBYTECODE", "1")
+    return env
+
+
+def measure_import():
+    """(total ms, {top-level package: self ms}) for one fresh `import app`"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT, env=_env(), capture_output=True, text=True, check=True
+    )
+    packages = collections.Counter()
+    total = 0
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, module = int(match.group(1)), int(match.group(2)), match.group(3)
+        packages[module.split(".")[0]] += self_us
+        if module == "app":
+            total = cumulative_us
+    return total / 1000, {name: us / 1000 for name, us in packages.items()}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_listen(timeout):
+    """Milliseconds from process start until GET / succeeds"""
+    port = _free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited early:\n{process.stderr.read().decode()}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    response.read()
+                return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"server did not answer within {timeout:g}s")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="heaviest packages to list")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for the server")
+    parser.add_argument("--max-import-ms", type=float, help="fail if the median import time is above this")
+    parser.add_argument("--max-listen-ms", type=float, help="fail if the median time-to-listening is above this")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    imports, packages = [], collections.defaultdict(list)
+    for _ in range(args.runs):
+        total, per_package = measure_import()
+        imports.append(total)
+        for name, ms in per_package.items():
+            packages[name].append(ms)
+    listens = [measure_listen(args.timeout) for _ in range(args.runs)]
+
+    heaviest = sorted(((statistics.median(v), k) for k, v in packages.items()), reverse=True)[:args.top]
+    report = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "import_ms": {"median": statistics.median(imports), "min": min(imports), "max": max(imports)},
+        "listen_ms": {"median": statistics.median(listens), "min": min(listens), "max": max(listens)},
+        "heaviest_packages_ms": {name: round(ms, 1) for ms, name in heaviest},
+    }
+    failures = []
+    if args.max_import_ms is not None and report["import_ms"]["median"] > args.max_import_ms:
+        failures.append(f"import time {report['import_ms']['median']:.0f} ms > {args.max_import_ms:g} ms")
+    if args.max_listen_ms is not None and report["listen_ms"]["median"] > args.max_listen_ms:
+        failures.append(f"time-to-listening {report['listen_ms']['median']:.0f} ms > {args.max_listen_ms:g} ms")
+    report["failures"] = failures
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, label in (("import_ms", "import app"), ("listen_ms", "time-to-listening")):
+            stats = report[key]
+            print(f"{label:<18} median {stats['median']:7.0f} ms   min {stats['min']:7.0f}   max {stats['max']:7.0f}")
+        print("\nheaviest packages (self time, median):")
+        for name, ms in report["heaviest_packages_ms"].items():
+            print(f"  {name:<24} {ms:8.1f} ms")
+        for failure in failures:
+            print(f"\nREGRESSION: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+A local stand-in for the Gemini REST API, for load tests that must not spend quota.
+
+Serves POST /v1beta/models/{model}:generateContent in the REST wire format the
+google-generativeai SDK uses with transport="rest". Each prompt is classified by
+the template it was built from (pandas code, SQL, Mongo query, insights JSON,
+colour JSON, chat, ...) and answered with a canned response of that kind after
+a latency drawn from that kind's distribution. Start the app with
+
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8765 GEMINI_API_KEY=fake uvicorn app:app
+
+and the fake with
+
+    python loadtest/fake_gemini.py --port 8765 --profile profile.json --seed 1
+
+A profile is JSON overriding DEFAULT_PROFILE, e.g.
+{"latency": {"pandas": "lognormal:1200:0.5"}, "error_rate": {"colour": 0.05}}.
+Latency specs are "fixed:MS", "uniform:LOW:HIGH", "normal:MEAN:STD" and
+"lognormal:MEDIAN:SIGMA" (milliseconds). GET /stats reports calls per kind.
+"""
+import argparse
+import ast
+import asyncio
+import collections
+import json
+import math
+import random
+import re
+import zlib
+
+from fastapi import FastAPI, HTTPException, Request
+
+# Prompt kinds, recognised by a phrase of the template that built the prompt; first match wins
+PROMPT_KINDS = (
+    ("translation", "Translate the following"),
+    ("codefix", "fixing broken data analysis code"),
+    ("pandas", "generating pandas code"),
+    ("sql", "DuckDB SQL query"),
+    ("mongo", "MongoDB query generator"),
+    ("frontend", "Convert the following MongoDB query result"),
+    ("colour", "suggest an appropriate hex color code"),
+    ("insights", "insightful questions"),
+    ("chat", "continuing a conversation about data analysis"),
+    ("deeper_insights", "personal data scientist"),
+    ("summary", "interpret the responses of database queries"),
+)
+
+DEFAULT_PROFILE = {
+    # Roughly what gemini-2.0-flash takes for each kind of answer
+    "latency": {
+        "default": "lognormal:900:0.4",
+        "translation": "lognormal:350:0.3",
+        "colour": "lognormal:600:0.3",
+        "insights": "lognormal:1500:0.4",
+        "deeper_insights": "lognormal:4000:0.35",
+        "chat": "lognormal:2500:0.4",
+        "summary": "lognormal:3000:0.35",
+    },
+    # Fraction of calls per kind answered with HTTP 500 instead
+    "error_rate": {},
+    # Fixed response text per kind; replaces the built-in canned answer
+    "responses": {},
+}
+
+_PANDAS_TEMPLATES = (
+    "result = df.groupby({label!r})[{value!r}].sum().reset_index()",
+    "result = df.groupby({label!r})[{value!r}].mean().nlargest(10).reset_index()",
+    "result = df.nlargest(20, {value!r})[[{label!r}, {value!r}]]",
+    "top = df.groupby({label!r})[{value!r}].agg(['sum', 'count']).reset_index()\n"
+    "result = top.sort_values('sum', ascending=False).head(15)",
+    "result = df[{value!r}].describe().reset_index()",
+)
+_SQL_TEMPLATES = (
+    'SELECT "{label}" AS category, SUM("{value}") AS value FROM {table} GROUP BY 1 ORDER BY 2 DESC',
+    'SELECT "{label}" AS category, AVG("{value}") AS value FROM {table} GROUP BY 1 ORDER BY 2 DESC LIMIT 10',
+    'SELECT "{label}", "{value}" FROM {table} ORDER BY "{value}" DESC LIMIT 20',
+)
+_PALETTE = ("#AEC6CF", "#FFD1DC", "#B5EAD7", "#FFDAC1", "#E2F0CB", "#C7CEEA", "#F3E5AB", "#D4F0F0")
+
+
+def latency_sampler(spec, rng):
+    """Callable returning one latency in milliseconds for a spec such as "lognormal:900:0.4" """
+    kind, *args = str(spec).split(":")
+    args = [float(a) for a in args]
+    if kind == "fixed" and len(args) == 1:
+        return lambda: args[0]
+    if kind == "uniform" and len(args) == 2:
+        return lambda: rng.uniform(args[0], args[1])
+    if kind == "normal" and len(args) == 2:
+        return lambda: max(0.0, rng.gauss(args[0], args[1]))
+    if kind == "lognormal" and len(args) == 2:
+        return lambda: rng.lognormvariate(math.log(args[0]), args[1])
+    raise ValueError(f"Unknown latency spec {spec!r}")
+
+
+def classify(prompt):
+    for kind, marker in PROMPT_KINDS:
+        if marker in prompt:
+            return kind
+    return "text"
+
+
+def _literal(prompt, name):
+    """A Python literal after "- {name}:" in a prompt, e.g. the column list"""
+    match = re.search(rf"- {name}: (.*)", prompt)
+    if not match:
+        return None
+    try:
+        return ast.literal_eval(match.group(1).strip())
+    except (ValueError, SyntaxError):
+        return None
+
+
+def _columns(prompt):
+    """A label column and a numeric column from the prompt's column and dtype listing"""
+    columns = _literal(prompt, "Columns") or ["category"]
+    dtypes = _literal(prompt, "Dtypes") or {}
+    numeric = [c for c in columns if re.match(r"(int|float|uint)", str(dtypes.get(c, "")))]
+    labels = [c for c in columns if c not in numeric] or columns
+    return labels[0], (numeric or columns)[0]
+
+
+def _pick(options, prompt):
+    # Stable across runs and processes, unlike hash()
+    return options[zlib.crc32(prompt.encode("utf-8")) % len(options)]
+
+
+def canned_response(kind, prompt):
+    if kind == "translation":
+        return prompt.rsplit("explanations:", 1)[-1].strip()
+    if kind in ("pandas", "codefix"):
+        label, value = _columns(prompt)
+        code = _pick(_PANDAS_TEMPLATES, prompt).format(label=label, value=value)
+        return f"```python\n{code}\n```"
+    if kind == "sql":
+        label, value = _columns(prompt)
+        table = re.search(r"- Table name: (\S+)", prompt)
+        table = table.group(1) if table else "data"
+        return f"```sql\n{_pick(_SQL_TEMPLATES, prompt).format(label=label, value=value, table=table)}\n```"
+    if kind == "mongo":
+        return ('db.orders.aggregate([{$match: {status: "completed"}}, '
+                '{$group: {_id: "$region", total: {$sum: "$amount"}}}, {$sort: {total: -1}}, {$limit: 10}])')
+    if kind == "frontend":
+        return json.dumps([{"category": "North", "value": 120}, {"category": "South", "value": 95}])
+    if kind == "colour":
+        return json.dumps([{"color": _PALETTE[i % len(_PALETTE)]} for i in range(200)])
+    if kind == "insights":
+        return json.dumps({"question": [
+            "Which category brings in the most revenue?",
+            "How do sales change month over month?",
+            "Which region has the highest average order value?",
+            "What are the top 5 products by units sold?",
+        ]})
+    if kind in ("deeper_insights", "chat", "summary"):
+        return ("## Key findings\n\n"
+                "1. Revenue is concentrated in a few categories, which account for most of the total.\n"
+                "2. Sales grow steadily through the year with a peak in the fourth quarter.\n"
+                "3. Average order value varies little between regions.\n\n"
+                "## Recommendations\n\n"
+                "- Focus inventory on the leading categories.\n"
+                "- Plan promotions ahead of the seasonal peak.\n")
+    return "OK"
+
+
+def create_app(profile=None, seed=0):
+    profile = {key: {**value, **((profile or {}).get(key) or {})} for key, value in DEFAULT_PROFILE.items()}
+    rng = random.Random(seed)
+    samplers = {kind: latency_sampler(spec, rng) for kind, spec in profile["latency"].items()}
+    calls = collections.Counter()
+    errors = collections.Counter()
+    app = FastAPI()
+
+    @app.post("/{version}/models/{model_method}")
+    async def generate_content(version: str, model_method: str, request: Request):
+        model, _, method = model_method.partition(":")
+        if method != "generateContent":
+            raise HTTPException(status_code=404, detail=f"Unsupported method {method!r}")
+        body = await request.json()
+        prompt = "\n".join(
+            part.get("text", "")
+            for content in body.get("contents", [])
+            for part in content.get("parts", [])
+        )
+        kind = classify(prompt)
+        calls[kind] += 1
+        await asyncio.sleep(samplers.get(kind, samplers["default"])() / 1000)
+        if rng.random() < float(profile["error_rate"].get(kind, 0)):
+            errors[kind] += 1
+            raise HTTPException(status_code=500, detail="Injected fake Gemini error")
+        text = profile["responses"].get(kind) or canned_response(kind, prompt)
+        prompt_tokens, output_tokens = len(prompt) // 4, len(text) // 4
+        return {
+            "candidates": [{
+                "content": {"parts": [{"text": text}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": output_tokens,
+                "totalTokenCount": prompt_tokens + output_tokens,
+            },
+            "modelVersion": model,
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return {"calls": dict(calls), "errors": dict(errors)}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--profile", help="JSON file overriding DEFAULT_PROFILE")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    profile = None
+    if args.profile:
+        with open(args.profile) as f:
+            profile = json.load(f)
+
+    import uvicorn
+    uvicorn.run(create_app(profile, args.seed), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
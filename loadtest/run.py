@@ -0,0 +1,471 @@
+"""
+End-to-end load test of the API against the fake Gemini server.
+
+Boots loadtest/fake_gemini.py and the app (uvicorn app:app, pointed at the fake
+with GEMINI_API_ENDPOINT) on free ports, then runs --concurrency virtual users.
+Each user has its own session and a seeded random stream, and makes
+--requests / --concurrency requests drawn from --mix: uploads, /ask questions
+(pandas or SQL mode), /deeper-insights-csv analyses, follow-up chat and
+/ask-mongo. A user's first /ask uploads its dataset and its first chat
+message runs an analysis, as a browser session would. With the same seed,
+mix and request count every run sends the same requests in the same order
+per user, so reports from two releases can be compared.
+
+While the load runs, the RSS of the app process tree (workers included) and
+the event-loop lag from /metrics are sampled every --sample-interval seconds.
+The JSON report has throughput, p50/p95/p99 latency per endpoint, the LLM
+calls the fake served, and the RSS and loop-lag timeline.
+
+    python loadtest/run.py --requests 400 --concurrency 16 --output report.json
+    python loadtest/run.py --compare report.json --max-regression 15
+"""
+import argparse
+import asyncio
+import collections
+import io
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = {"upload": 1, "ask": 6, "ask_sql": 1, "deeper_insights": 1, "chat": 3, "ask_mongo": 0.5}
+
+ASK_QUESTIONS = (
+    "What is the total revenue by region?",
+    "Which categories sell the most units?",
+    "Show the top 10 products by revenue",
+    "What is the average price per category?",
+    "How does revenue change month over month?",
+    "Which region has the highest average order value?",
+    "Compare units sold across regions",
+    "What are the 20 largest orders?",
+)
+INSIGHT_QUESTIONS = (
+    "Give me an overview of sales performance",
+    "What drives revenue in this data?",
+    "Where should we focus next quarter?",
+)
+CHAT_QUESTIONS = (
+    "Can you break that down by region?",
+    "Which product should we promote?",
+    "Is there any seasonality?",
+    "What are the risks in these numbers?",
+)
+MONGO_QUESTIONS = (
+    "Total completed order amount per region",
+    "Top customers by number of orders",
+)
+MONGO_SCHEMA = json.dumps({"collections": {
+    "orders": {
+        "fields": {"_id": "ObjectId", "customer_id": "ObjectId", "region": "string", "status": "string",
+                   "amount": "double", "created_at": "date"},
+        "indexes": [{"key": {"status": 1, "created_at": -1}}],
+    },
+    "customers": {"fields": {"_id": "ObjectId", "name": "string", "region": "string"}, "indexes": []},
+}})
+
+
+def make_dataset(rows, seed):
+    """CSV bytes of a synthetic sales table"""
+    rng = np.random.default_rng(seed)
+    units = rng.integers(1, 20, rows)
+    price = rng.gamma(2.0, 25.0, rows).round(2)
+    frame = pd.DataFrame({
+        "order_date": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 730, rows), unit="D"),
+        "region": rng.choice(["North", "South", "East", "West", "Central"], rows),
+        "category": rng.choice(["Books", "Garden", "Toys", "Kitchen", "Sports", "Beauty", "Music", "Office"], rows),
+        "product": np.char.add("P-", rng.integers(1, 60, rows).astype(str)),
+        "units": units,
+        "price": price,
+        "revenue": (units * price).round(2),
+    }).sort_values("order_date")
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, date_format="%Y-%m-%d")
+    return buffer.getvalue().encode("utf-8")
+
+
+def parse_mix(text):
+    mix = dict(DEFAULT_MIX)
+    for item in filter(None, (text or "").split(",")):
+        name, _, weight = item.partition("=")
+        if name not in DEFAULT_MIX:
+            raise SystemExit(f"Unknown mix entry {name!r}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def latency_summary(samples):
+    return {
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "mean": statistics.fmean(samples) if samples else None,
+        "max": max(samples) if samples else None,
+    }
+
+
+def process_tree_rss(pid):
+    """Resident set size in bytes of a process and all its descendants (Linux /proc)"""
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            continue
+    return total
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(process, url, timeout):
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            process.stderr.seek(0)
+            raise RuntimeError(f"{url} exited early:\n{process.stderr.read().decode()}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.05)
+    raise RuntimeError(f"{url} did not answer within {timeout:g}s")
+
+
+def _start(args, env, url, timeout):
+    # stderr goes to a file: an unread pipe would block the server once it fills up
+    process = subprocess.Popen(args, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=tempfile.TemporaryFile())
+    try:
+        _wait_until_up(process, url, timeout)
+    except Exception:
+        _stop(process)
+        raise
+    return process
+
+
+def _stop(process):
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+class VirtualUser:
+    """One browser session: its own session id, dataset and seeded request stream"""
+
+    def __init__(self, index, seed, mix, dataset):
+        self.session_id = f"loadtest-{seed}-{index}"
+        self.rng = random.Random(seed * 100003 + index)
+        self.mix = mix
+        self.dataset = dataset
+        self.uploaded = False
+        self.analysed = False
+
+    def next_request(self):
+        name = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        if name in ("ask", "ask_sql") and not self.uploaded:
+            name = "upload"
+        elif name == "chat" and not self.analysed:
+            name = "deeper_insights"
+        return name
+
+    def build(self, name):
+        """(path, form data, files) for a request of the given kind"""
+        if name == "upload":
+            self.uploaded = True
+            return "/upload", {"session_id": self.session_id}, {"file": ("sales.csv", self.dataset, "text/csv")}
+        if name in ("ask", "ask_sql"):
+            data = {"question": self.rng.choice(ASK_QUESTIONS), "session_id": self.session_id, "language": "en-US",
+                    "mode": "sql" if name == "ask_sql" else "pandas"}
+            return "/ask", data, None
+        if name == "deeper_insights":
+            self.analysed = True
+            data = {"question": self.rng.choice(INSIGHT_QUESTIONS), "language": "English", "sessionId": self.session_id}
+            return "/deeper-insights-csv", data, [("files", ("sales.csv", self.dataset, "text/csv"))]
+        if name == "chat":
+            data = {"question": self.rng.choice(CHAT_QUESTIONS), "language": "English",
+                    "sessionId": self.session_id, "isFollowUp": "true"}
+            return "/deeper-insights-chat", data, None
+        data = {"question": self.rng.choice(MONGO_QUESTIONS), "session_id": self.session_id, "language": "en-US",
+                "db_schema": MONGO_SCHEMA}
+        return "/ask-mongo", data, None
+
+
+class LoadRun:
+    def __init__(self, base_url, app_pid, sample_interval):
+        self.base_url = base_url
+        self.app_pid = app_pid
+        self.sample_interval = sample_interval
+        self.results = []
+        self.timeline = []
+        self.started = None
+
+    async def user(self, client, user, count):
+        for _ in range(count):
+            name = user.next_request()
+            path, data, files = user.build(name)
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, data=data, files=files)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = (time.perf_counter() - start) * 1000
+            self.results.append({"endpoint": name, "status": status, "ms": elapsed, "t": time.perf_counter() - self.started})
+
+    async def sample(self, client):
+        while True:
+            point = {"t": round(time.perf_counter() - self.started, 3), "completed": len(self.results)}
+            if self.app_pid:
+                point["rss_bytes"] = process_tree_rss(self.app_pid)
+            try:
+                loop = (await client.get("/metrics")).json().get("event_loop") or {}
+                point["loop_lag_p99_ms"] = (loop.get("recent_lag_ms") or {}).get("p99")
+                point["loop_lag_max_ms"] = (loop.get("recent_lag_ms") or {}).get("max")
+            except (httpx.HTTPError, ValueError):
+                pass
+            self.timeline.append(point)
+            await asyncio.sleep(self.sample_interval)
+
+    async def run(self, users, per_user, timeout):
+        limits = httpx.Limits(max_connections=len(users) + 1)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=timeout, limits=limits) as client:
+            self.started = time.perf_counter()
+            sampler = asyncio.create_task(self.sample(client))
+            try:
+                await asyncio.gather(*(self.user(client, user, count) for user, count in zip(users, per_user)))
+            finally:
+                sampler.cancel()
+            duration = time.perf_counter() - self.started
+            try:
+                final_metrics = (await client.get("/metrics")).json()
+            except (httpx.HTTPError, ValueError):
+                final_metrics = {}
+        # One last sample after the load, to see what memory is retained
+        if self.app_pid:
+            self.timeline.append({"t": round(duration, 3), "completed": len(self.results),
+                                  "rss_bytes": process_tree_rss(self.app_pid)})
+        return duration, final_metrics
+
+
+def _rss_summary(timeline):
+    points = [(p["t"], p["rss_bytes"]) for p in timeline if p.get("rss_bytes")]
+    if not points:
+        return None
+    times, values = zip(*points)
+    slope = statistics.linear_regression(times, values).slope if len(set(times)) > 1 else 0.0
+    return {
+        "start_bytes": values[0],
+        "end_bytes": values[-1],
+        "peak_bytes": max(values),
+        "growth_bytes": values[-1] - values[0],
+        "growth_mb_per_min": round(slope * 60 / 2**20, 3),
+    }
+
+
+def build_report(config, results, timeline, duration, final_metrics, llm_stats):
+    by_endpoint = collections.defaultdict(list)
+    for result in results:
+        by_endpoint[result["endpoint"]].append(result)
+
+    def failed(result):
+        return not isinstance(result["status"], int) or result["status"] >= 400
+
+    endpoints = {}
+    for name, entries in sorted(by_endpoint.items()):
+        ok = [r["ms"] for r in entries if not failed(r)]
+        endpoints[name] = {
+            "requests": len(entries),
+            "errors": sum(1 for r in entries if failed(r)),
+            "status_codes": dict(collections.Counter(str(r["status"]) for r in entries)),
+            "latency_ms": latency_summary(ok),
+        }
+    lags = [p["loop_lag_max_ms"] for p in timeline if p.get("loop_lag_max_ms") is not None]
+    return {
+        "config": config,
+        "duration_s": round(duration, 3),
+        "requests": len(results),
+        "errors": sum(1 for r in results if failed(r)),
+        "throughput_rps": round(len(results) / duration, 3) if duration else None,
+        "latency_ms": latency_summary([r["ms"] for r in results if not failed(r)]),
+        "endpoints": endpoints,
+        "event_loop": {
+            "max_sampled_lag_ms": max(lags) if lags else None,
+            "server": final_metrics.get("event_loop"),
+        },
+        "rss": _rss_summary(timeline),
+        "llm_calls": llm_stats,
+        "timeline": timeline,
+    }
+
+
+# (label, path into the report, True when higher is better)
+COMPARED = (
+    ("throughput rps", ("throughput_rps",), True),
+    ("p50 ms", ("latency_ms", "p50"), False),
+    ("p95 ms", ("latency_ms", "p95"), False),
+    ("p99 ms", ("latency_ms", "p99"), False),
+    ("errors", ("errors",), False),
+    ("max loop lag ms", ("event_loop", "max_sampled_lag_ms"), False),
+    ("RSS growth MB/min", ("rss", "growth_mb_per_min"), False),
+    ("peak RSS bytes", ("rss", "peak_bytes"), False),
+)
+
+
+def _lookup(report, path):
+    for key in path:
+        report = (report or {}).get(key)
+    return report
+
+
+def compare(baseline, report, max_regression):
+    """Print the key figures side by side; return the regressions beyond max_regression percent"""
+    regressions = []
+    print(f"\n{'':<20} {'baseline':>14} {'this run':>14} {'change':>9}")
+    for label, path, higher_is_better in COMPARED:
+        old, new = _lookup(baseline, path), _lookup(report, path)
+        if old is None or new is None:
+            continue
+        change = (new - old) / abs(old) * 100 if old else 0.0
+        print(f"{label:<20} {old:>14.1f} {new:>14.1f} {change:>+8.1f}%")
+        worse = -change if higher_is_better else change
+        # Latency and throughput only; error counts and lag have no meaningful percentage at zero
+        if max_regression is not None and path[0] in ("throughput_rps", "latency_ms") and worse > max_regression:
+            regressions.append(f"{label} {change:+.1f}%")
+    return regressions
+
+
+def print_summary(report):
+    print(f"{report['requests']} requests in {report['duration_s']:.1f}s: "
+          f"{report['throughput_rps']:.2f} req/s, {report['errors']} errors")
+    print(f"\n{'endpoint':<16} {'requests':>8} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in report["endpoints"].items():
+        latency = stats["latency_ms"]
+        cells = [f"{latency[q]:>9.0f}" if latency[q] is not None else f"{'-':>9}" for q in ("p50", "p95", "p99")]
+        print(f"{name:<16} {stats['requests']:>8} {stats['errors']:>6} {' '.join(cells)}")
+    if report["event_loop"]["max_sampled_lag_ms"] is not None:
+        print(f"\nmax event-loop lag {report['event_loop']['max_sampled_lag_ms']:.1f} ms")
+    if report["rss"]:
+        rss = report["rss"]
+        print(f"RSS {rss['start_bytes'] / 2**20:.0f} -> {rss['end_bytes'] / 2**20:.0f} MB "
+              f"(peak {rss['peak_bytes'] / 2**20:.0f} MB, {rss['growth_mb_per_min']:+.1f} MB/min)")
+    if report["llm_calls"]:
+        print(f"LLM calls: {report['llm_calls'].get('calls')}")
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400, help="total requests, split across users")
+    parser.add_argument("--concurrency", type=int, default=16, help="virtual users")
+    parser.add_argument("--mix", help="weights, e.g. upload=1,ask=6,ask_sql=1,deeper_insights=1,chat=3,ask_mongo=0.5")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--rows", type=int, default=20000, help="rows in each uploaded dataset")
+    parser.add_argument("--profile", help="fake Gemini latency/response profile (JSON, see fake_gemini.py)")
+    parser.add_argument("--base-url", help="drive an already running app instead of starting one")
+    parser.add_argument("--pid", type=int, help="app process id for RSS sampling with --base-url")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="seconds between RSS/lag samples")
+    parser.add_argument("--timeout", type=float, default=120, help="per-request timeout in seconds")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="baseline report to compare against")
+    parser.add_argument("--max-regression", type=float, help="with --compare, fail above this %% regression")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    per_user = [args.requests // args.concurrency + (1 if i < args.requests % args.concurrency else 0)
+                for i in range(args.concurrency)]
+    datasets = [make_dataset(args.rows, args.seed * 10 + i) for i in range(4)]
+    users = [VirtualUser(i, args.seed, mix, datasets[i % len(datasets)]) for i in range(args.concurrency)]
+
+    processes = []
+    fake_url = None
+    try:
+        if args.base_url:
+            base_url, app_pid = args.base_url.rstrip("/"), args.pid
+        else:
+            fake_port, app_port = _free_port(), _free_port()
+            fake_url = f"http://127.0.0.1:{fake_port}"
+            fake_args = [sys.executable, os.path.join(ROOT, "loadtest", "fake_gemini.py"),
+                         "--port", str(fake_port), "--seed", str(args.seed)]
+            if args.profile:
+                fake_args += ["--profile", os.path.abspath(args.profile)]
+            processes.append(_start(fake_args, dict(os.environ), f"{fake_url}/stats", 60))
+            env = {**os.environ, "GEMINI_API_ENDPOINT": fake_url, "GEMINI_API_KEY": "loadtest"}
+            base_url = f"http://127.0.0.1:{app_port}"
+            app = _start([sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(app_port),
+                          "--log-level", "warning"], env, f"{base_url}/", 120)
+            processes.append(app)
+            app_pid = app.pid
+
+        run = LoadRun(base_url, app_pid, args.sample_interval)
+        duration, final_metrics = asyncio.run(run.run(users, per_user, args.timeout))
+        llm_stats = httpx.get(f"{fake_url}/stats", timeout=5).json() if fake_url else None
+    finally:
+        for process in reversed(processes):
+            _stop(process)
+
+    config = {
+        "seed": args.seed,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "mix": mix,
+        "rows": args.rows,
+        "profile": args.profile,
+        "revision": _git_revision(),
+        "python": sys.version.split()[0],
+    }
+    report = build_report(config, run.results, run.timeline, duration, final_metrics, llm_stats)
+    print_summary(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
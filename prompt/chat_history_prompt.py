@@ -0,0 +1,18 @@
+CHAT_HISTORY_SUMMARY_PROMPT = """
+You maintain the running summary of a conversation between a user and a data analyst assistant about the user's uploaded CSV/Excel files. The summary replaces the older part of the conversation in the assistant's prompt, so anything it leaves out is forgotten.
+
+**CURRENT SUMMARY (empty at the start of the conversation):**
+{summary}
+
+**EXCHANGES TO FOLD INTO THE SUMMARY, OLDEST FIRST:**
+{exchanges}
+
+**INSTRUCTIONS:**
+1. Return one updated summary that covers the current summary and every exchange above.
+2. Keep what later questions may build on: the questions asked, the findings with their exact figures, column names and filters, the user's stated goals and preferences, and any conclusions or recommendations given.
+3. Drop formatting, emojis, tables, greetings and repeated explanations.
+4. When a later exchange corrects or refines an earlier finding, keep only the corrected one.
+5. Write in {language}, as short plain-text bullet points, at most {max_words} words in total.
+
+**UPDATED SUMMARY:**
+"""
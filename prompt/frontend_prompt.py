@@ -0,0 +1,25 @@
+FRONTEND_CONVERSION_PROMPT = """
+Convert the following MongoDB query result into a frontend-acceptable JSON format for data visualization.
+
+Original Question: {question}
+Query Result: {query_result}
+
+Requirements:
+1. Convert the data into an array of objects with this structure:
+   {{
+       "category": "category_name",
+       "value": numeric_value,
+       "color": "#hexcolor"
+   }}
+
+2. Generate appropriate hex colors for each category (use vibrant, distinct colors)
+3. Ensure category names are descriptive and user-friendly
+4. Values should be numeric
+5. Return ONLY the JSON array, no explanations or additional text
+6. If the data contains aggregation results, use the appropriate fields
+7. If the data is a list of documents, create meaningful categories and counts
+
+Examples of good colors: #0997d1, #aede39, #ff6b6b, #4ecdc4, #45b7d1, #96ceb4, #feca57, #ff9ff3, #54a0ff, #5f27cd
+
+Return only the JSON array.
+"""
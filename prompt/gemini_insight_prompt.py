@@ -1,4 +1,4 @@
-GEMINI_INSIGHT_PROMPT = """You're an expert data analyst. Based on the provided dataset, generate 4 simple yet insightful questions that would be useful for business decisions. 
+GEMINI_INSIGHT_PROMPT = """You're an expert data analyst. Based on the provided dataset columns and the facts computed from the data, generate 4 simple yet insightful questions that would be useful for business decisions. Prefer questions that the most notable facts point to, using the exact column names. 
 
     Focus on straightforward metrics like:
     - Top/bottom performing products, categories, or regions
@@ -8,6 +8,9 @@ RESPONSE LANGUAGE: Please respond in {language}
 CONTEXT DATA:
 {context}
 
+RELATIONSHIPS BETWEEN FILES (keys found by matching values, with facts computed over the joined rows):
+{relationships}
+
 ANALYSIS INSTRUCTIONS:
 As a professional data scientist/analyst, please provide comprehensive deeper insights including:
 
@@ -23,6 +26,8 @@ As a professional data scientist/analyst, please provide comprehensive deeper in
 RESPONSE REQUIREMENTS:
 - Use professional analytical language appropriate for business stakeholders
 - Support your insights with specific data points from the context
+- Where a file's context lists "facts", they were computed exactly over all of its rows; quote their numbers rather than estimating totals, shares or trends from the sample rows
+- Answer questions that span files from the relationship facts, which were computed by joining all rows; do not combine the separate file samples to infer cross-file figures
 - Structure your response clearly with headings and bullet points where appropriate
 - Focus on actionable insights rather than just describing the data
 - Consider both immediate and long-term implications
@@ -0,0 +1,50 @@
+SQL_PROMPT = '''You are an expert data analyst tasked with writing a DuckDB SQL query that produces JSON-ready data for visualization.
+
+Table Context:
+- Table name: {table}
+- Columns: {columns}
+- Dtypes: {dtypes}
+- Sample Values:
+{sample_data}
+
+Analysis Objective: {question}
+
+Requirements:
+1. Output MUST be a single SELECT statement (CTEs with WITH are allowed) over the table "{table}"
+2. Structure data for direct visualization:
+   - Time series: one date/time column with a single value column
+   - Categories: 'category' and 'value' named columns
+   - Multi-variable: Include all necessary dimensions
+3. Quote column names with double quotes exactly as listed above
+4. Preferred methods:
+   - Filter with WHERE before aggregating
+   - GROUP BY for aggregations, ORDER BY for visualization ordering
+   - LIMIT when only the top or bottom rows are needed
+5. Select only the columns needed for the answer
+
+Query Constraints:
+- DuckDB SQL dialect
+- Read-only: no INSERT, UPDATE, DELETE, CREATE, COPY, ATTACH, PRAGMA or SET
+- No file, URL or table functions other than the table "{table}"
+
+Return ONLY the SQL query inside a ```sql code block.'''
+
+SQL_FIX_PROMPT = '''
+You are an expert DuckDB SQL developer tasked with fixing a broken query.
+
+Question from user: {question}
+
+Table "{table}" columns: {columns}
+Dtypes: {dtypes}
+
+The following query was generated but produced an error:
+```sql
+{sql}
+```
+
+Error message: "{error_str}"
+
+Your task: Fix this query to correctly answer the user's question.
+Focus on addressing the specific error. Examine the column names carefully and quote them exactly.
+Return ONLY the corrected SQL query inside a ```sql code block.
+'''
@@ -0,0 +1,91 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Form, Header, HTTPException, Query
+from services.memory_accounting import memory_accountant, EVICTABLE
+import asyncio
+import hmac
+import os
+
+# Admin endpoints answer 403 unless this is set; callers send it in X-Admin-Token
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled. Set ADMIN_TOKEN to enable them.")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+def _structures(structures):
+    selected = tuple(s.strip() for s in structures.split(",") if s.strip())
+    unknown = [s for s in selected if s not in EVICTABLE]
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"Invalid structures. Use any of: {', '.join(EVICTABLE)}")
+    return selected
+
+
+async def _evict(session_ids, structures, sessions):
+    freed = sum(memory_accountant.evictable_bytes(sessions.get(session_id, {}), structures) for session_id in session_ids)
+    evicted = [session_id for session_id in session_ids if memory_accountant.evict(session_id, structures)]
+    memory_accountant.record_freed(freed)
+    return {"evicted": evicted, "structures": list(structures), "approx_freed_bytes": freed}
+
+
+@router.get("/admin/memory")
+async def memory_report(
+    top: int = Query(10, ge=1, le=1000),
+    allocations: int = Query(20, ge=0, le=1000)
+):
+    """
+    Deep memory use per session and per structure, the largest sessions, process
+    RSS against the tracked total and, with tracing on, allocation growth since
+    the previous report
+    """
+    # Snapshot on the loop, measure in a thread
+    return await asyncio.to_thread(memory_accountant.report, top, allocations, memory_accountant.snapshot())
+
+
+@router.delete("/admin/memory/sessions/{session_id}")
+async def evict_session(session_id: str, structures: str = Query(",".join(EVICTABLE))):
+    """Drop one session's uploads (with cached and stored results) and/or chats"""
+    selected = _structures(structures)
+    sessions = await asyncio.to_thread(memory_accountant.session_sizes, memory_accountant.snapshot())
+    if session_id not in sessions:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return await _evict([session_id], selected, sessions)
+
+
+@router.post("/admin/memory/evict")
+async def evict_sessions(
+    prefix: Optional[str] = Form(None),
+    idle_seconds: Optional[float] = Form(None),
+    min_bytes: Optional[int] = Form(None),
+    structures: str = Form(",".join(EVICTABLE)),
+    dry_run: bool = Form(False)
+):
+    """Drop every session matching all of the given criteria; dry_run only lists them"""
+    if prefix is None and idle_seconds is None and min_bytes is None:
+        raise HTTPException(status_code=400, detail="Give at least one of prefix, idle_seconds or min_bytes")
+    selected = _structures(structures)
+    sessions = await asyncio.to_thread(memory_accountant.session_sizes, memory_accountant.snapshot())
+    matched = memory_accountant.select_sessions(sessions, prefix, idle_seconds, min_bytes)
+    if dry_run:
+        return {
+            "matched": matched,
+            "structures": list(selected),
+            "approx_bytes": sum(memory_accountant.evictable_bytes(sessions[session_id], selected) for session_id in matched),
+        }
+    return await _evict(matched, selected, sessions)
+
+
+@router.post("/admin/memory/tracing")
+async def set_allocation_tracing(enabled: bool = Form(...), frames: int = Form(1, ge=1, le=64)):
+    """Start or stop tracemalloc; while on, /admin/memory reports allocation growth"""
+    if enabled:
+        memory_accountant.start_tracing(frames)
+    else:
+        memory_accountant.stop_tracing()
+    return {"tracing": enabled, "frames": frames if enabled else None}
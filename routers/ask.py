@@ -1,29 +1,327 @@
 from fastapi import APIRouter, Form, Depends, HTTPException
-from fastapi.responses import JSONResponse
-from utility.utils import sanitize_for_json, validate_code, get_genai_client
-from state import uploaded_df, uploaded_file_info
+from utility.serialization import ORJSONResponse, frame_to_records, series_to_dict
+from utility.utils import sanitize_for_json, validate_code, get_genai_client, generate_content_async
+from state import uploaded_df, uploaded_file_info, dataset_versions, touch_session
 from services.color import add_color_suggestions
+from services.singleflight import ask_flight, normalize_question
+from services.executor import execute_code
+from services.result_cache import result_cache
+from services.result_store import result_store, write_result
+from services.plan_cache import plan_cache
+from services.code_optimizer import optimize_code
+from services.rollup import rollup_cubes
+from services.sql_engine import SQL_TABLE, SQLExecutionError, run_sql, validate_sql
+from services.chart_reduction import reduce_for_chart, MIN_CHART_POINTS, MAX_CHART_POINTS
+from utility.fingerprint import schema_fingerprint
+from utility.timing import stage, timings
+import asyncio
+import logging
+import orjson
+import time
+from typing import Optional
 import pandas as pd
 import numpy as np
 import re
 from prompt.pandas_prompt import PANDAS_PROMPT
 from prompt.codefix_prompt import FIX_CODE_PROMPT
+from prompt.sql_prompt import SQL_PROMPT, SQL_FIX_PROMPT
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# DataFrame and Series responses carry this many rows; the rest is paged
+# through the result handle (see routers/results.py)
+RESULT_ROW_LIMIT = 50
+# "pandas" asks Gemini for pandas code; "sql" for a DuckDB query over the same frame
+ASK_MODES = ("pandas", "sql")
+SQL_CODE_PATTERN = r"```(?:sql|duckdb)?\s*(.*?)\s*```"
+
+def _serialize_result(result, row_limit=RESULT_ROW_LIMIT):
+    """Convert an execution result to a JSON-serializable payload and its type name"""
+    if isinstance(result, pd.DataFrame):
+        # Limit to 50 rows; NaN, NumPy and pandas values are converted column by column
+        return frame_to_records(result.head(row_limit)), "dataframe"
+    if isinstance(result, pd.Series):
+        # Limit to 50 entries
+        return series_to_dict(result.head(row_limit)), "series"
+    # Handle other types of results
+    try:
+        # Replace any NumPy or pandas values
+        result_json = sanitize_for_json(result)
+    except (TypeError, OverflowError):
+        # If result cannot be serialized to JSON, convert to string
+        result_json = str(result)
+    return result_json, type(result).__name__
+
+
+def _cached_execution(session_id, data_hash, cache_key, max_points):
+    cached = result_cache.get(session_id, data_hash, cache_key, variant=max_points)
+    # A cached answer whose stored result was evicted is run again to get a fresh handle
+    if cached is not None and cached.get("result_handle") and not result_store.has(cached["result_handle"]["id"]):
+        return None
+    return cached
+
+
+def _execution(session_id, result, data_hash, store_path, details, max_points):
+    with stage("serialize"):
+        result_json, result_type = _serialize_result(result, _row_limit(max_points))
+    execution = {"result": result_json, "result_type": result_type, "data_hash": data_hash}
+    if details["stored"] is not None:
+        execution["result_handle"] = result_store.register(session_id, store_path, details["stored"])
+    if details["reduction"] is not None:
+        execution["reduction"] = details["reduction"]
+    return execution
+
+
+def _row_limit(max_points):
+    # A chart request gets its whole reduced result instead of the first page
+    return max_points or RESULT_ROW_LIMIT
+
+
+async def _run_code(code, session_id, dataset_version, df, max_points=None):
+    """Execute code for the session, reusing the cached result of identical code on unchanged data"""
+    with stage("hash"):
+        data_hash = await result_cache.dataset_hash(session_id, dataset_version, df)
+    cached = _cached_execution(session_id, data_hash, code, max_points)
+    if cached is not None:
+        return cached
+
+    # Group-by aggregates over low-cardinality columns are read from the upload's rollup cube
+    with stage("rollup"):
+        answer = await rollup_cubes.answer(session_id, dataset_version, code)
+    if answer is not None:
+        store_path = result_store.new_path()
+        with stage("store"):
+            result, details = await asyncio.to_thread(_store_and_reduce, answer, store_path, max_points)
+        execution = _execution(session_id, result, data_hash, store_path, details, max_points)
+        execution["answered_from"] = "rollup_cube"
+        result_cache.put(session_id, data_hash, code, execution, variant=max_points)
+        return execution
+
+    # Rewrite slow idioms (row-wise apply, sort-then-head, loops over groups) before running
+    with stage("optimize"):
+        optimization = optimize_code(code)
+    store_path = result_store.new_path()
+    started = time.perf_counter()
+    try:
+        with stage("exec"):
+            result, details = await execute_code(
+                optimization.code, session_id, dataset_version, df,
+                max_rows=_row_limit(max_points), store_path=store_path, max_points=max_points
+            )
+    except Exception:
+        if not optimization.changed:
+            raise
+        # A rewrite can fail where the original works (e.g. nlargest on a text column)
+        optimization.rewrites = []
+        with stage("exec"):
+            result, details = await execute_code(
+                code, session_id, dataset_version, df,
+                max_rows=_row_limit(max_points), store_path=store_path, max_points=max_points
+            )
+    rollup_cubes.record_execution(time.perf_counter() - started)
+    execution = _execution(session_id, result, data_hash, store_path, details, max_points)
+    if optimization.rewrites or optimization.warnings:
+        execution["optimizations"] = {"rewrites": optimization.rewrites, "warnings": optimization.warnings}
+    result_cache.put(session_id, data_hash, code, execution, variant=max_points)
+    return execution
+
+
+def _extract_sql(generated_text):
+    code_match = re.search(SQL_CODE_PATTERN, generated_text, re.DOTALL | re.IGNORECASE)
+    return (code_match.group(1) if code_match else generated_text).strip()
+
+
+async def _translate_from_english(model, text, language):
+    """Translate a message for the user, keeping the English text if translation fails"""
+    if language.lower() == "en-us":
+        return text
+    translation_prompt = f"Translate the following text from English to {language}. Return ONLY the translated text with no additional explanations: {text}"
+    try:
+        with stage("translate"):
+            translation = await generate_content_async(model, translation_prompt, generation_config={"temperature": 0.1})
+        return translation.text.strip()
+    except Exception:
+        return text
+
+
+def _store_and_reduce(result, store_path, max_points):
+    stored = write_result(result, store_path)
+    reduction = None
+    if max_points:
+        result, reduction = reduce_for_chart(result, max_points)
+    return result, {"stored": stored, "reduction": reduction}
+
+
+async def _run_sql_query(sql, session_id, dataset_version, df, max_points=None):
+    """Run a validated query for the session, reusing the cached result of the same query on unchanged data"""
+    with stage("hash"):
+        data_hash = await result_cache.dataset_hash(session_id, dataset_version, df)
+    cache_key = f"sql:{sql}"
+    cached = _cached_execution(session_id, data_hash, cache_key, max_points)
+    if cached is not None:
+        return cached
+
+    with stage("sql"):
+        result = await run_sql(sql, session_id, dataset_version, df)
+    store_path = result_store.new_path()
+    with stage("store"):
+        result, details = await asyncio.to_thread(_store_and_reduce, result, store_path, max_points)
+    execution = _execution(session_id, result, data_hash, store_path, details, max_points)
+    result_cache.put(session_id, data_hash, cache_key, execution, variant=max_points)
+    return execution
+
+
+async def _answer_with_sql(model, question, language, session_id, dataset_version, df, df_info, file_info, max_points):
+    """Answer the (English) question with DuckDB SQL over the session frame"""
+    generation_config = {
+        "temperature": 0.2,
+        "top_p": 0.95,
+        "top_k": 40,
+        "max_output_tokens": 8192,
+    }
+    prompt = SQL_PROMPT.format(
+        table=SQL_TABLE,
+        columns=df_info['columns'],
+        dtypes=df_info['dtypes'],
+        sample_data=df.head(5).fillna('NaN').to_string(),
+        question=question
+    )
+    try:
+        with stage("generate"):
+            response = await generate_content_async(model, prompt, generation_config=generation_config)
+        sql = _extract_sql(response.text)
+    except Exception as e:
+        error_message = await _translate_from_english(model, f"Error generating SQL query: {str(e)}", language)
+        raise HTTPException(status_code=500, detail=error_message)
+    
+    unsafe_message = "Generated query contains potentially unsafe operations."
+    if not validate_sql(sql):
+        return ORJSONResponse(
+            status_code=400,
+            content={"error": await _translate_from_english(model, unsafe_message, language), "mode": "sql"}
+        )
+    
+    original_error = None
+    try:
+        execution = await _run_sql_query(sql, session_id, dataset_version, df, max_points)
+    except SQLExecutionError as e:
+        # Send the error back to Gemini once, as the pandas path does
+        original_error = str(e)
+        fix_prompt = SQL_FIX_PROMPT.format(
+            question=question,
+            table=SQL_TABLE,
+            columns=df_info['columns'],
+            dtypes=df_info['dtypes'],
+            sql=sql,
+            error_str=original_error
+        )
+        try:
+            with stage("fix"):
+                fix_response = await generate_content_async(model, fix_prompt, generation_config=generation_config)
+            fixed_sql = _extract_sql(fix_response.text)
+            if not validate_sql(fixed_sql):
+                return ORJSONResponse(
+                    status_code=400,
+                    content={
+                        "error": await _translate_from_english(model, unsafe_message, language),
+                        "original_error": await _translate_from_english(model, original_error, language),
+                        "original_code": sql,
+                        "fixed_code": fixed_sql,
+                        "mode": "sql"
+                    }
+                )
+            execution = await _run_sql_query(fixed_sql, session_id, dataset_version, df, max_points)
+            sql = fixed_sql
+        except Exception as fix_error:
+            error_message = f"Original error: {original_error}\nError fixing query: {str(fix_error)}"
+            return ORJSONResponse(
+                status_code=400,
+                content={
+                    "error": await _translate_from_english(model, error_message, language),
+                    "original_code": sql,
+                    "fixing_attempt_failed": True,
+                    "mode": "sql"
+                }
+            )
+    
+    response_data = {
+        "code": sql,
+        "result": execution["result"],
+        "result_type": execution["result_type"],
+        "result_handle": execution.get("result_handle"),
+        "mode": "sql",
+        "file_info": {
+            "original_filename": file_info.get("original_filename", "unknown"),
+            "converted_from_excel": file_info.get("converted_to_csv", False)
+        }
+    }
+    if execution.get("reduction"):
+        response_data["reduction"] = execution["reduction"]
+    if original_error is not None:
+        response_data["error_fixed"] = True
+        response_data["original_error"] = await _translate_from_english(model, original_error, language)
+    
+    if response_data.get('result') and isinstance(response_data['result'], list) and not execution.get("colored"):
+        try:
+            response_data['result'] = await add_color_suggestions(response_data['result'], get_genai_client())
+            result_cache.put(session_id, execution["data_hash"], f"sql:{sql}", {
+                **execution,
+                "result": response_data['result'],
+                "colored": True
+            }, variant=max_points)
+        except Exception as color_error:
+            # Log the color suggestion error but don't block the main response
+            logger.warning("Color suggestion failed: %s", color_error)
+    
+    return ORJSONResponse(content=response_data, media_type="application/json")
+
 
 @router.post("/ask")
 async def ask_question(
     question: str = Form(...), 
     session_id: str = Form(...),
     language: str = Form(...),
+    mode: str = Form("pandas"),
+    max_points: Optional[int] = Form(None),
+    debug_timings: bool = Form(False),
     model = Depends(get_genai_client)
 ):
-    """Ask a question about the uploaded data and get a pandas code snippet as answer"""
+    """
+    Ask a question about the uploaded data and get a pandas code snippet (or SQL query, with mode=sql) as answer.
+
+    With max_points the result is reduced for charting (LTTB, histogram bins
+    or top K plus "Other") to at most that many points, reported in "reduction".
+    The time spent in each stage is in the Server-Timing header; debug_timings
+    also returns the stages in the body.
+    """
+    mode = mode.lower()
+    if mode not in ASK_MODES:
+        raise HTTPException(status_code=400, detail=f"Unsupported mode '{mode}'. Use one of: {', '.join(ASK_MODES)}")
+    if max_points is not None and not MIN_CHART_POINTS <= max_points <= MAX_CHART_POINTS:
+        raise HTTPException(status_code=400, detail=f"max_points must be between {MIN_CHART_POINTS} and {MAX_CHART_POINTS}")
+    
+    # Identical questions arriving while one is already being answered share its result
+    flight_key = (session_id, dataset_versions.get(session_id), normalize_question(question), language.lower(), mode, max_points)
+    response = await ask_flight.run(
+        flight_key,
+        lambda: _answer_question(question, session_id, language, mode, model, max_points)
+    )
+    if debug_timings and isinstance(response, ORJSONResponse):
+        # The rendered response may be shared with coalesced callers, so build a new one
+        content = {**orjson.loads(response.body), "debug_timings": timings()}
+        return ORJSONResponse(status_code=response.status_code, content=content)
+    return response
+
+
+async def _answer_question(question, session_id, language, mode, model, max_points):
     # Check if the DataFrame exists for this session
     if session_id not in uploaded_df:
         raise HTTPException(status_code=404, detail="No file uploaded for this session. Please upload a file first.")
+    touch_session(session_id)
     
     df = uploaded_df[session_id]
+    dataset_version = dataset_versions.get(session_id)
     file_info = uploaded_file_info.get(session_id, {})
     
     # Get DataFrame info to provide context to the AI
@@ -45,16 +343,22 @@ async def ask_question(
         translation_prompt = f"Translate the following text from {language} to English. Return ONLY the translated text with no additional explanations: {question}"
         
         try:
-            translation_response = model.generate_content(translation_prompt, generation_config={
-                "temperature": 0.1,
-                "max_output_tokens": 1024,
-            })
+            with stage("translate"):
+                translation_response = await generate_content_async(model, translation_prompt, generation_config={
+                    "temperature": 0.1,
+                    "max_output_tokens": 1024,
+                })
             
             # Use the translated question for processing
             question = translation_response.text.strip()
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Translation error: {str(e)}")
     
+    if mode == "sql":
+        return await _answer_with_sql(model, question, language, session_id, dataset_version, df, df_info, file_info, max_points)
+    
+    schema_key = schema_fingerprint(df)
+    
     # Construct initial prompt for Gemini
     prompt = PANDAS_PROMPT.format(
         columns=df_info['columns'],
@@ -64,77 +368,64 @@ async def ask_question(
     )
     
     try:
-        # Generate response
-        response = model.generate_content(prompt, generation_config={
-            "temperature": 0.2,
-            "top_p": 0.95,
-            "top_k": 40,
-            "max_output_tokens": 8192,
-        })
-        
-        generated_text = response.text
+        # Reuse code that already answered this question on a frame with the same schema
+        code = None
+        execution = None
+        with stage("plan"):
+            planned = await plan_cache.lookup(schema_key, question, df_info['columns'])
+        if planned is not None:
+            planned_question, planned_code = planned
+            try:
+                execution = await _run_code(planned_code, session_id, dataset_version, df, max_points)
+                code = planned_code
+            except Exception:
+                # The plan no longer works for this data; generate fresh code instead
+                plan_cache.discard(schema_key, planned_question)
         
-        # Extract code
         code_pattern = r"```python\s*(.*?)\s*```"
-        code_match = re.search(code_pattern, generated_text, re.DOTALL)
+        if code is None:
+            # Generate response
+            with stage("generate"):
+                response = await generate_content_async(model, prompt, generation_config={
+                    "temperature": 0.2,
+                    "top_p": 0.95,
+                    "top_k": 40,
+                    "max_output_tokens": 8192,
+                })
+        
+            generated_text = response.text
+        
+            # Extract code
+            code_match = re.search(code_pattern, generated_text, re.DOTALL)
         
-        if code_match:
-            code = code_match.group(1)
-        else:
-            # If no code block is found, try to extract code directly
-            code = generated_text.strip()
+            if code_match:
+                code = code_match.group(1)
+            else:
+                # If no code block is found, try to extract code directly
+                code = generated_text.strip()
             
         # Validate the generated code
         if not validate_code(code):
             error_message = "Generated code contains potentially unsafe operations."
             if needs_translation:
                 error_translation_prompt = f"Translate the following text from English to {language}. Return ONLY the translated text with no additional explanations: {error_message}"
-                error_translation = model.generate_content(error_translation_prompt, generation_config={"temperature": 0.1})
+                with stage("translate"):
+                    error_translation = await generate_content_async(model, error_translation_prompt, generation_config={"temperature": 0.1})
                 error_message = error_translation.text.strip()
             
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=400,
                 content={"error": error_message}
             )
             
-        # Create a local copy of the variables to use in exec
-        local_vars = {"df": df.copy()}
-        
-        # Execute the code
+        # Execute the code in the sandboxed worker pool
         try:
-            exec(code, {"pd": pd, "np": np}, local_vars)
-            
-            # Get the result (assuming the last variable assigned is the result)
-            result = None
-            for var_name, var_value in local_vars.items():
-                if var_name != "df" and isinstance(var_value, (pd.DataFrame, pd.Series)):
-                    result = var_value
-            
-            # If no result variable was found, use the modified df
-            if result is None and "df" in local_vars:
-                result = local_vars["df"]
-                
-            # Convert result to JSON-serializable format using the custom encoder
-            result_json = None
-            if isinstance(result, pd.DataFrame):
-                # Replace NaN values first and limit to 50 rows
-                result_limited = result.head(50).replace({np.nan: None})
-                result_json = sanitize_for_json(result_limited.to_dict(orient='records'))
-                result_type = "dataframe"
-            elif isinstance(result, pd.Series):
-                # Replace NaN values first and limit to 50 entries
-                result_limited = result.head(50).replace({np.nan: None})
-                result_json = sanitize_for_json(result_limited.to_dict())
-                result_type = "series"
-            else:
-                # Handle other types of results
-                try:
-                    # Replace any NumPy or pandas values
-                    result_json = sanitize_for_json(result)
-                except (TypeError, OverflowError):
-                    # If result cannot be serialized to JSON, convert to string
-                    result_json = str(result)
-                result_type = type(result).__name__
+            executed_code = code
+            if execution is None:
+                execution = await _run_code(code, session_id, dataset_version, df, max_points)
+                plan_cache.store(schema_key, question, code)
+            result_json = execution["result"]
+            result_type = execution["result_type"]
                 
             # If translation is needed, translate code comments
             if needs_translation:
@@ -147,10 +438,11 @@ async def ask_question(
                     translation_prompt = f"Translate the following Python code comments from English to {language}. Return ONLY the translated comments, one per line, with no additional explanations:\n\n{comments_text}"
                     
                     try:
-                        translation_response = model.generate_content(translation_prompt, generation_config={
-                            "temperature": 0.1,
-                            "max_output_tokens": 2048,
-                        })
+                        with stage("translate"):
+                            translation_response = await generate_content_async(model, translation_prompt, generation_config={
+                                "temperature": 0.1,
+                                "max_output_tokens": 2048,
+                            })
                         
                         translated_comments = translation_response.text.strip().split("\n")
                         
@@ -169,12 +461,19 @@ async def ask_question(
                 "code": code,
                 "result": result_json,
                 "result_type": result_type,
+                "result_handle": execution.get("result_handle"),
                 "file_info": {
                     "original_filename": file_info.get("original_filename", "unknown"),
                     "converted_from_excel": file_info.get("converted_to_csv", False)
                 }
             }
-            if response_data.get('result') and isinstance(response_data['result'], list):
+            if execution.get("optimizations"):
+                response_data["optimizations"] = execution["optimizations"]
+            if execution.get("reduction"):
+                response_data["reduction"] = execution["reduction"]
+            if execution.get("answered_from"):
+                response_data["answered_from"] = execution["answered_from"]
+            if response_data.get('result') and isinstance(response_data['result'], list) and not execution.get("colored"):
                 try:
                     # Use a separate model instance for color suggestion if possible
                     color_model = get_genai_client()  # or use a different method to get a Gemini Flash Lite client
@@ -183,11 +482,17 @@ async def ask_question(
                         response_data['result'], 
                         color_model
                     )
+                    # Keep the colours with the cached result so a repeat skips this call too
+                    result_cache.put(session_id, execution["data_hash"], executed_code, {
+                        **execution,
+                        "result": response_data['result'],
+                        "colored": True
+                    }, variant=max_points)
                 except Exception as color_error:
                     # Log the color suggestion error but don't block the main response
-                    print(f"Color suggestion failed: {color_error}")
+                    logger.warning("Color suggestion failed: %s", color_error)
             
-            return JSONResponse(content=response_data, media_type="application/json")
+            return ORJSONResponse(content=response_data, media_type="application/json")
             
         except Exception as e:
             # When execution error occurs, send error back to Gemini to fix it
@@ -202,12 +507,13 @@ async def ask_question(
             
             try:
                 # Generate fixed code
-                fix_response = model.generate_content(fix_prompt, generation_config={
-                    "temperature": 0.2,
-                    "top_p": 0.95,
-                    "top_k": 40,
-                    "max_output_tokens": 8192,
-                })
+                with stage("fix"):
+                    fix_response = await generate_content_async(model, fix_prompt, generation_config={
+                        "temperature": 0.2,
+                        "top_p": 0.95,
+                        "top_k": 40,
+                        "max_output_tokens": 8192,
+                    })
                 
                 fixed_text = fix_response.text
                 
@@ -230,8 +536,10 @@ async def ask_question(
                         original_error_prompt = f"Translate the following text from English to {language}. Return ONLY the translated text with no additional explanations: {original_error}"
                         
                         try:
-                            error_translation = model.generate_content(error_translation_prompt, generation_config={"temperature": 0.1})
-                            original_error_translation = model.generate_content(original_error_prompt, generation_config={"temperature": 0.1})
+                            with stage("translate"):
+                                error_translation = await generate_content_async(model, error_translation_prompt, generation_config={"temperature": 0.1})
+                            with stage("translate"):
+                                original_error_translation = await generate_content_async(model, original_error_prompt, generation_config={"temperature": 0.1})
                             
                             error_message = error_translation.text.strip()
                             original_error = original_error_translation.text.strip()
@@ -239,7 +547,7 @@ async def ask_question(
                             # If translation fails, use original error messages
                             pass
                     
-                    return JSONResponse(
+                    return ORJSONResponse(
                         status_code=400,
                         content={
                             "error": error_message,
@@ -250,35 +558,10 @@ async def ask_question(
                     )
                 
                 # Try executing the fixed code
-                local_vars = {"df": df.copy()}
-                exec(fixed_code, {"pd": pd, "np": np}, local_vars)
-                
-                # Get the result from the fixed code
-                result = None
-                for var_name, var_value in local_vars.items():
-                    if var_name != "df" and isinstance(var_value, (pd.DataFrame, pd.Series)):
-                        result = var_value
-                
-                # If no result variable was found, use the modified df
-                if result is None and "df" in local_vars:
-                    result = local_vars["df"]
-                    
-                # Convert result to JSON-serializable format
-                result_json = None
-                if isinstance(result, pd.DataFrame):
-                    result_limited = result.head(50).replace({np.nan: None})
-                    result_json = sanitize_for_json(result_limited.to_dict(orient='records'))
-                    result_type = "dataframe"
-                elif isinstance(result, pd.Series):
-                    result_limited = result.head(50).replace({np.nan: None})
-                    result_json = sanitize_for_json(result_limited.to_dict())
-                    result_type = "series"
-                else:
-                    try:
-                        result_json = sanitize_for_json(result)
-                    except (TypeError, OverflowError):
-                        result_json = str(result)
-                    result_type = type(result).__name__
+                execution = await _run_code(fixed_code, session_id, dataset_version, df, max_points)
+                plan_cache.store(schema_key, question, fixed_code)
+                result_json = execution["result"]
+                result_type = execution["result_type"]
                 
                 # Translate fixed code comments if needed
                 if needs_translation:
@@ -291,10 +574,11 @@ async def ask_question(
                         translation_prompt = f"Translate the following Python code comments from English to {language}. Return ONLY the translated comments, one per line, with no additional explanations:\n\n{comments_text}"
                         
                         try:
-                            translation_response = model.generate_content(translation_prompt, generation_config={
-                                "temperature": 0.1,
-                                "max_output_tokens": 2048,
-                            })
+                            with stage("translate"):
+                                translation_response = await generate_content_async(model, translation_prompt, generation_config={
+                                    "temperature": 0.1,
+                                    "max_output_tokens": 2048,
+                                })
                             
                             translated_comments = translation_response.text.strip().split("\n")
                             
@@ -314,7 +598,8 @@ async def ask_question(
                 if needs_translation:
                     error_translation_prompt = f"Translate the following text from English to {language}. Return ONLY the translated text with no additional explanations: {error_str}"
                     try:
-                        error_translation = model.generate_content(error_translation_prompt, generation_config={"temperature": 0.1})
+                        with stage("translate"):
+                            error_translation = await generate_content_async(model, error_translation_prompt, generation_config={"temperature": 0.1})
                         original_error = error_translation.text.strip()
                     except Exception:
                         # If translation fails, use original error message
@@ -325,6 +610,7 @@ async def ask_question(
                     "code": fixed_code,
                     "result": result_json,
                     "result_type": result_type,
+                    "result_handle": execution.get("result_handle"),
                     "file_info": {
                         "original_filename": file_info.get("original_filename", "unknown"),
                         "converted_from_excel": file_info.get("converted_to_csv", False)
@@ -332,8 +618,12 @@ async def ask_question(
                     "error_fixed": True,
                     "original_error": original_error
                 }
+                if execution.get("optimizations"):
+                    response_data["optimizations"] = execution["optimizations"]
+                if execution.get("reduction"):
+                    response_data["reduction"] = execution["reduction"]
                 
-                return JSONResponse(content=response_data, media_type="application/json")
+                return ORJSONResponse(content=response_data, media_type="application/json")
                 
             except Exception as fix_error:
                 # If fixing also fails, return both the original error and the fixing error
@@ -345,8 +635,10 @@ async def ask_question(
                     fixing_error_prompt = f"Translate the following text from English to {language}. Return ONLY the translated text with no additional explanations: {fixing_error}"
                     
                     try:
-                        original_error_translation = model.generate_content(original_error_prompt, generation_config={"temperature": 0.1})
-                        fixing_error_translation = model.generate_content(fixing_error_prompt, generation_config={"temperature": 0.1})
+                        with stage("translate"):
+                            original_error_translation = await generate_content_async(model, original_error_prompt, generation_config={"temperature": 0.1})
+                        with stage("translate"):
+                            fixing_error_translation = await generate_content_async(model, fixing_error_prompt, generation_config={"temperature": 0.1})
                         
                         original_error = original_error_translation.text.strip()
                         fixing_error = fixing_error_translation.text.strip()
@@ -356,7 +648,7 @@ async def ask_question(
                 
                 error_message = f"Original error: {original_error}\nError fixing code: {fixing_error}"
                 
-                return JSONResponse(
+                return ORJSONResponse(
                     status_code=400,
                     content={
                         "error": error_message,
@@ -372,7 +664,8 @@ async def ask_question(
             translation_prompt = f"Translate the following text from English to {language}. Return ONLY the translated text with no additional explanations: {error_message}"
             
             try:
-                translation_response = model.generate_content(translation_prompt, generation_config={"temperature": 0.1})
+                with stage("translate"):
+                    translation_response = await generate_content_async(model, translation_prompt, generation_config={"temperature": 0.1})
                 error_message = translation_response.text.strip()
             except Exception:
                 # If translation fails, use original error message
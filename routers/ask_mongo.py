@@ -1,22 +1,68 @@
 from fastapi import APIRouter, Form, Depends, HTTPException
-from fastapi.responses import JSONResponse
-from utility.utils import get_genai_client
+from utility.serialization import ORJSONResponse
+from utility.utils import get_genai_client, generate_content_async
+from services.mongo_advisor import advise
+from services.schema_registry import schema_registry, normalize_schema, prune_schema
+from services.mongo_query import MongoQueryParseError, parse_mongo_query
+from services.mongo_executor import MongoExecutionError, UnsafeQueryError, mongo_executor
+from services.frontend_conversion import convert_result_to_frontend, documents_to_json
+from typing import Optional
+import json
+import logging
 import re
 from prompt.mongo_prompt import MONGO_PROMPT
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+async def _execute_on_server(mongo_query, question, model):
+    """Run the generated query read-only on the configured server and convert its result for the frontend"""
+    if not mongo_executor.enabled:
+        raise HTTPException(status_code=503, detail="Server-side execution is not configured (MONGO_URI)")
+    try:
+        query = parse_mongo_query(mongo_query)
+        (result_text, included, cut_off), execution = await mongo_executor.run(query, documents_to_json)
+    except (MongoQueryParseError, UnsafeQueryError) as e:
+        raise HTTPException(status_code=400, detail=f"Generated query cannot be run on the server: {str(e)}")
+    except MongoExecutionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Query execution failed: {str(e)}")
+    execution["documents"] = included
+    execution["truncated"] = execution["truncated"] or cut_off
+    try:
+        frontend_data = await convert_result_to_frontend(result_text, question, model)
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to generate valid frontend format: {str(e)}")
+    return frontend_data, execution
 
 @router.post("/ask-mongo")
 async def ask_mongo_question(
     question: str = Form(...), 
     session_id: str = Form(...),
     language: str = Form(...),
-    context: str = Form(...),
-    db_schema: str = Form(...),
+    context: Optional[str] = Form(None),
+    db_schema: Optional[str] = Form(None),
+    schema_id: Optional[str] = Form(None),
+    execute: bool = Form(False),
     model = Depends(get_genai_client)
 ):
-    """Generate MongoDB query based on user question and database schema"""
-    print(f"Received question: {question}")
+    """
+    Generate MongoDB query based on user question and database schema.
+
+    db_schema and context can be left out once a schema is registered via
+    /mongo-schema under schema_id (default: the session id). Only the
+    collections and fields relevant to the question are put in the prompt.
+    
+    With execute=true (and MONGO_URI configured) the query is also run
+    read-only on the server and its result returned as frontend_data, as
+    /convert-to-frontend would.
+    """
+    logger.info("Mongo question", extra={"session_id": session_id, "language": language, "question": question})
+    schema_id = schema_id or session_id
+    if db_schema is None and schema_registry.get(schema_id) is None:
+        raise HTTPException(status_code=400, detail="No db_schema given and none registered for this session. Post it here or register it via /mongo-schema.")
     original_question = question
     
     # Check if translation is needed
@@ -27,7 +73,7 @@ async def ask_mongo_question(
         translation_prompt = f"Translate the following text from {language} to English. Return ONLY the translated text with no additional explanations: {question}"
         
         try:
-            translation_response = model.generate_content(translation_prompt, generation_config={
+            translation_response = await generate_content_async(model, translation_prompt, generation_config={
                 "temperature": 0.1,
                 "max_output_tokens": 1024,
             })
@@ -37,16 +83,30 @@ async def ask_mongo_question(
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Translation error: {str(e)}")
     
+    # Select the relevant part of the posted or registered schema
+    if db_schema is None:
+        prompt_schema, registered_context, schema_version, pruning = schema_registry.relevant_schema(schema_id, question)
+        db_schema = schema_registry.get(schema_id)["db_schema"]
+        if context is None:
+            context = registered_context
+    else:
+        collections = normalize_schema(db_schema)
+        schema_version, pruning = None, None
+        prompt_schema = db_schema
+        if collections:
+            pruned, pruning = prune_schema(collections, question)
+            prompt_schema = json.dumps(pruned, default=str)
+    
     # Construct prompt for MongoDB query generation
     prompt = MONGO_PROMPT.format(
-        db_schema=db_schema,
-        context=context,
+        db_schema=prompt_schema,
+        context=context or "",
         question=question
     )
     
     try:
         # Generate MongoDB query
-        response = model.generate_content(prompt, generation_config={
+        response = await generate_content_async(model, prompt, generation_config={
             "temperature": 0.2,
             "top_p": 0.95,
             "top_k": 40,
@@ -55,8 +115,7 @@ async def ask_mongo_question(
         
         generated_text = response.text.strip()
         
-        # Print the raw response for debugging
-        print(f"Raw AI response: {generated_text}")
+        logger.debug("Raw AI response", extra={"response": generated_text})
         
         # Extract MongoDB query from code blocks if present, otherwise use the full response
         code_pattern = r"```(?:javascript|js|mongo|mongodb)?\s*(.*?)\s*```"
@@ -64,27 +123,35 @@ async def ask_mongo_question(
         
         if code_match:
             mongo_query = code_match.group(1).strip()
-            print(f"Extracted from code block: {mongo_query}")
         else:
             # If no code block is found, use the entire response
             mongo_query = generated_text
-            print(f"Using full response: {mongo_query}")
         
         # Basic validation - ensure the query is not empty
         if not mongo_query:
             raise HTTPException(status_code=400, detail="Failed to generate a valid MongoDB query")
         
-        print(f"Final MongoDB query: {mongo_query}")
+        logger.debug("Final MongoDB query", extra={"query": mongo_query, "from_code_block": code_match is not None})
+        
+        # Check the query against the indexes in the schema before it is run anywhere
+        advisories = advise(mongo_query, db_schema)
+        
+        content = {
+            "query": mongo_query,
+            "session_id": session_id,
+            "original_question": original_question,
+            "translated_question": question if needs_translation else None,
+            "advisories": advisories,
+            "schema": {
+                "schema_id": schema_id if schema_version is not None else None,
+                "version": schema_version,
+                "pruning": pruning
+            }
+        }
+        if execute:
+            content["frontend_data"], content["execution"] = await _execute_on_server(mongo_query, question, model)
         
-        return JSONResponse(
-            content={
-                "query": mongo_query,
-                "session_id": session_id,
-                "original_question": original_question,
-                "translated_question": question if needs_translation else None
-            },
-            media_type="application/json"
-        )
+        return ORJSONResponse(content=content, media_type="application/json")
         
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -96,7 +163,7 @@ async def ask_mongo_question(
             translation_prompt = f"Translate the following text from English to {language}. Return ONLY the translated text with no additional explanations: {error_message}"
             
             try:
-                translation_response = model.generate_content(translation_prompt, generation_config={"temperature": 0.1})
+                translation_response = await generate_content_async(model, translation_prompt, generation_config={"temperature": 0.1})
                 error_message = translation_response.text.strip()
             except Exception:
                 # If translation fails, use original error message
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Request, HTTPException
-from utility.utils import NpEncoder, get_genai_client
+from utility.utils import NpEncoder, get_genai_client, generate_content_async
 from prompt.insights_prompt import INSIGHTS_PROMPT
 import json
 
@@ -37,7 +37,7 @@ async def deeper_insights(request: Request):
         )
         
         # Call the Gemini model with the insights prompt
-        response = model.generate_content(prompt)
+        response = await generate_content_async(model, prompt)
         
         # Return the insights
         return {
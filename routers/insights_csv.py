@@ -1,17 +1,68 @@
 from fastapi import APIRouter, File, UploadFile, Form, HTTPException
 from typing import List, Optional
 import pandas as pd
-import numpy as np
+import asyncio
 import json
 import io
-from utility.utils import NpEncoder, get_genai_client, sanitize_for_json
+import logging
+from utility.utils import NpEncoder, get_genai_client, generate_content_async
+from utility.serialization import frame_to_records
+from utility.timing import stage
+from services.facts import compute_facts
+from services.row_index import RowIndex
+from services.joins import discover_relationships, format_relationships
+from services.chat_history import conversation_compactor
+from state import chat_sessions, chat_summaries, touch_session
 from prompt.insights_prompt import INSIGHTS_PROMPT
 from prompt.deeper_insights_chat import DEEPER_INSIGHTS_CHAT_PROMPT  # Import the chat prompt
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Sample rows per file in the /deeper-insights-csv prompt; its numbers come from the computed facts
+PROMPT_SAMPLE_ROWS = 5
+
+
+def _prompt_context(dataframes):
+    """Per file: shape, dtypes, gaps, the facts computed over all rows and a few rows to show what the data looks like"""
+    return {
+        file_key: {
+            'filename': info['filename'],
+            'shape': info['shape'],
+            'dtypes': info['dtypes'],
+            'null_counts': {col: count for col, count in info['null_counts'].items() if count},
+            'unique_counts': info['unique_counts'],
+            'facts': info['facts'],
+            'sample_data': info['sample_data'][:PROMPT_SAMPLE_ROWS]
+        }
+        for file_key, info in dataframes.items()
+    }
+
+
+def _chat_context(entry, question):
+    """
+    Per file of a stored analysis: its profile and facts plus the rows and
+    columns its row index finds relevant to question, instead of its data
+    """
+    context = {}
+    for file_key, info in entry['dataframes_context'].items():
+        file_context = {
+            'filename': info['filename'],
+            'shape': info['shape'],
+            'dtypes': info.get('dtypes', {}),
+            'null_counts': {col: count for col, count in info.get('null_counts', {}).items() if count},
+            'unique_counts': info.get('unique_counts', {}),
+            'facts': info.get('facts', [])
+        }
+        index = entry.get('row_indexes', {}).get(file_key)
+        df = entry.get('dataframes_raw', {}).get(file_key)
+        if index is not None and df is not None:
+            file_context['relevant_rows'] = index.retrieve(df, question)
+        else:
+            file_context['sample_data'] = info.get('sample_data', [])[:PROMPT_SAMPLE_ROWS]
+        context[file_key] = file_context
+    return context
 
-# Enhanced in-memory session storage to include DataFrames
-chat_sessions = {}
 
 @router.post("/deeper-insights-chat")
 async def deeper_insights_chat(
@@ -24,9 +75,7 @@ async def deeper_insights_chat(
     Handle follow-up chat questions with full context including DataFrames and previous responses.
     """
     try:
-        print(f"Processing chat question: {question}")
-        print(f"Session ID: {sessionId}")
-        print(f"Language: {language}")
+        logger.info("Chat question", extra={"session_id": sessionId, "language": language, "question": question})
         
         # Validate required fields  
         if not question:
@@ -45,22 +94,16 @@ async def deeper_insights_chat(
             }
         
         session_data = chat_sessions[sessionId]
+        touch_session(sessionId)
         
         # Get the latest data context (from the most recent CSV upload)
         latest_data_context = None
         dataframes_context = None
-        previous_responses = []
         
         for entry in session_data:
             if 'dataframes_context' in entry:
                 latest_data_context = entry
                 dataframes_context = entry['dataframes_context']
-            if 'response' in entry:
-                previous_responses.append({
-                    'question': entry.get('question', ''),
-                    'response': entry.get('response', ''),
-                    'timestamp': entry.get('timestamp', '')
-                })
         
         if not dataframes_context:
             return {
@@ -78,10 +121,13 @@ async def deeper_insights_chat(
         
         # Prepare the context for the chat prompt
         try:
-            # Convert dataframes context to string representation
-            context_str = json.dumps(dataframes_context, cls=NpEncoder, indent=2)
+            # Only the rows relevant to this question, so the prompt does not grow with the files
+            with stage("retrieve"):
+                chat_context = await asyncio.to_thread(_chat_context, latest_data_context, question)
+            with stage("context"):
+                context_str = json.dumps(chat_context, cls=NpEncoder, indent=2)
         except Exception as json_error:
-            print(f"Error serializing context: {json_error}")
+            logger.warning("Error serializing context: %s", json_error)
             # Fallback: create a simpler context
             simple_context = {
                 file_key: {
@@ -95,27 +141,22 @@ async def deeper_insights_chat(
             }
             context_str = json.dumps(simple_context, indent=2)
         
-        # Prepare previous conversation history
-        conversation_history = ""
-        if previous_responses:
-            conversation_history = "\n".join([
-                f"Previous Q: {resp['question']}\nPrevious A: {resp['response']}\n---"
-                for resp in previous_responses[-3:]  # Last 3 exchanges to avoid too long context
-            ])
+        # Running summary of older exchanges plus the latest ones, within a fixed token budget
+        conversation_history = conversation_compactor.history(sessionId, session_data)
         
         # Create the chat prompt using the imported prompt template
         chat_prompt = DEEPER_INSIGHTS_CHAT_PROMPT.format(
             current_question=question,
             language=language or "English",
             data_context=context_str,
+            relationships=format_relationships(latest_data_context.get('relationships', [])) if len(dataframes_context) > 1 else "(single file)",
             conversation_history=conversation_history
         )
         
-        print("Calling Gemini model for chat response with full context...")
-        
         # Call the Gemini model with the chat prompt
-        response = model.generate_content(chat_prompt)
-        print(f"Generated contextual chat response successfully")
+        with stage("chat"):
+            response = await generate_content_async(model, chat_prompt)
+        logger.debug("Generated contextual chat response")
         
         # Add this exchange to the session history
         chat_sessions[sessionId].append({
@@ -125,6 +166,8 @@ async def deeper_insights_chat(
             "language": language,
             "interaction_type": "chat"
         })
+        # Fold older exchanges into the summary after the response, not before it
+        conversation_compactor.schedule(sessionId)
         
         # Return the chat response
         return {
@@ -140,10 +183,10 @@ async def deeper_insights_chat(
         }
         
     except HTTPException as he:
-        print(f"HTTP Exception in chat: {he.detail}")
+        logger.info("HTTP exception in chat: %s", he.detail)
         raise he
     except Exception as e:
-        print(f"Unexpected error in deeper_insights_chat: {str(e)}")
+        logger.exception("Unexpected error in deeper_insights_chat")
         raise HTTPException(status_code=500, detail=f"Error during chat response: {str(e)}")
 
 
@@ -163,16 +206,15 @@ async def deeper_insights_csv(
         if not question:
             raise HTTPException(status_code=400, detail="Question is required")
         
-        print(f"Processing {len(files)} files with question: {question}")
-        print(f"Session ID: {sessionId}")
+        logger.info("Deeper insights request", extra={"session_id": sessionId, "files": len(files), "question": question})
         
         # Dictionary to store all DataFrames and their context
         dataframes = {}
         dataframes_raw = {}  # Store actual DataFrames for future reference
+        row_indexes = {}  # Row retrieval per file for follow-up chat questions
         
         # Process each uploaded file
         for file in files:
-            print(f"Processing file: {file.filename}")
             
             # Validate file type
             if not file.filename.lower().endswith(('.csv', '.xlsx', '.xls')):
@@ -189,47 +231,48 @@ async def deeper_insights_csv(
                 encoding_used = "utf-8"
                 df = None
                 
-                # Convert to pandas DataFrame based on file type
-                if file.filename.lower().endswith('.csv'):
-                    # Handle CSV with multiple encoding attempts
-                    try:
-                        # First try with BytesIO (binary mode)
-                        df = pd.read_csv(io.BytesIO(file_content))
-                        print(f"Successfully read {file.filename} with default encoding")
-                    except UnicodeDecodeError:
-                        print(f"UTF-8 failed for {file.filename}, trying other encodings...")
-                        # Try with different encodings
-                        encodings = ['latin-1', 'iso-8859-1', 'windows-1252', 'cp1252']
-                        for encoding in encodings:
-                            try:
-                                df = pd.read_csv(io.BytesIO(file_content), encoding=encoding)
-                                encoding_used = encoding
-                                print(f"Successfully read {file.filename} with {encoding} encoding")
-                                break
-                            except Exception as enc_error:
-                                print(f"Failed with {encoding}: {enc_error}")
-                                continue
-                        else:
+                with stage("parse", file=file.filename):
+                    # Convert to pandas DataFrame based on file type
+                    if file.filename.lower().endswith('.csv'):
+                        # Handle CSV with multiple encoding attempts
+                        try:
+                            # First try with BytesIO (binary mode)
+                            df = pd.read_csv(io.BytesIO(file_content))
+                            logger.debug("Read %s as UTF-8", file.filename)
+                        except UnicodeDecodeError:
+                            logger.debug("UTF-8 failed for %s, trying other encodings", file.filename)
+                            # Try with different encodings
+                            encodings = ['latin-1', 'iso-8859-1', 'windows-1252', 'cp1252']
+                            for encoding in encodings:
+                                try:
+                                    df = pd.read_csv(io.BytesIO(file_content), encoding=encoding)
+                                    encoding_used = encoding
+                                    logger.debug("Read %s as %s", file.filename, encoding)
+                                    break
+                                except Exception as enc_error:
+                                    logger.debug("Reading %s as %s failed: %s", file.filename, encoding, enc_error)
+                                    continue
+                            else:
+                                raise HTTPException(
+                                    status_code=400, 
+                                    detail=f"Unable to decode CSV file {file.filename}. Please try saving it with UTF-8 encoding."
+                                )
+                        except Exception as csv_error:
                             raise HTTPException(
                                 status_code=400, 
-                                detail=f"Unable to decode CSV file {file.filename}. Please try saving it with UTF-8 encoding."
+                                detail=f"Error reading CSV file {file.filename}: {str(csv_error)}"
                             )
-                    except Exception as csv_error:
-                        raise HTTPException(
-                            status_code=400, 
-                            detail=f"Error reading CSV file {file.filename}: {str(csv_error)}"
-                        )
                         
-                elif file.filename.lower().endswith(('.xlsx', '.xls')):
-                    # Handle Excel files
-                    try:
-                        df = pd.read_excel(io.BytesIO(file_content))
-                        print(f"Successfully read Excel file: {file.filename}")
-                    except Exception as excel_error:
-                        raise HTTPException(
-                            status_code=400, 
-                            detail=f"Error reading Excel file {file.filename}: {str(excel_error)}"
-                        )
+                    elif file.filename.lower().endswith(('.xlsx', '.xls')):
+                        # Handle Excel files
+                        try:
+                            df = pd.read_excel(io.BytesIO(file_content))
+                            logger.debug("Read Excel file %s", file.filename)
+                        except Exception as excel_error:
+                            raise HTTPException(
+                                status_code=400, 
+                                detail=f"Error reading Excel file {file.filename}: {str(excel_error)}"
+                            )
                 
                 if df is None:
                     raise HTTPException(
@@ -243,77 +286,79 @@ async def deeper_insights_csv(
                 # Basic data cleaning
                 df = df.dropna(how='all')  # Remove completely empty rows
                 
-                print(f"File {file.filename} processed: {df.shape[0]} rows, {df.shape[1]} columns")
+                logger.info("File processed", extra={"file": file.filename, "rows": df.shape[0], "columns": df.shape[1]})
                 
                 # Store DataFrame info for context
                 file_key = file.filename.replace('.', '_').replace(' ', '_').replace('-', '_')
                 
-                # Store the actual DataFrame for future use
-                dataframes_raw[file_key] = df.copy()
+                # Store the actual DataFrame for future use; df is not modified
+                # after this point, so no defensive copy is needed
+                dataframes_raw[file_key] = df
                 
-                # Get sample data with NaN handling
-                sample_data = df.head(20).replace({np.nan: None})  # Increased sample size
-                sample_data_dict = sanitize_for_json(sample_data.to_dict('records'))
+                with stage("profile", file=file.filename):
+                    # Get sample data with NaN handling
+                    sample_data_dict = frame_to_records(df.head(20))  # Increased sample size
                 
-                # Get summary statistics with proper NaN handling
-                try:
-                    summary_stats = df.describe(include='all').replace({np.nan: None}).to_dict()
-                    summary_stats = sanitize_for_json(summary_stats)
-                except Exception as stats_error:
-                    print(f"Error generating summary stats for {file.filename}: {stats_error}")
-                    summary_stats = {}
+                    # Get null counts
+                    null_counts = df.isnull().sum().to_dict()
+                    null_counts = {k: int(v) for k, v in null_counts.items()}  # Convert numpy int to Python int
                 
-                # Get null counts
-                null_counts = df.isnull().sum().to_dict()
-                null_counts = {k: int(v) for k, v in null_counts.items()}  # Convert numpy int to Python int
+                    # Get unique value counts for categorical columns
+                    unique_counts = {}
+                    categorical_cols = df.select_dtypes(include=['object', 'category']).columns
+                    for col in categorical_cols[:10]:  # Limit to first 10 categorical columns
+                        try:
+                            unique_counts[col] = int(df[col].nunique())
+                        except:
+                            pass
                 
-                # Get unique value counts for categorical columns
-                unique_counts = {}
-                categorical_cols = df.select_dtypes(include=['object', 'category']).columns
-                for col in categorical_cols[:10]:  # Limit to first 10 categorical columns
-                    try:
-                        unique_counts[col] = int(df[col].nunique())
-                    except:
-                        pass
+                    dataframes[file_key] = {
+                        'filename': file.filename,
+                        'shape': df.shape,
+                        'columns': df.columns.tolist(),
+                        'dtypes': {k: str(v) for k, v in df.dtypes.to_dict().items()},
+                        'sample_data': sample_data_dict,
+                        'null_counts': null_counts,
+                        'unique_counts': unique_counts,
+                        'total_rows': len(df),
+                        'encoding_used': encoding_used
+                    }
                 
-                dataframes[file_key] = {
-                    'filename': file.filename,
-                    'shape': df.shape,
-                    'columns': df.columns.tolist(),
-                    'dtypes': {k: str(v) for k, v in df.dtypes.to_dict().items()},
-                    'sample_data': sample_data_dict,
-                    'summary_stats': summary_stats,
-                    'null_counts': null_counts,
-                    'unique_counts': unique_counts,
-                    'total_rows': len(df),
-                    'encoding_used': encoding_used
-                }
+                # Exact figures over all rows, ranked, so the model does not estimate them from samples
+                with stage("facts", file=file.filename):
+                    facts = await asyncio.to_thread(compute_facts, df)
+                dataframes[file_key]['facts'] = [fact['text'] for fact in facts]
                 
-                # If dataset is reasonably sized, include more data
-                if len(df) <= 200:
-                    full_data = df.replace({np.nan: None}).to_dict('records')
-                    dataframes[file_key]['full_data'] = sanitize_for_json(full_data)
-                elif len(df) <= 1000:
-                    # For medium datasets, include first and last rows
-                    sample_extended = pd.concat([df.head(50), df.tail(50)]).replace({np.nan: None})
-                    dataframes[file_key]['extended_sample'] = sanitize_for_json(sample_extended.to_dict('records'))
+                if sessionId:
+                    with stage("index", file=file.filename):
+                        row_indexes[file_key] = await asyncio.to_thread(RowIndex, df)
                 
             except HTTPException as he:
                 raise he
             except Exception as e:
-                print(f"Unexpected error processing {file.filename}: {str(e)}")
+                logger.exception("Unexpected error processing %s", file.filename)
                 raise HTTPException(
                     status_code=400, 
                     detail=f"Error processing file {file.filename}: {str(e)}"
                 )
         
-        print("All files processed successfully, generating insights...")
+        
+        # Keys shared between the files, and facts computed across them
+        relationships = []
+        if len(dataframes_raw) > 1:
+            with stage("joins"):
+                relationships = await asyncio.to_thread(
+                    discover_relationships,
+                    dataframes_raw,
+                    {file_key: info['filename'] for file_key, info in dataframes.items()}
+                )
         
         # Convert dataframes info to string representation for the model
         try:
-            context_str = json.dumps(dataframes, cls=NpEncoder, indent=2)
+            with stage("context"):
+                context_str = json.dumps(_prompt_context(dataframes), cls=NpEncoder, indent=2)
         except Exception as json_error:
-            print(f"Error serializing context: {json_error}")
+            logger.warning("Error serializing context: %s", json_error)
             # Fallback: create a simpler context
             simple_context = {
                 file_key: {
@@ -321,6 +366,7 @@ async def deeper_insights_csv(
                     'shape': info['shape'],
                     'columns': info['columns'],
                     'total_rows': info['total_rows'],
+                    'facts': info['facts'],
                     'sample_data': info['sample_data'][:10]  # Only first 10 rows
                 }
                 for file_key, info in dataframes.items()
@@ -334,19 +380,21 @@ async def deeper_insights_csv(
         prompt = INSIGHTS_PROMPT.format(
             question=question,
             language=language or "English",
-            context=context_str
+            context=context_str,
+            relationships=format_relationships(relationships) if len(dataframes) > 1 else "(single file)"
         )
         
-        print("Calling Gemini model for insights...")
         
         # Call the Gemini model with the insights prompt
-        response = model.generate_content(prompt)
-        print(f"Generated insights successfully")
+        with stage("insights"):
+            response = await generate_content_async(model, prompt)
+        logger.debug("Generated insights")
         
         # Store comprehensive session data
         if sessionId:
             if sessionId not in chat_sessions:
                 chat_sessions[sessionId] = []
+            touch_session(sessionId)
             
             # Store comprehensive context for this session
             session_context = {
@@ -359,10 +407,13 @@ async def deeper_insights_csv(
                 "language": language,
                 "interaction_type": "initial_upload",
                 "dataframes_context": dataframes,  # Store the full context
-                "dataframes_raw": dataframes_raw  # Store actual DataFrames (note: this might cause memory issues in production)
+                "dataframes_raw": dataframes_raw,  # Store actual DataFrames (note: this might cause memory issues in production)
+                "row_indexes": row_indexes,
+                "relationships": relationships
             }
             
             chat_sessions[sessionId].append(session_context)
+            conversation_compactor.schedule(sessionId)
         
         # Prepare file processing summary
         files_processed = []
@@ -387,10 +438,10 @@ async def deeper_insights_csv(
         }
         
     except HTTPException as he:
-        print(f"HTTP Exception: {he.detail}")
+        logger.info("HTTP exception in deeper_insights_csv: %s", he.detail)
         raise he
     except Exception as e:
-        print(f"Unexpected error in deeper_insights_csv: {str(e)}")
+        logger.exception("Unexpected error in deeper_insights_csv")
         raise HTTPException(status_code=500, detail=f"Error during CSV insights analysis: {str(e)}")
 
 
@@ -409,11 +460,16 @@ async def get_chat_session(session_id: str):
                 cleaned_entry['dataframes_raw'] = {
                     k: f"DataFrame with shape {v.shape}" for k, v in cleaned_entry['dataframes_raw'].items()
                 }
+            if 'row_indexes' in cleaned_entry:
+                cleaned_entry['row_indexes'] = {
+                    k: f"Row index over {v.rows} rows" for k, v in cleaned_entry['row_indexes'].items()
+                }
             session_history.append(cleaned_entry)
         
         return {
             "sessionId": session_id,
             "history": session_history,
+            "summary": chat_summaries.get(session_id),
             "message_count": len(chat_sessions[session_id]),
             "has_data_context": any('dataframes_context' in entry for entry in chat_sessions[session_id])
         }
@@ -428,6 +484,7 @@ async def clear_chat_session(session_id: str):
     """
     if session_id in chat_sessions:
         del chat_sessions[session_id]
+        conversation_compactor.forget(session_id)
         return {"message": f"Session {session_id} cleared successfully"}
     else:
         raise HTTPException(status_code=404, detail="Session not found")
\ No newline at end of file
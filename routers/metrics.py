@@ -0,0 +1,36 @@
+from fastapi import APIRouter
+from services.singleflight import ask_flight, summarize_flight
+from services.result_cache import result_cache
+from services.plan_cache import plan_cache
+from services.result_store import result_store
+from services.schema_registry import schema_registry
+from services.mongo_executor import mongo_executor
+from services.loop_monitor import loop_monitor
+from services.insight_cache import insight_cache
+from services.chat_history import conversation_compactor
+from services.frame_append import frame_appender
+from services.rollup import rollup_cubes
+from utility.log import logging_stats
+
+router = APIRouter()
+
+@router.get("/metrics")
+async def get_metrics():
+    """Report in-process counters for request coalescing and caches"""
+    return {
+        "coalescing": {
+            "ask": ask_flight.stats(),
+            "summarize": summarize_flight.stats()
+        },
+        "result_cache": result_cache.stats(),
+        "plan_cache": plan_cache.stats(),
+        "result_store": result_store.stats(),
+        "schema_registry": schema_registry.stats(),
+        "insight_cache": insight_cache.stats(),
+        "chat_history": conversation_compactor.stats(),
+        "appends": frame_appender.stats(),
+        "rollup": rollup_cubes.stats(),
+        "mongo_execution": mongo_executor.stats(),
+        "event_loop": loop_monitor.stats(),
+        "logging": logging_stats()
+    }
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Form, HTTPException
+from typing import Optional
+from services.schema_registry import schema_registry
+
+router = APIRouter()
+
+@router.post("/mongo-schema")
+async def register_mongo_schema(
+    schema_id: str = Form(...),
+    db_schema: str = Form(...),
+    context: str = Form("")
+):
+    """Register a database schema (and context) once for a session or tenant id, for use by /ask-mongo"""
+    if not db_schema.strip():
+        raise HTTPException(status_code=400, detail="db_schema must not be empty")
+    return schema_registry.register(schema_id, db_schema, context)
+
+
+@router.get("/mongo-schema/{schema_id}")
+async def get_mongo_schema(schema_id: str, version: Optional[int] = None, include_schema: bool = False):
+    """Describe a registered schema; include_schema=true also returns the stored text of the version"""
+    description = schema_registry.describe(schema_id)
+    if description is None:
+        raise HTTPException(status_code=404, detail="No schema registered for this id")
+    if include_schema:
+        registered = schema_registry.get(schema_id, version)
+        if registered is None:
+            raise HTTPException(status_code=404, detail=f"Version {version} is not available")
+        description.update(registered)
+    return description
+
+
+@router.delete("/mongo-schema/{schema_id}")
+async def delete_mongo_schema(schema_id: str):
+    """Remove every version of a registered schema"""
+    if not schema_registry.delete(schema_id):
+        raise HTTPException(status_code=404, detail="No schema registered for this id")
+    return {"message": f"Schema {schema_id} deleted successfully"}
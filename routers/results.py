@@ -0,0 +1,63 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from utility.serialization import frame_to_records, series_to_dict
+from services.result_store import result_store, EXPORT_FORMATS, RESULT_MAX_PAGE_SIZE, RESULT_PAGE_SIZE
+import asyncio
+
+router = APIRouter()
+
+
+_NOT_FOUND = "Result not found. It may have expired or the data was re-uploaded; ask the question again."
+
+
+def _stored_result(session_id, handle_id):
+    entry = result_store.get(session_id, handle_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=_NOT_FOUND)
+    return entry
+
+
+@router.get("/results/{handle_id}")
+async def get_result_page(
+    handle_id: str,
+    session_id: str = Query(...),
+    cursor: str = Query("0"),
+    limit: int = Query(RESULT_PAGE_SIZE, ge=1, le=RESULT_MAX_PAGE_SIZE)
+):
+    """Return one page of a stored /ask result; pass next_cursor back to get the following page"""
+    entry = _stored_result(session_id, handle_id)
+    try:
+        offset = int(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if offset < 0 or offset > entry["rows"]:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    try:
+        page = await asyncio.to_thread(result_store.read_page, entry, offset, limit)
+    except FileNotFoundError:
+        # Evicted while the page was being read
+        raise HTTPException(status_code=404, detail=_NOT_FOUND)
+    if entry["kind"] == "series":
+        result = series_to_dict(page.iloc[:, 0])
+    else:
+        result = frame_to_records(page)
+    return {"result": result, **result_store.describe(handle_id, cursor=offset, page_size=limit, entry=entry)}
+
+
+@router.get("/results/{handle_id}/download")
+async def download_result(
+    handle_id: str,
+    session_id: str = Query(...),
+    format: str = Query("csv")
+):
+    """Stream a stored /ask result as Arrow IPC, Parquet or CSV"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Use one of: {', '.join(EXPORT_FORMATS)}")
+    entry = _stored_result(session_id, handle_id)
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        result_store.stream(entry, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="result-{handle_id}.{extension}"'}
+    )
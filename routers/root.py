@@ -1,8 +1,8 @@
 from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from utility.serialization import ORJSONResponse
 
 router = APIRouter()
 
 @router.get("/")
 async def root():
-    return JSONResponse(content={"message": "Welcome to the Data Analysis API. Upload a CSV or Excel file and ask questions about your data."})
\ No newline at end of file
+    return ORJSONResponse(content={"message": "Welcome to the Data Analysis API. Upload a CSV or Excel file and ask questions about your data."})
\ No newline at end of file
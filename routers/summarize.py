@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Request, HTTPException
-from utility.utils import NpEncoder, get_genai_client
+from utility.utils import NpEncoder, get_genai_client, generate_content_async
 from prompt.summary_prompt import SUMMARY_PROMPT
+from services.singleflight import summarize_flight, normalize_question
+import hashlib
 import json
 
 router = APIRouter()
@@ -22,23 +24,33 @@ async def summarize_data(request: Request):
         # Convert data to string representation for the model
         data_str = json.dumps(input_data, cls=NpEncoder, indent=2)
         
-        # Get Gemini client
-        model = get_genai_client()
-        
-        # Create a combined prompt without using system role
-        prompt = SUMMARY_PROMPT.format(
-            question=user_question,
-            language=language,
-            data=data_str
+        # Identical requests arriving while one is already being summarized share its result
+        data_hash = hashlib.sha1(data_str.encode("utf-8")).hexdigest()
+        flight_key = (data_hash, normalize_question(user_question), language.lower())
+        return await summarize_flight.run(
+            flight_key,
+            lambda: _summarize(user_question, language, data_str)
         )
         
-        # Call the Gemini model with the combined prompt
-        response = model.generate_content(prompt)
-        
-        # Return the summary
-        return {"summary": response.text}
-        
     except HTTPException as he:
         raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error during summarization: {str(e)}")
+
+
+async def _summarize(user_question, language, data_str):
+    # Get Gemini client
+    model = get_genai_client()
+    
+    # Create a combined prompt without using system role
+    prompt = SUMMARY_PROMPT.format(
+        question=user_question,
+        language=language,
+        data=data_str
+    )
+    
+    # Call the Gemini model with the combined prompt
+    response = await generate_content_async(model, prompt)
+    
+    # Return the summary
+    return {"summary": response.text}
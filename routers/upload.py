@@ -1,14 +1,52 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Form
-from fastapi.responses import JSONResponse
+from utility.serialization import ORJSONResponse, frame_to_records
 import pandas as pd
-import numpy as np
+import asyncio
 import io
-from utility.utils import sanitize_for_json
-from state import uploaded_df, uploaded_file_info
-from services.insights import generate_insights_from_gemini
+from state import uploaded_df, uploaded_file_info, dataset_versions, bump_dataset_version, touch_session
+from services.frame_append import frame_appender, read_dtypes, column_profile, merge_profiles, SchemaMismatch
+from services.rollup import rollup_cubes
+from services.insight_cache import insight_cache
+from services.result_cache import result_cache
+from services.result_store import result_store
+from utility.timing import stage
 
 router = APIRouter()
 
+
+def _read_csv(contents, **kwargs):
+    """Parse CSV bytes, trying other encodings if UTF-8 fails; returns the frame and the encoding used"""
+    try:
+        return pd.read_csv(io.BytesIO(contents), **kwargs), "utf-8"
+    except UnicodeDecodeError:
+        # Try with different encodings
+        encodings = ['latin-1', 'iso-8859-1', 'windows-1252', 'cp1252']
+        for encoding in encodings:
+            try:
+                return pd.read_csv(io.BytesIO(contents), encoding=encoding, **kwargs), encoding
+            except Exception:
+                continue
+        raise HTTPException(status_code=400, 
+            detail="Unable to decode CSV file. Please try saving it with UTF-8 encoding.")
+
+
+def _excel_as_csv(contents, **kwargs):
+    """Read an Excel file through CSV, so its columns get the types a CSV upload would"""
+    try:
+        excel_df = pd.read_excel(io.BytesIO(contents))
+    
+        # Convert Excel DataFrame to CSV format (in memory)
+        csv_buffer = io.StringIO()
+        excel_df.to_csv(csv_buffer, index=False)
+        csv_buffer.seek(0)
+    
+        # Read back the CSV data
+        return pd.read_csv(csv_buffer, **kwargs)
+    except Exception as excel_error:
+        raise HTTPException(status_code=400, 
+            detail=f"Error processing Excel file: {str(excel_error)}")
+
+
 @router.post("/upload")
 async def upload_file(file: UploadFile = File(...), session_id: str = Form(...)):
     """Upload Excel or CSV file, convert Excel to CSV if needed, store as a pandas DataFrame and generate insights"""
@@ -21,58 +59,47 @@ async def upload_file(file: UploadFile = File(...), session_id: str = Form(...))
             original_file_type = "csv" if file.filename.endswith('.csv') else "excel"
             encoding_used = "utf-8"  # Default encoding
             
-            # Convert to pandas dataframe based on file type
-            if file.filename.endswith('.csv'):
-                # Try reading with different encodings if UTF-8 fails
-                try:
-                    df = pd.read_csv(io.BytesIO(contents))
-                except UnicodeDecodeError:
-                    # Try with different encodings
-                    encodings = ['latin-1', 'iso-8859-1', 'windows-1252', 'cp1252']
-                    for encoding in encodings:
-                        try:
-                            df = pd.read_csv(io.BytesIO(contents), encoding=encoding)
-                            encoding_used = encoding
-                            break
-                        except Exception:
-                            continue
-                    else:
-                        raise HTTPException(status_code=400, 
-                            detail="Unable to decode CSV file. Please try saving it with UTF-8 encoding.")
-            else:  # Excel file
-                try:
-                    excel_df = pd.read_excel(io.BytesIO(contents))
-                    
-                    # Convert Excel DataFrame to CSV format (in memory)
-                    csv_buffer = io.StringIO()
-                    excel_df.to_csv(csv_buffer, index=False)
-                    csv_buffer.seek(0)
-                    
-                    # Read back the CSV data
-                    df = pd.read_csv(csv_buffer)
-                except Exception as excel_error:
-                    raise HTTPException(status_code=400, 
-                        detail=f"Error processing Excel file: {str(excel_error)}")
+            with stage("parse", file_type=original_file_type):
+                # Convert to pandas dataframe based on file type
+                if file.filename.endswith('.csv'):
+                    # Try reading with different encodings if UTF-8 fails
+                    df, encoding_used = _read_csv(contents)
+                else:  # Excel file
+                    df = _excel_as_csv(contents)
             
-            # Store the dataframe and file info with the session ID
-            uploaded_df[session_id] = df
-            uploaded_file_info[session_id] = {
-                "original_filename": original_filename,
-                "original_type": original_file_type,
-                "converted_to_csv": original_file_type == "excel",
-                "encoding": encoding_used
-            }
+            with stage("profile"):
+                # Get column information
+                columns = df.columns.tolist()
             
-            # Get column information
-            columns = df.columns.tolist()
+                # Get the first 10 rows for preview, sanitized for JSON
+                sample_data_dict = frame_to_records(df.head(20))
+                
+                # Column statistics, kept up to date by /append
+                profile = await asyncio.to_thread(column_profile, df)
             
-            # Get the first 10 rows for preview
-            sample_data = df.head(20).replace({np.nan: None})
-            # Ensure all data is properly sanitized for JSON
-            sample_data_dict = sanitize_for_json(sample_data.to_dict(orient='records'))
+            # Store the dataframe and file info with the session ID; an /append
+            # in flight finishes first instead of writing over the new frame
+            async with frame_appender.lock(session_id):
+                uploaded_df[session_id] = df
+                uploaded_file_info[session_id] = {
+                    "original_filename": original_filename,
+                    "original_type": original_file_type,
+                    "converted_to_csv": original_file_type == "excel",
+                    "encoding": encoding_used,
+                    "profile": profile,
+                    "appends": 0
+                }
+                version = bump_dataset_version(session_id)
+                touch_session(session_id)
+                result_cache.invalidate_session(session_id)
+                result_store.invalidate_session(session_id)
+                frame_appender.drop_buffers(session_id)
+                # Group-by aggregates for /ask, precomputed off the response path
+                rollup_cubes.schedule(session_id, version, df)
             
-            # Generate insights using Gemini
-            insights = await generate_insights_from_gemini(df)
+            # Generate insights using Gemini, or reuse those of an upload with the same profile
+            with stage("insights"):
+                insights = await insight_cache.get(df)
             
             conversion_message = ""
             if original_file_type == "excel":
@@ -80,7 +107,7 @@ async def upload_file(file: UploadFile = File(...), session_id: str = Form(...))
             elif encoding_used != "utf-8":
                 conversion_message = f" File was read using {encoding_used} encoding."
             
-            # Return sanitized data using JSONResponse with the custom encoder
+            # Return sanitized data using the orjson response class
             response_data = {
                 "filename": original_filename,
                 "columns": columns,
@@ -89,10 +116,11 @@ async def upload_file(file: UploadFile = File(...), session_id: str = Form(...))
                 "converted_to_csv": original_file_type == "excel",
                 "encoding_used": encoding_used,
                 "insights": insights,
+                "profile": profile,
                 "message": f"File uploaded successfully.{conversion_message} You can now ask questions about your data."
             }
             
-            return JSONResponse(content=response_data, media_type="application/json")
+            return ORJSONResponse(content=response_data, media_type="application/json")
             
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Error processing file: {str(e)}")
@@ -101,3 +129,76 @@ async def upload_file(file: UploadFile = File(...), session_id: str = Form(...))
 
 
 
+
+
+
+@router.post("/append")
+async def append_rows(file: UploadFile = File(...), session_id: str = Form(...), skip_existing: bool = Form(False)):
+    """
+    Append the rows of a CSV or Excel file to the session's uploaded data.
+
+    The file must have the session's columns. Only its rows are parsed, with
+    text columns kept as text and checked against the session's types, and
+    they are added without copying the rows already stored. The profile and
+    the dataset version are updated; insights are not generated again. With
+    skip_existing, the file is the whole grown export and as many leading
+    rows as the session already holds are skipped (unparsed, for CSV).
+    """
+    if session_id not in uploaded_df:
+        raise HTTPException(status_code=404, detail="No file uploaded for this session. Please upload a file first.")
+    if not file.filename.endswith(('.csv', '.xlsx', '.xls')):
+        raise HTTPException(status_code=400, detail="Only CSV and Excel files are supported")
+    contents = await file.read()
+    
+    async with frame_appender.lock(session_id):
+        df = uploaded_df.get(session_id)
+        if df is None:
+            raise HTTPException(status_code=404, detail="No file uploaded for this session. Please upload a file first.")
+        previous_version = dataset_versions.get(session_id)
+        # Header plus the rows the session already has
+        skip = range(1, len(df) + 1) if skip_existing else None
+        
+        with stage("parse"):
+            if file.filename.endswith('.csv'):
+                rows, _ = await asyncio.to_thread(_read_csv, contents, dtype=read_dtypes(df), skiprows=skip)
+            else:
+                rows = await asyncio.to_thread(_excel_as_csv, contents, dtype=read_dtypes(df), skiprows=skip)
+        if rows.empty:
+            raise HTTPException(status_code=400, detail="The file has no new rows to append")
+        
+        with stage("append"):
+            try:
+                combined, promotions = await asyncio.to_thread(frame_appender.append, session_id, df, rows)
+            except SchemaMismatch as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            # The rows as stored, numbered where they landed
+            appended = combined.iloc[len(df):]
+        
+        with stage("profile"):
+            added_profile = await asyncio.to_thread(column_profile, appended)
+            file_info = uploaded_file_info.setdefault(session_id, {})
+            profile = file_info.get("profile")
+            if profile is None:
+                profile = await asyncio.to_thread(column_profile, combined)
+            else:
+                profile = merge_profiles(profile, added_profile)
+        
+        uploaded_df[session_id] = combined
+        file_info["profile"] = profile
+        file_info["appends"] = file_info.get("appends", 0) + 1
+        version = bump_dataset_version(session_id)
+        touch_session(session_id)
+        await result_cache.advance_dataset_hash(session_id, version, previous_version, appended)
+        result_store.invalidate_session(session_id)
+        rollup_cubes.schedule(session_id, version, combined)
+    
+    return ORJSONResponse(content={
+        "filename": file.filename,
+        "num_rows_appended": len(appended),
+        "num_rows_total": len(combined),
+        "promoted_columns": {str(col): str(dtype) for col, dtype in promotions.items()},
+        "appended_rows_preview": frame_to_records(appended.head(10)),
+        "profile": profile,
+        "dataset_version": version,
+        "message": f"Appended {len(appended)} rows. You can now ask questions about the updated data."
+    }, media_type="application/json")
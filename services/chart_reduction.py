@@ -0,0 +1,211 @@
+import numpy as np
+import pandas as pd
+from pandas.api import types as ptypes
+
+# Bounds for the max_points parameter of /ask
+MIN_CHART_POINTS = 3
+MAX_CHART_POINTS = 5000
+OTHER_LABEL = "Other"
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Positions of the points kept by Largest-Triangle-Three-Buckets downsampling.
+
+    x must be sorted. The first and last points are always kept; every bucket
+    in between contributes the point forming the largest triangle with the
+    previously kept point and the average of the next bucket, which preserves
+    peaks and troughs that plain striding would drop.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    # threshold - 2 buckets over the points between the first and the last
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(area.argmax())
+        selected[bucket + 1] = previous
+    return selected
+
+
+def _axis_values(values):
+    """Float positions for an ordered x axis (numbers or datetimes), or None"""
+    values = pd.Series(values)
+    if ptypes.is_object_dtype(values.dtype) or ptypes.is_string_dtype(values.dtype):
+        # CSV uploads keep dates as text; ISO 8601 strings still make a time axis
+        parsed = pd.to_datetime(values, errors="coerce", format="ISO8601")
+        if parsed.isna().any():
+            return None
+        values = parsed
+    if ptypes.is_datetime64_any_dtype(values.dtype):
+        if values.isna().any():
+            return None
+        positions = values.astype("int64").to_numpy(dtype=np.float64)
+    elif ptypes.is_numeric_dtype(values.dtype) and not ptypes.is_bool_dtype(values.dtype):
+        positions = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        if np.isnan(positions).any():
+            return None
+    else:
+        return None
+    if len(positions) > 1 and not (np.diff(positions) >= 0).all():
+        return None
+    return positions
+
+
+def _name(label):
+    return None if label is None else str(label)
+
+
+def _is_measure(series):
+    return ptypes.is_numeric_dtype(series.dtype) and not ptypes.is_bool_dtype(series.dtype)
+
+
+def _is_category(series):
+    return (ptypes.is_object_dtype(series.dtype) or ptypes.is_string_dtype(series.dtype)
+            or isinstance(series.dtype, pd.CategoricalDtype) or ptypes.is_bool_dtype(series.dtype))
+
+
+def _lttb(frame, x, y_column, max_points):
+    y = frame[y_column].to_numpy(dtype=np.float64, na_value=np.nan)
+    keep = ~np.isnan(y)
+    positions = np.flatnonzero(keep)[lttb_indices(x[keep], y[keep], max_points)]
+    return frame.iloc[positions]
+
+
+def _histogram(values, max_points):
+    values = values.dropna().to_numpy(dtype=np.float64)
+    values = values[np.isfinite(values)]
+    edges = np.histogram_bin_edges(values, bins="auto")
+    if len(edges) - 1 > max_points:
+        edges = np.histogram_bin_edges(values, bins=max_points)
+    counts, edges = np.histogram(values, bins=edges)
+    return pd.DataFrame({
+        "bin": [f"{low:g} - {high:g}" for low, high in zip(edges[:-1], edges[1:])],
+        "bin_start": edges[:-1],
+        "bin_end": edges[1:],
+        "count": counts,
+    })
+
+
+def _row_labels(index):
+    """An index that only numbers rows: the default one, or what filtering or sorting left of it"""
+    return isinstance(index, pd.RangeIndex) or (index.name is None and ptypes.is_integer_dtype(index.dtype))
+
+
+def _index_labels(index):
+    """Index labels as text, joined for a MultiIndex"""
+    if isinstance(index, pd.MultiIndex):
+        return [", ".join(map(str, key)) for key in index]
+    return [str(label) for label in index]
+
+
+def _top_k(frame, label_column, value_column, max_points):
+    # By position, largest magnitude first and missing values last: labels may repeat (e.g. after pd.concat)
+    magnitude = frame[value_column].abs().to_numpy(dtype=np.float64, na_value=np.nan)
+    order = np.argsort(-magnitude, kind="stable")
+    kept = frame.iloc[order[:max_points - 1]]
+    rest = frame.iloc[order[max_points - 1:]]
+    # Only the plotted value is summed; other columns may be means, rates or prices, which do not add up
+    other = {label_column: OTHER_LABEL, value_column: rest[value_column].sum()}
+    return pd.concat([kept, pd.DataFrame([other], columns=frame.columns)], ignore_index=True), len(rest)
+
+
+def _reduce_series(series, max_points):
+    if not _is_measure(series):
+        return None
+    index = series.index
+    if _row_labels(index):
+        # Raw values with no meaningful position: chart their distribution
+        return _histogram(series, max_points), {"method": "histogram", "column": _name(series.name)}
+    x = _axis_values(index.to_series()) if not isinstance(index, pd.MultiIndex) else None
+    if x is not None:
+        frame = series.to_frame()
+        reduced = _lttb(frame, x, frame.columns[0], max_points)
+        return reduced.iloc[:, 0], {"method": "lttb", "x": _name(index.name), "y": _name(series.name)}
+    if isinstance(index, pd.MultiIndex) or _is_category(index.to_series()):
+        frame = pd.DataFrame({"label": _index_labels(index), "value": series.to_numpy()})
+        reduced, folded = _top_k(frame, "label", "value", max_points)
+        series = pd.Series(reduced["value"].to_numpy(), index=reduced["label"].astype(str).to_numpy(), name=series.name)
+        return series, {"method": "top_k", "other_rows": folded, "other_aggregation": "sum"}
+    return None
+
+
+def _reduce_frame(frame, max_points):
+    measures = [column for column in frame.columns if _is_measure(frame[column])]
+    if not measures:
+        return None
+    index = frame.index
+    # An ordered datetime or numeric index, or first column, with a measure: a line chart.
+    # Row numbers left by filtering are ordered too, but are no axis.
+    if not (_row_labels(index) or isinstance(index, pd.MultiIndex)):
+        x = _axis_values(index.to_series())
+        if x is not None:
+            return _lttb(frame, x, measures[0], max_points), {"method": "lttb", "x": _name(frame.index.name), "y": str(measures[0])}
+    x_column = frame.columns[0]
+    y_column = next((column for column in measures if column != x_column), None)
+    x = _axis_values(frame[x_column]) if y_column is not None else None
+    if x is not None:
+        return _lttb(frame, x, y_column, max_points), {"method": "lttb", "x": str(x_column), "y": str(y_column)}
+    labels = [column for column in frame.columns if _is_category(frame[column])]
+    if len(labels) == 1:
+        # One label column with measures: a breakdown, folded into top K plus "Other"
+        reduced, folded = _top_k(frame, labels[0], measures[0], max_points)
+        return reduced, {"method": "top_k", "label": str(labels[0]), "value": str(measures[0]),
+                         "other_rows": folded, "other_aggregation": "sum"}
+    if not labels and not _row_labels(index) and (isinstance(index, pd.MultiIndex) or _is_category(index.to_series())):
+        # Grouped results keep their group labels in the index; records drop the index,
+        # so the labels become the first column of the reduced frame
+        label_column = ", ".join(str(level) for level in index.names if level is not None) or "label"
+        while label_column in frame.columns:
+            label_column = f"_{label_column}"
+        labelled = frame.reset_index(drop=True)
+        labelled.insert(0, label_column, _index_labels(index))
+        reduced, folded = _top_k(labelled, label_column, measures[0], max_points)
+        return reduced, {"method": "top_k", "label": label_column, "value": str(measures[0]),
+                         "other_rows": folded, "other_aggregation": "sum"}
+    if len(frame.columns) == 1:
+        return _histogram(frame.iloc[:, 0], max_points), {"method": "histogram", "column": str(frame.columns[0])}
+    return None
+
+
+def reduce_for_chart(result, max_points):
+    """
+    Shrink a DataFrame or Series result to at most max_points chart points.
+
+    Ordered numeric series are downsampled with LTTB, raw continuous values
+    are binned into a histogram and category breakdowns keep the top K with
+    the remainder of the plotted value summed into an "Other" bucket (its
+    other columns are left empty). Returns the reduced result
+    and a report of what was done; results that already fit are returned
+    as they are and ones that match none of the shapes are truncated.
+    """
+    if not isinstance(result, (pd.DataFrame, pd.Series)):
+        return result, None
+    original_points = len(result)
+    if original_points <= max_points:
+        return result, {"method": "none", "original_points": original_points, "points": original_points}
+    try:
+        if isinstance(result, pd.Series):
+            reduced = _reduce_series(result, max_points)
+        else:
+            reduced = _reduce_frame(result, max_points)
+    except (TypeError, ValueError):
+        reduced = None
+    if reduced is None:
+        return result.head(max_points), {"method": "truncate", "original_points": original_points, "points": max_points}
+    reduced, report = reduced
+    return reduced, {**report, "original_points": original_points, "points": len(reduced)}
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import os
+import time
+from prompt.chat_history_prompt import CHAT_HISTORY_SUMMARY_PROMPT
+from state import chat_sessions, chat_summaries
+from utility.utils import gemini_model, generate_content_async
+
+# Tokens of conversation history in a chat prompt, running summary and recent exchanges together
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", 3000))
+# Part of that budget the running summary of older exchanges may take
+CHAT_SUMMARY_TOKEN_BUDGET = int(os.getenv("CHAT_SUMMARY_TOKEN_BUDGET", 1000))
+# Latest exchanges kept word for word; older ones are folded into the summary
+CHAT_RECENT_EXCHANGES = int(os.getenv("CHAT_RECENT_EXCHANGES", 2))
+
+# Rough size of a token for English text and JSON; close enough for budgeting without a tokenizer call
+CHARS_PER_TOKEN = 4
+# An exchange squeezed below this is not worth showing; older ones are dropped instead
+_MIN_EXCHANGE_TOKENS = 100
+# Longest an exchange is when handed to the summarizer
+_MAX_FOLD_EXCHANGE_TOKENS = 4000
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+def clip(text, tokens):
+    """text cut to about tokens; answers open with their summary, so the head is what is kept"""
+    limit = tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit].rstrip() + " ...[truncated]"
+
+
+def exchanges(entries):
+    """(question, response, language) of a session's entries with an answer, oldest first"""
+    return [
+        (entry.get('question', ''), entry.get('response', ''), entry.get('language'))
+        for entry in entries if 'response' in entry
+    ]
+
+
+def _format_exchange(question, response):
+    return f"Previous Q: {question}\nPrevious A: {response}\n---"
+
+
+def _fair_shares(sizes, budget):
+    """Split budget over sizes: each gets an equal share, and what a small one leaves over goes to the rest"""
+    shares = [0] * len(sizes)
+    left = len(sizes)
+    for i in sorted(range(len(sizes)), key=sizes.__getitem__):
+        shares[i] = min(sizes[i], budget // left)
+        budget -= shares[i]
+        left -= 1
+    return shares
+
+
+class ConversationCompactor:
+    """
+    Conversation history for chat prompts at a fixed token budget.
+
+    A chat prompt gets the session's running summary plus the exchanges not
+    yet folded into it, all within CHAT_HISTORY_TOKEN_BUDGET. After each turn,
+    every exchange but the latest CHAT_RECENT_EXCHANGES is folded into the
+    summary by a background Gemini call, off the response path; the summary
+    is kept in state.chat_summaries with the number of exchanges it covers.
+    Until a fold finishes, or if it fails, the unfolded exchanges share the
+    rest of the budget, the newest kept first, so a prompt never grows with
+    the length of the conversation.
+    """
+
+    def __init__(self, budget=CHAT_HISTORY_TOKEN_BUDGET, summary_budget=CHAT_SUMMARY_TOKEN_BUDGET,
+                 recent=CHAT_RECENT_EXCHANGES):
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.recent = recent
+        self._compacting = set()
+        self._tasks = set()
+        self.folds = 0
+        self.folded_exchanges = 0
+        self.failed_folds = 0
+        self.fold_seconds = 0.0
+
+    def history(self, session_id, entries):
+        """Conversation history for the prompt of the next question in a session"""
+        turns = exchanges(entries)
+        summary = chat_summaries.get(session_id)
+        folded = 0
+        parts = []
+        if summary and summary['folded'] <= len(turns):
+            folded = summary['folded']
+            text = clip(summary['summary'], self.summary_budget)
+            parts.append(f"Summary of the {folded} earlier exchanges:\n{text}\n---")
+        pending = turns[folded:]
+        budget = self.budget - sum(estimate_tokens(part) for part in parts)
+        # Drop the oldest exchanges until each of the rest can keep a useful part of its answer
+        while pending and budget // len(pending) < _MIN_EXCHANGE_TOKENS:
+            pending = pending[1:]
+        texts = [_format_exchange(question, response) for question, response, _ in pending]
+        shares = _fair_shares([estimate_tokens(text) for text in texts], max(budget, 0))
+        parts.extend(clip(text, share) for text, share in zip(texts, shares))
+        return "\n".join(parts)
+
+    def schedule(self, session_id):
+        """Start folding the session's older exchanges in the background when there are any to fold"""
+        if session_id in self._compacting or not self._to_fold(session_id)[1]:
+            return
+        self._compacting.add(session_id)
+        task = asyncio.get_running_loop().create_task(self._compact(session_id))
+        # The loop only keeps weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _to_fold(self, session_id):
+        """(entries, exchanges to fold, summary so far) of a session"""
+        entries = chat_sessions.get(session_id)
+        if entries is None:
+            return None, [], None
+        turns = exchanges(entries)
+        summary = chat_summaries.get(session_id)
+        if summary is not None and summary['folded'] > len(turns):
+            summary = None
+        folded = summary['folded'] if summary else 0
+        return entries, turns[folded:len(turns) - self.recent], summary
+
+    async def _compact(self, session_id):
+        try:
+            # Turns answered while a fold runs are picked up by the next pass
+            while True:
+                entries, to_fold, summary = self._to_fold(session_id)
+                if not to_fold:
+                    return
+                text = await self._fold(summary['summary'] if summary else "", to_fold)
+                if chat_sessions.get(session_id) is not entries:
+                    # Cleared or evicted meanwhile
+                    return
+                chat_summaries[session_id] = {
+                    'summary': text,
+                    'folded': (summary['folded'] if summary else 0) + len(to_fold),
+                    'updated': time.time()
+                }
+                self.folded_exchanges += len(to_fold)
+        except Exception as e:
+            self.failed_folds += 1
+            logger.warning("Folding chat history failed; older exchanges stay unfolded: %s", e, extra={"session_id": session_id})
+        finally:
+            self._compacting.discard(session_id)
+
+    async def _fold(self, summary, to_fold):
+        language = next((lang for _, _, lang in reversed(to_fold) if lang), "English")
+        prompt = CHAT_HISTORY_SUMMARY_PROMPT.format(
+            summary=summary or "(empty)",
+            exchanges="\n".join(clip(_format_exchange(q, a), _MAX_FOLD_EXCHANGE_TOKENS) for q, a, _ in to_fold),
+            language=language,
+            # About three words per four tokens
+            max_words=self.summary_budget * 3 // 4
+        )
+        model = gemini_model(os.environ.get("GEMINI_API_KEY"), 'gemini-2.0-flash')
+        start = time.perf_counter()
+        response = await generate_content_async(
+            model,
+            prompt,
+            generation_config={"temperature": 0.2, "max_output_tokens": self.summary_budget}
+        )
+        self.fold_seconds += time.perf_counter() - start
+        self.folds += 1
+        return clip(response.text.strip(), self.summary_budget)
+
+    def forget(self, session_id):
+        chat_summaries.pop(session_id, None)
+
+    async def close(self):
+        """Cancel folds still running"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "budget_tokens": self.budget,
+            "summaries": len(chat_summaries),
+            "folds": self.folds,
+            "folded_exchanges": self.folded_exchanges,
+            "failed_folds": self.failed_folds,
+            "mean_fold_ms": round(1000 * self.fold_seconds / self.folds, 1) if self.folds else None,
+            "compacting": len(self._compacting),
+        }
+
+
+conversation_compactor = ConversationCompactor()
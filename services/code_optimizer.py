@@ -0,0 +1,332 @@
+import ast
+from dataclasses import dataclass, field
+
+# Group aggregations a loop body may use and that groupby().agg() understands
+_GROUP_AGGREGATIONS = {"sum", "mean", "min", "max", "count", "median", "std", "var", "nunique", "first", "last", "size"}
+_ARITHMETIC = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+# Operators whose Python and NumPy results differ for some operands: x / 0 raises in the
+# lambda but is inf for a column, and (-8) ** (1 / 3) is complex in Python but NaN in NumPy
+_DIVISION = (ast.Div, ast.FloorDiv, ast.Mod)
+_SORT_ARGUMENTS = {"by", "ascending"}
+
+
+@dataclass
+class OptimizationResult:
+    code: str
+    rewrites: list = field(default_factory=list)
+    warnings: list = field(default_factory=list)
+
+    @property
+    def changed(self):
+        return bool(self.rewrites)
+
+
+def optimize_code(code):
+    """
+    Rewrite slow pandas idioms in generated code into vectorized equivalents.
+
+    Handles sort_values().head(n) -> nlargest/nsmallest, row-wise and
+    element-wise apply(lambda) made of plain arithmetic -> column arithmetic,
+    and Python loops over groupby() that collect one aggregate per group ->
+    groupby().agg(). Slow patterns that are not rewritten are reported as
+    warnings. Code that cannot be parsed is returned unchanged.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return OptimizationResult(code)
+
+    optimizer = _Optimizer()
+    tree = optimizer.visit(tree)
+    result = OptimizationResult(code, optimizer.rewrites, optimizer.warnings)
+    if optimizer.rewrites:
+        result.code = ast.unparse(ast.fix_missing_locations(tree))
+    result.warnings.extend(_find_slow_patterns(tree))
+    return result
+
+
+class _Optimizer(ast.NodeTransformer):
+    def __init__(self):
+        self.rewrites = []
+        self.warnings = []
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        return self._sort_head(node) or self._vectorize_apply(node) or node
+
+    def visit_For(self, node):
+        self.generic_visit(node)
+        return self._group_loop(node) or node
+
+    # sort_values(...).head(n) -> nlargest(n, ...) / nsmallest(n, ...)
+    def _sort_head(self, node):
+        if not (_is_method(node, "head") and isinstance(node.func.value, ast.Call)
+                and _is_method(node.func.value, "sort_values")):
+            return None
+        if len(node.args) > 1 or node.keywords:
+            return None
+        n = node.args[0] if node.args else ast.Constant(5)
+        if not (isinstance(n, ast.Constant) and isinstance(n.value, int)):
+            return None
+
+        sort_call = node.func.value
+        if len(sort_call.args) > 1 or any(kw.arg not in _SORT_ARGUMENTS for kw in sort_call.keywords):
+            return None
+        keywords = {kw.arg: kw.value for kw in sort_call.keywords}
+        by = sort_call.args[0] if sort_call.args else keywords.get("by")
+        ascending = _constant_bool(keywords.get("ascending", ast.Constant(True)))
+        if ascending is None or (by is not None and not _is_column_labels(by)):
+            return None
+
+        method = "nsmallest" if ascending else "nlargest"
+        args = [n] if by is None else [n, by]
+        self.rewrites.append(f"sort_values().head({n.value}) -> {method}({n.value})")
+        return ast.Call(func=ast.Attribute(value=sort_call.func.value, attr=method, ctx=ast.Load()),
+                        args=args, keywords=[])
+
+    # X.apply(lambda row: row['a'] * row['b'], axis=1) -> X['a'] * X['b']
+    # X['a'].apply(lambda v: v * 2) -> X['a'] * 2
+    def _vectorize_apply(self, node):
+        if not _is_method(node, "apply") or len(node.args) != 1 or not isinstance(node.args[0], ast.Lambda):
+            return None
+        func = node.args[0]
+        if len(func.args.args) != 1 or func.args.vararg or func.args.kwarg:
+            return None
+        receiver = node.func.value
+        if not _is_stable_reference(receiver):
+            return None
+        keywords = {kw.arg: kw.value for kw in node.keywords}
+        param = func.args.args[0].arg
+        row_wise = _constant_value(keywords.get("axis")) in (1, "columns")
+        if set(keywords) - {"axis"} or (not row_wise and "axis" in keywords):
+            return None
+
+        if row_wise:
+            rewritten = _ReplaceRowAccess(param, receiver).visit(_copy(func.body))
+            if rewritten is None or not _is_arithmetic(rewritten, allowed_names=set()):
+                return None
+            self.rewrites.append("row-wise apply(lambda) -> column arithmetic")
+            return rewritten
+
+        if not _is_arithmetic(func.body, allowed_names={param}) or not _uses_name(func.body, param):
+            return None
+        rewritten = _ReplaceName(param, receiver).visit(_copy(func.body))
+        self.rewrites.append("element-wise apply(lambda) -> vectorized arithmetic")
+        return rewritten
+
+    # for key, group in X.groupby(by): out.append({...group aggregates...})
+    # for key, group in X.groupby(by): out[key] = group[col].agg()
+    def _group_loop(self, node):
+        if node.orelse or len(node.body) != 1:
+            return None
+        if not (isinstance(node.target, ast.Tuple) and len(node.target.elts) == 2
+                and all(isinstance(elt, ast.Name) for elt in node.target.elts)):
+            return None
+        grouped = node.iter
+        if not (_is_method(grouped, "groupby") and len(grouped.args) == 1 and not grouped.keywords
+                and isinstance(grouped.args[0], ast.Constant) and isinstance(grouped.args[0].value, str)):
+            return None
+        key_name, group_name = node.target.elts[0].id, node.target.elts[1].id
+        by = grouped.args[0]
+        statement = node.body[0]
+
+        # out[key] = group[col].agg()
+        if (isinstance(statement, ast.Assign) and len(statement.targets) == 1
+                and isinstance(statement.targets[0], ast.Subscript)
+                and isinstance(statement.targets[0].slice, ast.Name)
+                and statement.targets[0].slice.id == key_name
+                and isinstance(statement.targets[0].value, ast.Name)):
+            aggregate = _group_aggregate(statement.value, group_name, by)
+            if aggregate is None:
+                return None
+            column, agg = aggregate
+            self.rewrites.append("loop over groupby() -> groupby().agg()")
+            return _statement(
+                f"{statement.targets[0].value.id}.update("
+                f"({ast.unparse(grouped)})[{column!r}].agg({agg!r}).to_dict())"
+            )
+
+        # out.append({'key': key, 'name': group[col].agg(), ...})
+        if (isinstance(statement, ast.Expr) and _is_method(statement.value, "append")
+                and isinstance(statement.value.func.value, ast.Name)
+                and len(statement.value.args) == 1 and isinstance(statement.value.args[0], ast.Dict)):
+            record = statement.value.args[0]
+            if not record.keys or any(not isinstance(k, ast.Constant) or not isinstance(k.value, str) for k in record.keys):
+                return None
+            if not (isinstance(record.values[0], ast.Name) and record.values[0].id == key_name):
+                return None
+            named = []
+            for name, value in zip(record.keys[1:], record.values[1:]):
+                aggregate = _group_aggregate(value, group_name, by)
+                if aggregate is None:
+                    return None
+                named.append(f"{name.value!r}: {aggregate!r}")
+            if not named:
+                return None
+            renamed = "" if record.keys[0].value == by.value else f".rename(columns={{{by.value!r}: {record.keys[0].value!r}}})"
+            self.rewrites.append("loop over groupby() -> groupby().agg()")
+            return _statement(
+                f"{statement.value.func.value.id}.extend(({ast.unparse(grouped)})"
+                f".agg(**{{{', '.join(named)}}}).reset_index(){renamed}.to_dict('records'))"
+            )
+        return None
+
+
+class _ReplaceRowAccess(ast.NodeTransformer):
+    """Turn row['col'] into frame['col']; any other use of the row aborts the rewrite"""
+
+    def __init__(self, param, frame):
+        self.param = param
+        self.frame = frame
+        self.failed = False
+
+    def visit(self, node):
+        result = super().visit(node)
+        return None if self.failed else result
+
+    def visit_Subscript(self, node):
+        if isinstance(node.value, ast.Name) and node.value.id == self.param:
+            if isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str):
+                return ast.Subscript(value=_copy(self.frame), slice=node.slice, ctx=ast.Load())
+            self.failed = True
+            return node
+        return self.generic_visit(node)
+
+    def visit_Name(self, node):
+        if node.id == self.param:
+            self.failed = True
+        return node
+
+
+class _ReplaceName(ast.NodeTransformer):
+    def __init__(self, name, replacement):
+        self.name = name
+        self.replacement = replacement
+
+    def visit_Name(self, node):
+        if node.id == self.name:
+            return _copy(self.replacement)
+        return node
+
+
+def _group_aggregate(node, group_name, by):
+    """Match group[col].agg() or len(group); return (column, aggregation)"""
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "len"
+            and len(node.args) == 1 and isinstance(node.args[0], ast.Name) and node.args[0].id == group_name):
+        return by.value, "size"
+    if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+            and node.func.attr in _GROUP_AGGREGATIONS and not node.args and not node.keywords):
+        return None
+    column = node.func.value
+    if not (isinstance(column, ast.Subscript) and isinstance(column.value, ast.Name)
+            and column.value.id == group_name and isinstance(column.slice, ast.Constant)
+            and isinstance(column.slice.value, str)):
+        return None
+    return column.slice.value, node.func.attr
+
+
+def _is_arithmetic(node, allowed_names):
+    """
+    Only constants, allowed names, column subscripts and arithmetic/comparison
+    operators; division only by a non-zero constant and powers only to a
+    non-negative integer constant
+    """
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, (int, float)) and not isinstance(node.value, bool)
+    if isinstance(node, ast.Name):
+        return node.id in allowed_names
+    if isinstance(node, ast.Subscript):
+        return _is_stable_reference(node)
+    if isinstance(node, ast.BinOp):
+        if not (isinstance(node.op, _ARITHMETIC) and _is_arithmetic(node.left, allowed_names)
+                and _is_arithmetic(node.right, allowed_names)):
+            return False
+        # Only operands for which the vectorized result is what the lambda returns
+        divisor = _number(node.right)
+        if isinstance(node.op, _DIVISION):
+            return divisor is not None and divisor != 0
+        if isinstance(node.op, ast.Pow):
+            return isinstance(divisor, int) and divisor >= 0
+        return True
+    if isinstance(node, ast.UnaryOp):
+        return isinstance(node.op, (ast.USub, ast.UAdd)) and _is_arithmetic(node.operand, allowed_names)
+    if isinstance(node, ast.Compare):
+        return (len(node.ops) == 1 and not isinstance(node.ops[0], (ast.In, ast.NotIn, ast.Is, ast.IsNot))
+                and _is_arithmetic(node.left, allowed_names) and _is_arithmetic(node.comparators[0], allowed_names))
+    return False
+
+
+def _number(node):
+    """The value of a numeric literal, including a negated one; None for anything else"""
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _number(node.operand)
+        return None if value is None else (-value if isinstance(node.op, ast.USub) else value)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return node.value
+    return None
+
+
+def _is_stable_reference(node):
+    """A name or a chain of constant subscripts on a name, safe to evaluate repeatedly"""
+    while isinstance(node, ast.Subscript):
+        if not isinstance(node.slice, ast.Constant):
+            return False
+        node = node.value
+    return isinstance(node, ast.Name)
+
+
+def _is_column_labels(node):
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, str)
+    return isinstance(node, ast.List) and node.elts and all(_is_column_labels(elt) for elt in node.elts)
+
+
+def _constant_bool(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, bool):
+        return node.value
+    if isinstance(node, ast.List) and node.elts:
+        values = {_constant_bool(elt) for elt in node.elts}
+        if len(values) == 1:
+            return values.pop()
+    return None
+
+
+def _constant_value(node):
+    return node.value if isinstance(node, ast.Constant) else None
+
+
+def _is_method(node, name):
+    return isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == name
+
+
+def _uses_name(node, name):
+    return any(isinstance(child, ast.Name) and child.id == name for child in ast.walk(node))
+
+
+def _copy(node):
+    return ast.parse(ast.unparse(node), mode="eval").body
+
+
+def _statement(source):
+    return ast.parse(source).body[0]
+
+
+def _find_slow_patterns(tree):
+    """Describe slow idioms left in the (already optimized) code"""
+    warnings = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            if node.func.attr in ("iterrows", "itertuples"):
+                warnings.append(f"{node.func.attr}() iterates rows in Python")
+            elif node.func.attr == "apply" and any(
+                    kw.arg == "axis" and _constant_value(kw.value) in (1, "columns") for kw in node.keywords):
+                warnings.append("row-wise apply(axis=1) could not be vectorized")
+        elif isinstance(node, (ast.For, ast.comprehension)):
+            source = node.iter
+            if _is_method(source, "groupby"):
+                warnings.append("Python loop over groupby() could not be rewritten as groupby().agg()")
+            elif (isinstance(source, ast.Call) and isinstance(source.func, ast.Name) and source.func.id == "range"
+                  and any(isinstance(n, ast.Call) and isinstance(n.func, ast.Name) and n.func.id == "len"
+                          for n in ast.walk(source))):
+                warnings.append("index loop over range(len(...)) iterates rows in Python")
+    return warnings
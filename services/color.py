@@ -1,5 +1,15 @@
 import json
+import logging
+import os
 from prompt.color_prompt import COLOR_PROMPT
+from utility.timing import stage
+from utility.utils import generate_content_async
+
+logger = logging.getLogger(__name__)
+
+# Entries sent to the colour model; a chart result can have thousands of points while the
+# reply is capped at 2048 tokens, so the rest get the hash-based fallback colour
+COLOR_MAX_ENTRIES = int(os.getenv("COLOR_MAX_ENTRIES", 50))
 
 async def add_color_suggestions(result_json, model):
     """
@@ -9,14 +19,16 @@ async def add_color_suggestions(result_json, model):
         item_str = str(item)
         return f'#{hash(item_str) % 0xFFFFFF:06x}'
 
-    color_prompt = COLOR_PROMPT.format(result_json=result_json)
+    sample = result_json[:COLOR_MAX_ENTRIES]
+    color_prompt = COLOR_PROMPT.format(result_json=sample)
     try:
-        color_response = model.generate_content(color_prompt, generation_config={
-            "temperature": 0.2,
-            "max_output_tokens": 2048,
-        })
+        with stage("colour"):
+            color_response = await generate_content_async(model, color_prompt, generation_config={
+                "temperature": 0.2,
+                "max_output_tokens": 2048,
+            })
         color_text = color_response.text.strip()
-        print(color_text, "---___COLOR")
+        logger.debug("Colour response", extra={"response": color_text})
         try:
             color_result = json.loads(color_text)
             if isinstance(color_result, list):
@@ -30,12 +42,12 @@ async def add_color_suggestions(result_json, model):
                         merged_item['color'] = generate_fallback_color(item)
                     updated_result.append(merged_item)
                 return updated_result
-            elif isinstance(color_result, dict):
+            elif isinstance(color_result, dict) and len(sample) == len(result_json):
                 return color_result
         except json.JSONDecodeError:
             pass
     except Exception as e:
-        print(f"Color suggestion failed: {e}")
+        logger.warning("Color suggestion failed: %s", e)
     return [
         {**item, 'color': generate_fallback_color(item)}
         for item in result_json
@@ -0,0 +1,319 @@
+import asyncio
+import atexit
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from services.result_store import write_result
+from services.chart_reduction import reduce_for_chart
+
+# Number of warm worker processes. 0 runs generated code in a thread of the
+# server process instead (no isolation, useful for local development).
+EXEC_WORKERS = int(os.getenv("EXEC_WORKERS", 2))
+EXEC_TIMEOUT_SECONDS = float(os.getenv("EXEC_TIMEOUT_SECONDS", 30))
+EXEC_MAX_RSS_MB = int(os.getenv("EXEC_MAX_RSS_MB", 2048))
+# How many session frames each worker keeps loaded between calls
+EXEC_WORKER_FRAMES = int(os.getenv("EXEC_WORKER_FRAMES", 4))
+
+_POLL_INTERVAL = 0.05
+
+
+class ExecutionError(Exception):
+    """Generated code could not be executed to completion"""
+
+
+class ExecutionTimeout(ExecutionError):
+    pass
+
+
+class ExecutionMemoryError(ExecutionError):
+    pass
+
+
+class ExecutionCancelled(ExecutionError):
+    pass
+
+
+def run_generated_code(code, df):
+    """Execute generated pandas code against df and return its result"""
+    # Under copy-on-write a shallow copy shares every column with the session
+    # frame and only the columns the code modifies get materialized, instead
+    # of duplicating the whole frame on every call. The option is global to
+    # the process, so it is set once at startup (app lifespan, worker main)
+    # rather than toggled around calls that may overlap in threads.
+    if pd.get_option("mode.copy_on_write") is True:
+        frame = df.copy(deep=False)
+    else:
+        # Without it in-place writes to a shallow copy would reach the session frame
+        frame = df.copy()
+    local_vars = {"df": frame}
+    exec(code, {"pd": pd, "np": np}, local_vars)
+
+    # Get the result (assuming the last variable assigned is the result)
+    result = None
+    for var_name, var_value in local_vars.items():
+        if var_name != "df" and isinstance(var_value, (pd.DataFrame, pd.Series)):
+            result = var_value
+
+    # If no result variable was found, use the modified df
+    if result is None and "df" in local_vars:
+        result = local_vars["df"]
+    return result
+
+
+def _limit_rows(result, max_rows):
+    if max_rows is not None and isinstance(result, (pd.DataFrame, pd.Series)):
+        return result.head(max_rows)
+    return result
+
+
+def _execute(code, df, max_rows, store_path, max_points):
+    result = run_generated_code(code, df)
+    # The full result goes to the result store file; only the first rows travel back
+    stored = write_result(result, store_path) if store_path else None
+    reduction = None
+    if max_points:
+        result, reduction = reduce_for_chart(result, max_points)
+    return _limit_rows(result, max_rows), {"stored": stored, "reduction": reduction}
+
+
+def _load_frame(path):
+    if path.endswith(".arrow"):
+        import pyarrow.feather as feather
+        # Memory-map the file so the Arrow buffers come straight from shared memory
+        return feather.read_table(path, memory_map=True).to_pandas()
+    return pd.read_pickle(path)
+
+
+def _worker_main(conn):
+    """Worker process loop: receive (frame path, code, max_rows, store path, max_points), send back the result"""
+    pd.set_option("mode.copy_on_write", True)
+    frames = OrderedDict()
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if message is None:
+            break
+        frame_path, code, max_rows, store_path, max_points = message
+        try:
+            df = frames.get(frame_path)
+            if df is None:
+                df = _load_frame(frame_path)
+                frames[frame_path] = df
+                while len(frames) > EXEC_WORKER_FRAMES:
+                    frames.popitem(last=False)
+            frames.move_to_end(frame_path)
+            result, details = _execute(code, df, max_rows, store_path, max_points)
+        except Exception as e:
+            conn.send(("error", str(e)))
+            continue
+        try:
+            conn.send(("ok", (result, details)))
+        except Exception:
+            # Results that cannot be pickled are returned as text, like the JSON fallback
+            conn.send(("ok", (str(result), details)))
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self._ctx = ctx
+        self.process = None
+        self.conn = None
+        self.start()
+
+    def start(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        self.process = self._ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+    def restart(self):
+        self.stop(kill=True)
+        self.start()
+
+    def stop(self, kill=False):
+        if not kill:
+            try:
+                self.conn.send(None)
+                self.process.join(timeout=1)
+            except (OSError, ValueError):
+                pass
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=5)
+        self.conn.close()
+
+    def rss_bytes(self):
+        try:
+            with open(f"/proc/{self.process.pid}/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            # No procfs on this platform; only the time limit is enforced
+            return 0
+
+
+class ExecutionService:
+    """
+    Pool of warm worker processes that run generated pandas code.
+
+    Each session frame is written once per dataset version to an Arrow file in
+    shared memory; workers memory-map it and keep it loaded, so calls only send
+    the code over the pipe. A call that runs past the time limit, grows the
+    worker past the RSS limit or is cancelled kills its worker, which is
+    replaced by a fresh one.
+    """
+
+    def __init__(self, workers=EXEC_WORKERS, timeout=EXEC_TIMEOUT_SECONDS, max_rss_mb=EXEC_MAX_RSS_MB):
+        self.num_workers = workers
+        self.timeout = timeout
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024
+        self._workers = []
+        self._idle = None
+        self._loop = None
+        self._exports = {}
+        self._export_lock = asyncio.Lock()
+        self._frame_dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+    def start(self):
+        if self._workers or self.num_workers <= 0:
+            return
+        ctx = multiprocessing.get_context("spawn")
+        self._loop = asyncio.get_running_loop()
+        self._idle = asyncio.Queue()
+        for _ in range(self.num_workers):
+            worker = _Worker(ctx)
+            self._workers.append(worker)
+            self._idle.put_nowait(worker)
+
+    def shutdown(self):
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+        for _, path in self._exports.values():
+            self._remove(path)
+        self._exports = {}
+
+    async def execute(self, code, session_id, version, df, max_rows=None, store_path=None, max_points=None):
+        """
+        Run code against the session frame and return (result, details).
+
+        With store_path the full DataFrame/Series result is also written there
+        and details["stored"] is its metadata from write_result. With
+        max_points the result is reduced for charting before it is truncated
+        and details["reduction"] reports how.
+        """
+        if self.num_workers <= 0:
+            try:
+                return await asyncio.wait_for(
+                    asyncio.to_thread(_execute, code, df, max_rows, store_path, max_points),
+                    timeout=self.timeout
+                )
+            except asyncio.TimeoutError:
+                # The thread cannot be killed; it finishes in the background
+                raise ExecutionTimeout(f"Code execution exceeded the {self.timeout:g} second time limit")
+
+        self.start()
+        frame_path = await self.frame_file(session_id, version, df)
+        worker = await self._idle.get()
+        cancel = threading.Event()
+        try:
+            status, payload = await asyncio.to_thread(
+                self._run_on_worker, worker, (frame_path, code, max_rows, store_path, max_points), cancel
+            )
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+        if status == "error":
+            raise ExecutionError(payload)
+        return payload
+
+    def _run_on_worker(self, worker, message, cancel):
+        # Runs in a helper thread; the worker goes back to the pool when done
+        deadline = time.monotonic() + self.timeout
+        try:
+            worker.conn.send(message)
+            while not worker.conn.poll(_POLL_INTERVAL):
+                if cancel.is_set():
+                    worker.restart()
+                    raise ExecutionCancelled("Code execution was cancelled")
+                if time.monotonic() > deadline:
+                    worker.restart()
+                    raise ExecutionTimeout(f"Code execution exceeded the {self.timeout:g} second time limit")
+                if worker.rss_bytes() > self.max_rss_bytes:
+                    worker.restart()
+                    raise ExecutionMemoryError(
+                        f"Code execution exceeded the {self.max_rss_bytes // (1024 * 1024)} MB memory limit"
+                    )
+            return worker.conn.recv()
+        except (EOFError, OSError):
+            worker.restart()
+            raise ExecutionError("Code execution worker exited unexpectedly")
+        finally:
+            self._loop.call_soon_threadsafe(self._idle.put_nowait, worker)
+
+    async def frame_file(self, session_id, version, df):
+        """Path of the session frame exported for this dataset version (.arrow, or .pkl as fallback)"""
+        async with self._export_lock:
+            exported = self._exports.get(session_id)
+            if exported and exported[0] == version:
+                return exported[1]
+            path = await asyncio.to_thread(self._export, df, f"lorem-{os.getpid()}-{session_id}-{version}")
+            if exported:
+                self._remove(exported[1])
+            self._exports[session_id] = (version, path)
+            return path
+
+    def _export(self, df, name):
+        path = os.path.join(self._frame_dir, name.replace(os.sep, "_") + ".arrow")
+        try:
+            import pyarrow.feather as feather
+            feather.write_feather(df, path, compression="uncompressed")
+        except Exception:
+            # Frames Arrow cannot represent (mixed object columns, non-string labels)
+            self._remove(path)
+            path = path[:-len(".arrow")] + ".pkl"
+            df.to_pickle(path)
+        return path
+
+    def exported_bytes(self):
+        """Size of each session's exported frame file (in shared memory when /dev/shm exists)"""
+        sizes = {}
+        for session_id, (_, path) in list(self._exports.items()):
+            try:
+                sizes[session_id] = os.path.getsize(path)
+            except OSError:
+                pass
+        return sizes
+
+    def workers_rss_bytes(self):
+        return sum(worker.rss_bytes() for worker in self._workers)
+
+    def forget_session(self, session_id):
+        exported = self._exports.pop(session_id, None)
+        if exported:
+            self._remove(exported[1])
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+execution_service = ExecutionService()
+atexit.register(execution_service.shutdown)
+
+
+async def execute_code(code, session_id, version, df, max_rows=None, store_path=None, max_points=None):
+    """Run generated pandas code for a session in the sandboxed worker pool"""
+    return await execution_service.execute(
+        code, session_id, version, df, max_rows=max_rows, store_path=store_path, max_points=max_points
+    )
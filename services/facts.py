@@ -0,0 +1,320 @@
+import os
+import numpy as np
+import pandas as pd
+from pandas.api import types as ptypes
+
+# Facts handed to the model per dataset, and how many of one kind at most
+FACT_LIMIT = int(os.getenv("FACT_LIMIT", 25))
+FACT_LIMIT_PER_KIND = int(os.getenv("FACT_LIMIT_PER_KIND", 6))
+# Columns analysed: the first N measures and dimensions, dimensions having at most this many values
+FACT_MAX_MEASURES = int(os.getenv("FACT_MAX_MEASURES", 8))
+FACT_MAX_DIMENSIONS = int(os.getenv("FACT_MAX_DIMENSIONS", 8))
+FACT_MAX_CARDINALITY = int(os.getenv("FACT_MAX_CARDINALITY", 50))
+
+# How much each kind of fact is worth relative to the others when ranking
+KIND_WEIGHTS = {
+    "top_contributor": 1.0,
+    "period_change": 1.0,
+    "correlation": 0.9,
+    "concentration": 0.8,
+    "outlier": 0.8,
+    "null_hotspot": 0.7,
+    "date_range": 0.5,
+    "summary": 0.4,
+}
+
+
+def format_value(value):
+    """A number as facts show it: thousands separators, two decimals at most"""
+    value = float(value)
+    if not np.isfinite(value):
+        return "n/a"
+    if value.is_integer() and abs(value) < 1e15:
+        return f"{int(value):,}"
+    if abs(value) >= 1:
+        return f"{value:,.2f}"
+    return f"{value:.4g}"
+
+
+def format_share(fraction):
+    """A fraction as a percentage, keeping two significant digits for tiny ones"""
+    if 0 < abs(fraction) < 0.001:
+        return f"{fraction * 100:.2g}%"
+    return f"{fraction * 100:.1f}%"
+
+
+def _id_like(name, series):
+    """Integer keys such as order_id: numeric, but summing or correlating them means nothing"""
+    if not ptypes.is_integer_dtype(series.dtype):
+        return False
+    lowered = str(name).lower()
+    if lowered == "id" or lowered.endswith(("_id", " id", "id_")) or lowered.startswith("id_"):
+        return True
+    return len(series) > 20 and series.is_monotonic_increasing and series.is_unique
+
+
+def _parse_dates(series):
+    """ISO 8601 text (how CSV uploads keep dates) as datetimes, or None if it is not dates"""
+    if not (ptypes.is_object_dtype(series.dtype) or ptypes.is_string_dtype(series.dtype)):
+        return None
+    sample = series.dropna().head(50).astype(str)
+    if sample.empty or not sample.str.contains(r"\d{4}|\d{1,2}[/-]\d{1,2}", regex=True).all():
+        return None
+    if pd.to_datetime(sample, errors="coerce", format="ISO8601").notna().mean() < 0.9:
+        return None
+    return pd.to_datetime(series, errors="coerce", format="ISO8601")
+
+
+def column_roles(df):
+    """(measures, dimensions, {date column: datetime series}) of a frame"""
+    measures, dimensions, dates = [], [], {}
+    for name in df.columns:
+        series = df[name]
+        if ptypes.is_datetime64_any_dtype(series.dtype):
+            dates[name] = series
+        elif ptypes.is_bool_dtype(series.dtype):
+            dimensions.append(name)
+        elif ptypes.is_numeric_dtype(series.dtype):
+            if not _id_like(name, series):
+                measures.append(name)
+        else:
+            parsed = _parse_dates(series)
+            if parsed is not None:
+                dates[name] = parsed
+            elif 2 <= series.nunique() <= FACT_MAX_CARDINALITY:
+                dimensions.append(name)
+    return measures[:FACT_MAX_MEASURES], dimensions[:FACT_MAX_DIMENSIONS], dates
+
+
+def _fact(kind, score, text, columns):
+    return {"kind": kind, "score": round(float(score) * KIND_WEIGHTS[kind], 4), "text": text, "columns": list(columns)}
+
+
+def _contribution_facts(df, measures, dimensions):
+    facts = []
+    for dim in dimensions:
+        counts = df[dim].value_counts()
+        k = len(counts)
+        if k < 2:
+            continue
+        top_share = counts.iloc[0] / counts.sum()
+        facts.append(_fact(
+            "top_contributor", 0.5 * (top_share - 1 / k) / (1 - 1 / k),
+            f"{dim} = {counts.index[0]} is the most frequent value: {format_value(counts.iloc[0])} of {format_value(counts.sum())} rows ({format_share(top_share)}).",
+            [dim]
+        ))
+        if not measures:
+            continue
+        # One pass per dimension for every measure
+        sums = df.groupby(dim, observed=True)[measures].sum()
+        for measure in measures:
+            totals = sums[measure].sort_values(ascending=False)
+            total = totals.sum()
+            if total <= 0 or (totals < 0).any():
+                continue
+            shares = totals / total
+            facts.append(_fact(
+                "top_contributor", (shares.iloc[0] - 1 / k) / (1 - 1 / k),
+                f"{dim} = {totals.index[0]} contributes {format_share(shares.iloc[0])} of total {measure} "
+                f"({format_value(totals.iloc[0])} of {format_value(total)}); next is {totals.index[1]} with {format_share(shares.iloc[1])}"
+                + (f", lowest is {totals.index[-1]} with {format_share(shares.iloc[-1])}." if k > 2 else "."),
+                [dim, measure]
+            ))
+            if k >= 5:
+                needed = int(np.searchsorted(shares.cumsum().to_numpy(), 0.8) + 1)
+                # Evenly spread values would need 80% of them
+                even = int(np.ceil(0.8 * k))
+                facts.append(_fact(
+                    "concentration", (even - needed) / even,
+                    f"{needed} of {k} {dim} values account for 80% of {measure}.",
+                    [dim, measure]
+                ))
+    return facts
+
+
+def _period(span):
+    if span > pd.Timedelta(days=5 * 365):
+        return "Q", "quarter"
+    if span > pd.Timedelta(days=90):
+        return "M", "month"
+    if span > pd.Timedelta(days=21):
+        return "W", "week"
+    return "D", "day"
+
+
+def _period_facts(df, measures, dates):
+    facts = []
+    for column, parsed in dates.items():
+        valid = parsed.notna()
+        if valid.sum() < 2:
+            continue
+        first, last = parsed[valid].min(), parsed[valid].max()
+        facts.append(_fact("date_range", 0.6, f"{column} runs from {first.date()} to {last.date()} ({format_value(valid.sum())} dated rows).", [column]))
+        freq, unit = _period(last - first)
+        periods = parsed[valid].dt.to_period(freq)
+        frame = periods.value_counts().sort_index().to_frame("rows")
+        if measures:
+            frame = df.loc[valid, measures].groupby(periods).sum().join(frame)
+        # Periods the data starts or stops part-way through are not comparable with full ones
+        if last.normalize() < frame.index[-1].end_time.normalize():
+            frame = frame.iloc[:-1]
+        if len(frame) and first.normalize() > frame.index[0].start_time:
+            frame = frame.iloc[1:]
+        if len(frame) < 2:
+            continue
+        for measure in measures + ["rows"]:
+            label = measure if measure != "rows" else "row count"
+            current, previous = frame[measure].iloc[-1], frame[measure].iloc[-2]
+            if previous != 0:
+                change = (current - previous) / abs(previous)
+                facts.append(_fact(
+                    "period_change", min(1.0, abs(change)) * (0.6 if measure == "rows" else 1.0),
+                    f"{label} by {unit} of {column}: {frame.index[-1]} was {format_value(current)}, "
+                    f"{'up' if change >= 0 else 'down'} {format_share(abs(change))} from {frame.index[-2]} ({format_value(previous)}).",
+                    [column] + ([measure] if measure != "rows" else [])
+                ))
+            if len(frame) >= 3 and measure != "rows":
+                peak, trough = frame[measure].idxmax(), frame[measure].idxmin()
+                spread = (frame[measure].max() - frame[measure].min()) / (abs(frame[measure].mean()) or 1)
+                facts.append(_fact(
+                    "period_change", min(1.0, spread / 2) * 0.7,
+                    f"{measure} by {unit} of {column} peaked in {peak} at {format_value(frame[measure].max())} "
+                    f"and was lowest in {trough} at {format_value(frame[measure].min())} (over {len(frame)} complete {unit}s).",
+                    [column, measure]
+                ))
+    return facts
+
+
+def _correlation_facts(df, measures):
+    if len(measures) < 2:
+        return []
+    corr = df[measures].corr(min_periods=10).to_numpy()
+    facts = []
+    for i, j in zip(*np.triu_indices(len(measures), 1)):
+        r = corr[i, j]
+        if np.isfinite(r) and abs(r) >= 0.5:
+            strength = "strongly" if abs(r) >= 0.8 else "moderately"
+            direction = "positively" if r > 0 else "negatively"
+            facts.append(_fact(
+                "correlation", abs(r),
+                f"{measures[i]} and {measures[j]} are {strength} {direction} correlated (Pearson r = {r:.2f}).",
+                [measures[i], measures[j]]
+            ))
+    return facts
+
+
+def _outlier_facts(df, measures, dimensions):
+    facts = []
+    for measure in measures:
+        values = df[measure].to_numpy(dtype=np.float64, na_value=np.nan)
+        finite = np.isfinite(values)
+        if finite.sum() < 10:
+            continue
+        q1, q3 = np.percentile(values[finite], [25, 75])
+        iqr = q3 - q1
+        std = values[finite].std()
+        if iqr <= 0 or std <= 0:
+            continue
+        low, high = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+        outside = finite & ((values < low) | (values > high))
+        count = int(outside.sum())
+        if not count:
+            continue
+        mean = values[finite].mean()
+        deviation = np.where(finite, np.abs(values - mean), -1)
+        extreme = int(deviation.argmax())
+        z = deviation[extreme] / std
+        where = ", ".join(f"{dim} = {df[dim].iloc[extreme]}" for dim in dimensions[:2])
+        facts.append(_fact(
+            "outlier", min(1.0, z / 10),
+            f"{measure}: {format_value(count)} rows ({format_share(count / finite.sum())}) lie outside the 1.5xIQR range "
+            f"[{format_value(low)}, {format_value(high)}]; the most extreme, {format_value(values[extreme])}"
+            + (f" ({where})" if where else "")
+            + f", is {z:.1f} standard deviations from the mean {format_value(mean)}.",
+            [measure] + dimensions[:2]
+        ))
+    return facts
+
+
+def _null_facts(df, dimensions):
+    missing = df.isna()
+    fractions = missing.mean()
+    columns = [c for c in fractions.sort_values(ascending=False).index if fractions[c] >= 0.01][:FACT_MAX_MEASURES]
+    if not columns:
+        return []
+    # Missing rate per value of each dimension, for every column with gaps in one groupby
+    rates = {dim: missing[columns].groupby(df[dim], observed=True).agg(["mean", "size"]) for dim in dimensions}
+    facts = []
+    for column in columns:
+        fraction = fractions[column]
+        text = f"{column} is missing in {format_value(missing[column].sum())} rows ({format_share(fraction)})"
+        best = None
+        for dim, table in rates.items():
+            if dim == column:
+                continue
+            rate, size = table[(column, "mean")], table[(column, "size")]
+            rate = rate[size >= 5]
+            if rate.empty:
+                continue
+            lift = rate.max() / fraction
+            if lift >= 2 and (best is None or lift > best[0]):
+                best = (lift, dim, rate.idxmax(), rate.max())
+        if best:
+            text += f"; the gap is concentrated in {best[1]} = {best[2]}, where {format_share(best[3])} of rows are missing it"
+        facts.append(_fact("null_hotspot", min(1.0, fraction * 2 + (0.3 if best else 0)), text + ".", [column] + ([best[1]] if best else [])))
+    return facts
+
+
+def _summary_facts(df, measures):
+    if not measures:
+        return []
+    stats = df[measures].agg(["sum", "mean", "median", "min", "max", "count"])
+    return [
+        _fact(
+            "summary", 1.0,
+            f"{measure}: total {format_value(stats.at['sum', measure])}, mean {format_value(stats.at['mean', measure])}, "
+            f"median {format_value(stats.at['median', measure])}, range {format_value(stats.at['min', measure])} to "
+            f"{format_value(stats.at['max', measure])} over {format_value(stats.at['count', measure])} rows.",
+            [measure]
+        )
+        for measure in measures
+    ]
+
+
+def compute_facts(df, limit=FACT_LIMIT):
+    """
+    Ranked facts about a frame, computed exactly over all of its rows.
+
+    Covers top contributors and concentration per dimension, period-over-period
+    changes along date columns, correlations between measures, IQR/z-score
+    outliers and columns with gaps (with the dimension value they cluster in).
+    Each fact is {"kind", "score", "text", "columns"}; at most limit facts are
+    returned, and at most FACT_LIMIT_PER_KIND of one kind.
+    """
+    if df.empty:
+        return []
+    measures, dimensions, dates = column_roles(df)
+    facts = (
+        _summary_facts(df, measures)
+        + _contribution_facts(df, measures, dimensions)
+        + _period_facts(df, measures, dates)
+        + _correlation_facts(df, measures)
+        + _outlier_facts(df, measures, dimensions)
+        + _null_facts(df, dimensions)
+    )
+    facts.sort(key=lambda fact: fact["score"], reverse=True)
+    ranked, per_kind = [], {}
+    for fact in facts:
+        if fact["score"] <= 0:
+            break
+        if per_kind.get(fact["kind"], 0) < FACT_LIMIT_PER_KIND:
+            ranked.append(fact)
+            per_kind[fact["kind"]] = per_kind.get(fact["kind"], 0) + 1
+        if len(ranked) == limit:
+            break
+    return ranked
+
+
+def format_facts(facts):
+    """Numbered fact lines for a prompt"""
+    return "\n".join(f"{i}. {fact['text']}" for i, fact in enumerate(facts, 1))
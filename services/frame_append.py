@@ -0,0 +1,220 @@
+import asyncio
+import os
+import numpy as np
+import pandas as pd
+from pandas.api import types as ptypes
+
+# Spare rows reserved when a session's columns grow, as a share of the rows they hold
+APPEND_GROWTH = float(os.getenv("APPEND_GROWTH", 0.5))
+
+
+class SchemaMismatch(ValueError):
+    """New rows whose columns or values do not fit the session frame"""
+
+
+def read_dtypes(frame):
+    """read_csv dtypes for new rows: text columns stay text, so "00123" is not read as a number"""
+    return {col: object for col, dtype in frame.dtypes.items() if ptypes.is_object_dtype(dtype)}
+
+
+def align_rows(frame, rows):
+    """
+    New rows as one array per session column, in the session's column order
+    and dtypes, plus {column: dtype} for integer columns the rows turn into
+    floats (gaps or fractions). Raises SchemaMismatch for missing or extra
+    columns and for values the column type cannot hold.
+    """
+    missing = [str(c) for c in frame.columns if c not in rows.columns]
+    extra = [str(c) for c in rows.columns if c not in frame.columns]
+    if missing or extra:
+        problems = ([f"missing {', '.join(missing)}"] if missing else []) + ([f"unexpected {', '.join(extra)}"] if extra else [])
+        raise SchemaMismatch(f"The new rows do not have the session's columns: {'; '.join(problems)}")
+    if rows.columns.has_duplicates:
+        raise SchemaMismatch("The new rows repeat column names")
+    columns, promotions = [], {}
+    for col, dtype in frame.dtypes.items():
+        values = rows[col]
+        if values.dtype == dtype:
+            columns.append(values.to_numpy())
+        elif ptypes.is_object_dtype(dtype):
+            columns.append(values.to_numpy(dtype=object))
+        elif ptypes.is_bool_dtype(dtype):
+            if values.isna().any() or not values.isin([True, False]).all():
+                raise SchemaMismatch(f"Column '{col}' holds true/false values but the new rows have others")
+            columns.append(values.to_numpy(dtype=bool))
+        elif ptypes.is_datetime64_any_dtype(dtype):
+            parsed = pd.to_datetime(values, errors="coerce")
+            _check_parsed(col, values, parsed, "dates")
+            columns.append(parsed.to_numpy(dtype=dtype))
+        elif ptypes.is_numeric_dtype(dtype):
+            numeric = pd.to_numeric(values, errors="coerce")
+            _check_parsed(col, values, numeric, "numbers")
+            target = dtype
+            if ptypes.is_integer_dtype(dtype) and (numeric.isna().any() or (numeric != np.floor(numeric)).any()):
+                target = promotions[col] = np.dtype(np.float64)
+            columns.append(numeric.to_numpy(dtype=target))
+        else:
+            raise SchemaMismatch(f"Rows cannot be appended to column '{col}' of type {dtype}")
+    return columns, promotions
+
+
+def _check_parsed(col, values, parsed, kind):
+    bad = parsed.isna() & values.notna()
+    if bad.any():
+        raise SchemaMismatch(f"Column '{col}' holds {kind} but the new rows have values such as {values[bad].iloc[0]!r}")
+
+
+class _ColumnBuffers:
+    """
+    One preallocated array per column; the session frame is a view of the first rows.
+
+    Appends write into the spare rows behind the view, so frames handed out
+    earlier (still used by running requests) keep seeing exactly their rows.
+    When the spare rows run out every column is reallocated APPEND_GROWTH
+    larger, which keeps the copying per appended row constant on average.
+    """
+
+    def __init__(self, frame):
+        self.labels = frame.columns
+        self.rows = len(frame)
+        capacity = self.rows + max(1, int(self.rows * APPEND_GROWTH))
+        self.arrays = [self._resized(frame.iloc[:, p].to_numpy(), capacity) for p in range(frame.shape[1])]
+        self.frame = frame
+        self.reallocations = 0
+
+    @property
+    def capacity(self):
+        return len(self.arrays[0]) if self.arrays else 0
+
+    def _resized(self, values, capacity):
+        array = np.empty(capacity, dtype=values.dtype)
+        array[:self.rows] = values[:self.rows]
+        return array
+
+    def append(self, columns, promotions):
+        added = len(columns[0]) if columns else 0
+        for position, col in enumerate(self.labels):
+            if col in promotions:
+                # Only this column is copied, into an array of the wider type
+                self.arrays[position] = self.arrays[position].astype(promotions[col])
+        if self.rows + added > self.capacity:
+            capacity = max(self.rows + added, int(self.capacity * (1 + APPEND_GROWTH)))
+            self.arrays = [self._resized(array, capacity) for array in self.arrays]
+            self.reallocations += 1
+        for array, values in zip(self.arrays, columns):
+            array[self.rows:self.rows + added] = values
+        self.rows += added
+        frame = pd.DataFrame({p: array[:self.rows] for p, array in enumerate(self.arrays)}, copy=False)
+        frame.columns = self.labels
+        self.frame = frame
+        return frame
+
+    def spare_bytes(self):
+        return sum(array.itemsize * (len(array) - self.rows) for array in self.arrays)
+
+
+def _bufferable(frame):
+    """Frames made of plain NumPy columns with a default index, such as read_csv returns"""
+    return (isinstance(frame.index, pd.RangeIndex) and frame.index.start == 0 and frame.index.step == 1
+            and all(isinstance(dtype, np.dtype) for dtype in frame.dtypes))
+
+
+class FrameAppender:
+    """
+    Appends new rows to session frames without copying the rows already there.
+
+    The first append to a session moves its frame into column buffers with
+    spare rows; later ones only write the new rows. If the session frame was
+    replaced by an upload since, or cannot be buffered (extension dtypes, a
+    custom index), the rows are concatenated with a full copy instead.
+    Appends to one session are serialized.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+        self._locks = {}
+        self.appends = 0
+        self.rows_appended = 0
+        self.copied_appends = 0
+
+    def lock(self, session_id):
+        return self._locks.setdefault(session_id, asyncio.Lock())
+
+    def append(self, session_id, frame, rows):
+        """The session frame with rows added, and {column: dtype} of the integer columns turned into floats"""
+        columns, promotions = align_rows(frame, rows)
+        buffers = self._buffers.get(session_id)
+        if buffers is None or buffers.frame is not frame:
+            buffers = _ColumnBuffers(frame) if _bufferable(frame) else None
+            if buffers is None:
+                self._buffers.pop(session_id, None)
+        if buffers is None:
+            self.copied_appends += 1
+            appended = pd.DataFrame(dict(enumerate(columns)))
+            appended.columns = frame.columns
+            combined = pd.concat([frame.astype(promotions) if promotions else frame, appended], ignore_index=True)
+        else:
+            self._buffers[session_id] = buffers
+            combined = buffers.append(columns, promotions)
+        self.appends += 1
+        self.rows_appended += len(rows)
+        return combined, promotions
+
+    def drop_buffers(self, session_id):
+        """The session frame was replaced; call with the session lock held, which is kept"""
+        self._buffers.pop(session_id, None)
+
+    def forget_session(self, session_id):
+        self._buffers.pop(session_id, None)
+        self._locks.pop(session_id, None)
+
+    def session_bytes(self):
+        """Bytes of each session's spare rows (the rows in use are counted with its frame)"""
+        return {session_id: buffers.spare_bytes() for session_id, buffers in list(self._buffers.items())}
+
+    def stats(self):
+        return {
+            "sessions": len(self._buffers),
+            "appends": self.appends,
+            "rows_appended": self.rows_appended,
+            "copied_appends": self.copied_appends,
+            "reallocations": sum(buffers.reallocations for buffers in list(self._buffers.values())),
+            "spare_bytes": sum(self.session_bytes().values()),
+        }
+
+
+def column_profile(df):
+    """Row count and, per column, non-null count and for numbers min, max and sum; merged across appends"""
+    columns = {}
+    for position, col in enumerate(df.columns):
+        values = df.iloc[:, position]
+        entry = {"non_null": int(values.notna().sum())}
+        if ptypes.is_numeric_dtype(values.dtype) and not ptypes.is_bool_dtype(values.dtype):
+            present = entry["non_null"] > 0
+            entry.update(
+                min=float(values.min()) if present else None,
+                max=float(values.max()) if present else None,
+                sum=float(values.sum()) if present else 0.0
+            )
+        columns[str(col)] = entry
+    return {"rows": len(df), "columns": columns}
+
+
+def merge_profiles(profile, added):
+    """Profile of a frame extended with rows whose profile is added"""
+    columns = {}
+    for col, entry in profile["columns"].items():
+        new = added["columns"].get(col, {})
+        merged = {"non_null": entry["non_null"] + new.get("non_null", 0)}
+        if "sum" in entry and "sum" in new:
+            bounds = [v for v in (entry["min"], new["min"]) if v is not None]
+            merged.update(
+                min=min(bounds) if bounds else None,
+                max=max(v for v in (entry["max"], new["max"]) if v is not None) if bounds else None,
+                sum=entry["sum"] + new["sum"]
+            )
+        columns[col] = merged
+    return {"rows": profile["rows"] + added["rows"], "columns": columns}
+
+
+frame_appender = FrameAppender()
@@ -0,0 +1,64 @@
+import json
+import re
+from utility.serialization import dumps
+from utility.utils import generate_content_async
+from prompt.frontend_prompt import FRONTEND_CONVERSION_PROMPT
+
+# Serialized result text sent to the model; documents past this are left out
+FRONTEND_RESULT_MAX_BYTES = 200_000
+CODE_PATTERN = r"```(?:json)?\s*(.*?)\s*```"
+
+
+async def documents_to_json(documents, max_bytes=FRONTEND_RESULT_MAX_BYTES):
+    """
+    Serialize documents from an (async) iterable into one JSON array text as they arrive.
+
+    Stops reading once max_bytes is reached. Returns (json_text, documents
+    included, truncated).
+    """
+    parts, size, count, truncated = [], 2, 0, False
+    async for document in documents:
+        text = dumps(document)
+        if count and size + len(text) + 1 > max_bytes:
+            truncated = True
+            break
+        parts.append(text)
+        size += len(text) + 1
+        count += 1
+    return b"[" + b",".join(parts) + b"]", count, truncated
+
+
+async def convert_result_to_frontend(query_result_text, question, model, strict=True):
+    """
+    Ask the model to turn a query result (JSON text) into [{category, value, color}, ...].
+
+    Raises ValueError if the model does not return a JSON array (or, with
+    strict, if an item lacks one of the three fields).
+    """
+    if isinstance(query_result_text, bytes):
+        query_result_text = query_result_text.decode("utf-8")
+    conversion_prompt = FRONTEND_CONVERSION_PROMPT.format(question=question, query_result=query_result_text)
+
+    # Generate frontend format
+    response = await generate_content_async(model, conversion_prompt, generation_config={
+        "temperature": 0.3,
+        "top_p": 0.9,
+        "max_output_tokens": 2048,
+    })
+    generated_text = response.text.strip()
+
+    # Clean the response - remove code blocks if present
+    code_match = re.search(CODE_PATTERN, generated_text, re.DOTALL | re.IGNORECASE)
+    frontend_data = code_match.group(1).strip() if code_match else generated_text
+
+    # Validate that it's proper JSON (JSONDecodeError is a ValueError)
+    parsed_frontend_data = json.loads(frontend_data)
+    if not isinstance(parsed_frontend_data, list):
+        raise ValueError("Response should be an array")
+    if strict:
+        for item in parsed_frontend_data:
+            if not isinstance(item, dict):
+                raise ValueError("Each item should be an object")
+            if not all(key in item for key in ["category", "value", "color"]):
+                raise ValueError("Each item should have category, value, and color fields")
+    return parsed_frontend_data
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import OrderedDict
+from services.insights import generate_insights_from_gemini, is_fallback
+from services.singleflight import SingleFlight
+from utility.fingerprint import profile_fingerprint
+
+# Question sets kept per profile, so users uploading alike files do not all see the same ones
+INSIGHT_CACHE_VARIANTS = int(os.getenv("INSIGHT_CACHE_VARIANTS", 3))
+# Seconds before a question set is replaced in the background (stale ones are served meanwhile)
+INSIGHT_CACHE_TTL = float(os.getenv("INSIGHT_CACHE_TTL", 24 * 3600))
+# Profiles kept, least recently used evicted first
+INSIGHT_CACHE_MAX_PROFILES = int(os.getenv("INSIGHT_CACHE_MAX_PROFILES", 1000))
+
+logger = logging.getLogger(__name__)
+
+
+class InsightCache:
+    """
+    Upload-time insight questions shared by uploads whose frames have the same profile.
+
+    Keyed by profile_fingerprint (column names, dtypes and a coarse value
+    profile), each entry is a pool of up to INSIGHT_CACHE_VARIANTS question
+    sets and an upload gets a random one. Only the first upload of a profile
+    waits for Gemini. While the pool is not full, or once its oldest set is
+    older than INSIGHT_CACHE_TTL, a hit also starts one background generation
+    for that profile, which replaces the oldest set. Placeholder answers from
+    failed calls are returned but never stored.
+    """
+
+    def __init__(self, variants=INSIGHT_CACHE_VARIANTS, ttl=INSIGHT_CACHE_TTL, max_profiles=INSIGHT_CACHE_MAX_PROFILES):
+        self.variants = variants
+        self.ttl = ttl
+        self.max_profiles = max_profiles
+        # fingerprint -> [(created, insights), ...], oldest first
+        self._pools = OrderedDict()
+        self._refreshing = set()
+        self._tasks = set()
+        self._flight = SingleFlight("insights")
+        self.hits = 0
+        self.misses = 0
+        self.background_generations = 0
+        self.failed_generations = 0
+
+    async def get(self, df):
+        key = await asyncio.to_thread(profile_fingerprint, df)
+        pool = self._pools.get(key)
+        if not pool:
+            self.misses += 1
+            # Concurrent first uploads of one profile share a single call
+            return await self._flight.run(key, lambda: self._generate(key, df))
+        self.hits += 1
+        self._pools.move_to_end(key)
+        if len(pool) < self.variants or time.time() - pool[0][0] > self.ttl:
+            self._refresh(key, df)
+        return random.choice(pool)[1]
+
+    async def _generate(self, key, df):
+        insights = await generate_insights_from_gemini(df)
+        if is_fallback(insights):
+            self.failed_generations += 1
+        else:
+            self._add(key, insights)
+        return insights
+
+    def _add(self, key, insights):
+        pool = self._pools.setdefault(key, [])
+        pool.append((time.time(), insights))
+        del pool[:-self.variants]
+        self._pools.move_to_end(key)
+        while len(self._pools) > self.max_profiles:
+            self._pools.popitem(last=False)
+
+    def _refresh(self, key, df):
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        task = asyncio.get_running_loop().create_task(self._background(key, df))
+        # The loop only keeps weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _background(self, key, df):
+        self.background_generations += 1
+        try:
+            await self._generate(key, df)
+        except Exception as e:
+            self.failed_generations += 1
+            logger.warning("Background insight generation failed: %s", e)
+        finally:
+            self._refreshing.discard(key)
+
+    async def close(self):
+        """Cancel background generations still running"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "profiles": len(self._pools),
+            "question_sets": sum(len(pool) for pool in self._pools.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "background_generations": self.background_generations,
+            "failed_generations": self.failed_generations,
+            "refreshing": len(self._refreshing),
+            "coalescing": self._flight.stats(),
+        }
+
+
+insight_cache = InsightCache()
@@ -1,23 +1,43 @@
+import asyncio
 import os
-import io
 import json
-import google.generativeai as genai
+import logging
+from utility.utils import gemini_model, generate_content_async
+from services.facts import compute_facts, format_facts
 from prompt.gemini_insight_prompt import GEMINI_INSIGHT_PROMPT, GEMINI_INSIGHT_EXAMPLE_RESPONSE
 
+logger = logging.getLogger(__name__)
+
+# Returned in place of generated questions when the call fails or its answer cannot be parsed
+PARSE_FAILURE_INSIGHTS = {"question": ["Could not parse response properly.",
+                                       "Please check the data format.",
+                                       "Consider using a different prompt.",
+                                       "Raw response may contain insights but in wrong format."]}
+ERROR_INSIGHTS = {"question": ["Could not generate insights from the data.",
+                               "Error connecting to Gemini API.",
+                               "Please check your API key and network connection.",
+                               "Try with a smaller dataset sample."]}
+
+
+def is_fallback(insights):
+    """True for the placeholder answers above, or anything without questions"""
+    return not isinstance(insights, dict) or not insights.get("question") or insights in (PARSE_FAILURE_INSIGHTS, ERROR_INSIGHTS)
+
 
 async def generate_insights_from_gemini(df):
-    """Generate insights from Gemini based on the dataframe"""
-    genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
-    data_sample = df.head(100)
-    csv_buffer = io.StringIO()
-    data_sample.to_csv(csv_buffer, index=False)
-    csv_text = csv_buffer.getvalue()
-    model = genai.GenerativeModel('gemini-2.0-flash')
-    columns = df.columns.tolist()
+    """
+    Generate insights from Gemini based on the dataframe.
+
+    The prompt carries the columns and a ranked list of facts computed over
+    every row (services.facts) rather than raw sample rows.
+    """
+    facts = await asyncio.to_thread(compute_facts, df)
+    model = gemini_model(os.environ.get("GEMINI_API_KEY"), 'gemini-2.0-flash')
     system_instruction = GEMINI_INSIGHT_PROMPT
     example_response = GEMINI_INSIGHT_EXAMPLE_RESPONSE
-    column_info = "Dataset columns: " + ", ".join(columns)
-    prompt = f"{system_instruction}\n\n{column_info}\n\nExample output format:\n{example_response}\n\nData to analyze:\n{csv_text}\n\nGenerate 4 simple, business-focused questions for this dataset."
+    column_info = "Dataset columns: " + ", ".join(f"{name} ({dtype})" for name, dtype in df.dtypes.astype(str).items())
+    fact_list = format_facts(facts) or "(no notable facts found)"
+    prompt = f"{system_instruction}\n\n{column_info}\n\nFacts computed from all {len(df)} rows, most notable first:\n{fact_list}\n\nExample output format:\n{example_response}\n\nGenerate 4 simple, business-focused questions for this dataset."
     generation_config = {
         "temperature": 1,
         "top_p": 0.95,
@@ -26,7 +46,8 @@ async def generate_insights_from_gemini(df):
         "response_mime_type": "application/json"
     }
     try:
-        response = model.generate_content(
+        response = await generate_content_async(
+            model,
             prompt,
             generation_config=generation_config
         )
@@ -43,7 +64,7 @@ async def generate_insights_from_gemini(df):
                         response_text = content.parts[0].text
                         return json.loads(response_text)
         except (json.JSONDecodeError, AttributeError) as e:
-            print(f"Error parsing response: {str(e)}")
+            logger.warning("Error parsing insights response: %s", e)
             if hasattr(response, 'text'):
                 raw_text = response.text
             elif hasattr(response, 'parts'):
@@ -58,13 +79,7 @@ async def generate_insights_from_gemini(df):
                     return json.loads(json_str)
             except:
                 pass
-            return {"question": ["Could not parse response properly.", 
-                              "Please check the data format.",
-                              "Consider using a different prompt.",
-                              "Raw response may contain insights but in wrong format."]}
+            return dict(PARSE_FAILURE_INSIGHTS)
     except Exception as e:
-        print(f"Error generating insights: {str(e)}")
-        return {"question": ["Could not generate insights from the data.",
-                          "Error connecting to Gemini API.",
-                          "Please check your API key and network connection.",
-                          "Try with a smaller dataset sample."]}
\ No newline at end of file
+        logger.warning("Error generating insights: %s", e)
+        return dict(ERROR_INSIGHTS)
\ No newline at end of file
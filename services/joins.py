@@ -0,0 +1,275 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+from pandas.api import types as ptypes
+from services.facts import compute_facts, column_roles, format_value, format_share
+
+# Hash functions per MinHash signature; the Jaccard estimate is off by about 1/sqrt(this)
+JOIN_SKETCH_PERMUTATIONS = int(os.getenv("JOIN_SKETCH_PERMUTATIONS", 128))
+# Share of a column's values that must exist in another file's key column for the two to join
+JOIN_MIN_CONTAINMENT = float(os.getenv("JOIN_MIN_CONTAINMENT", 0.8))
+# Columns per file tried as join keys, and computed facts kept per relationship
+JOIN_MAX_KEY_COLUMNS = int(os.getenv("JOIN_MAX_KEY_COLUMNS", 20))
+JOIN_FACT_LIMIT = int(os.getenv("JOIN_FACT_LIMIT", 8))
+
+# Leeway for the sketch estimate before a pair is checked exactly
+_ESTIMATE_SLACK = 0.15
+# Beyond this ratio of distinct counts the Jaccard of the two sets is too small for a
+# signature to see; such pairs are probed exactly with a sample of the smaller side
+_MAX_SKETCH_SKEW = 16
+_PROBE_VALUES = 256
+# Longest average text value still treated as a possible key rather than free text
+_MAX_KEY_CHARS = 64
+_ID_NAME = re.compile(r"(^|[\W_])(id|key|code|no|num|number|sku)$|[a-z](Id|ID|Key|Code|No)$")
+_NAME_TOKEN = re.compile(r"[A-Za-z][a-z]*|[0-9]+")
+
+_rng = np.random.default_rng(20240611)
+_XORS = _rng.integers(0, np.iinfo(np.int64).max, size=JOIN_SKETCH_PERMUTATIONS, dtype=np.int64).astype(np.uint64)
+# Odd multipliers make each (h ^ x) * m mod 2**64 a permutation of the 64-bit hashes
+_MULTIPLIERS = _rng.integers(0, np.iinfo(np.int64).max, size=JOIN_SKETCH_PERMUTATIONS, dtype=np.int64).astype(np.uint64) | np.uint64(1)
+
+
+def _minhash(hashes):
+    signature = np.empty(len(_XORS), dtype=np.uint64)
+    for i, (xor, multiplier) in enumerate(zip(_XORS, _MULTIPLIERS)):
+        signature[i] = ((hashes ^ xor) * multiplier).min()
+    return signature
+
+
+def _key_text(name, series):
+    """A column's non-null values as text, so 17, 17.0 and "17" compare equal; None if it cannot be a key"""
+    if ptypes.is_bool_dtype(series.dtype) or ptypes.is_datetime64_any_dtype(series.dtype):
+        return None
+    values = series.dropna()
+    if values.nunique() < 2:
+        return None
+    if ptypes.is_numeric_dtype(values.dtype):
+        # Numbers are keys only when named like one or unique: quantities and prices overlap by chance
+        if not (_ID_NAME.search(str(name)) or values.is_unique):
+            return None
+        if ptypes.is_float_dtype(values.dtype):
+            # Integer keys with gaps are read from CSV as floats
+            if not (values == np.floor(values)).all():
+                return None
+            values = values.astype(np.int64)
+        return values.astype(str)
+    if not (ptypes.is_object_dtype(values.dtype) or ptypes.is_string_dtype(values.dtype) or str(values.dtype) == "category"):
+        return None
+    text = values.astype(str).str.strip()
+    if text.head(200).str.len().mean() > _MAX_KEY_CHARS:
+        return None
+    return text
+
+
+class KeyColumn:
+    """A possible join key: its values as text by row position, their MinHash signature and, on demand, a hash index"""
+
+    def __init__(self, file_label, name, text):
+        self.file_label = file_label
+        self.name = name
+        self.text = text
+        distinct = pd.unique(text.to_numpy())
+        self.distinct = len(distinct)
+        self.unique = self.distinct == len(text)
+        self._distinct = distinct
+        self.signature = _minhash(pd.util.hash_array(distinct.astype(object)))
+        self._index = None
+
+    @property
+    def label(self):
+        return f"{self.file_label}.{self.name}"
+
+    def index(self):
+        """Hash index from value to row position (key columns are unique)"""
+        if self._index is None:
+            self._index = pd.Index(self.text.to_numpy())
+        return self._index
+
+    def containment_in(self, key):
+        """Estimated share of this column's distinct values found in key"""
+        if self.distinct * _MAX_SKETCH_SKEW < key.distinct:
+            sample = self._distinct[:: max(1, self.distinct // _PROBE_VALUES)]
+            return float((key.index().get_indexer(sample) >= 0).mean())
+        jaccard = float(np.mean(self.signature == key.signature))
+        return min(1.0, jaccard * (self.distinct + key.distinct) / ((1 + jaccard) * self.distinct))
+
+
+def _key_columns(file_label, df):
+    columns = []
+    for position in range(df.shape[1]):
+        name = df.columns[position]
+        text = _key_text(name, df.iloc[:, position].reset_index(drop=True))
+        if text is not None:
+            columns.append(KeyColumn(file_label, name, text))
+        if len(columns) == JOIN_MAX_KEY_COLUMNS:
+            break
+    return columns
+
+
+def _name_tokens(*names):
+    return {token.lower().rstrip("s") for name in names for token in _NAME_TOKEN.findall(str(name))}
+
+
+def _name_similarity(foreign, key):
+    """Token overlap of the foreign key's name with the key's name and file, e.g. customer_id and customers.id"""
+    a, b = _name_tokens(foreign.name), _name_tokens(key.name, key.file_label)
+    return len(a & b) / len(a | b) if a | b else 0.0
+
+
+def _file_labels(filenames):
+    labels = {}
+    for file_key, filename in filenames.items():
+        label = os.path.splitext(filename)[0]
+        labels[file_key] = label if label not in labels.values() else file_key
+    return labels
+
+
+def _label_column(df, key_name):
+    """The column naming a key's rows, such as a customer name; the key itself if there is none"""
+    for name in df.columns:
+        if name == key_name or ptypes.is_numeric_dtype(df[name].dtype):
+            continue
+        if df[name].nunique() >= 0.9 * len(df):
+            return name
+    return key_name
+
+
+class Relationship:
+    """A verified foreign key: positions maps each row of the referencing file to its row in the key file, -1 if none"""
+
+    def __init__(self, foreign, key, positions):
+        self.foreign = foreign
+        self.key = key
+        self.positions = positions
+        self.matched = positions >= 0
+        self.match_rate = float(self.matched.mean()) if len(positions) else 0.0
+
+    def describe(self, many_rows, one_rows):
+        kind = "one-to-one" if self.foreign.unique else "many-to-one"
+        unreferenced = one_rows - len(np.unique(self.positions[self.matched]))
+        return (
+            f"{self.foreign.label} -> {self.key.label} ({kind}): {format_value(self.matched.sum())} of "
+            f"{format_value(many_rows)} {self.foreign.file_label} rows ({format_share(self.match_rate)}) match a "
+            f"{self.key.file_label} row; {format_value(unreferenced)} of {format_value(one_rows)} "
+            f"{self.key.file_label} rows are never referenced."
+        )
+
+
+def _entity_facts(relationship, many, one, measures):
+    """Top key rows by each measure of the referencing file, summed through the hash index with bincount"""
+    facts = []
+    positions = relationship.positions[relationship.matched]
+    labels = one[_label_column(one, relationship.key.name)].to_numpy()
+    if not relationship.foreign.unique:
+        counts = np.bincount(positions, minlength=len(one))
+        facts.append(
+            f"{relationship.foreign.file_label} rows per {relationship.key.file_label} row: median "
+            f"{format_value(np.median(counts))}, max {format_value(counts.max())} ({labels[counts.argmax()]})."
+        )
+    for measure in measures[:2]:
+        values = pd.to_numeric(many[measure], errors="coerce").to_numpy(dtype=np.float64)[relationship.matched]
+        present = ~np.isnan(values)
+        totals = np.bincount(positions[present], weights=values[present], minlength=len(one))
+        total = totals.sum()
+        if total <= 0 or (totals < 0).any():
+            continue
+        top = np.argsort(-totals, kind="stable")[:3]
+        top_ten = np.sort(totals)[::-1][:10].sum() / total
+        facts.append(
+            f"Top {relationship.key.file_label} by total {relationship.foreign.file_label}.{measure}: "
+            + ", ".join(f"{labels[i]} {format_value(totals[i])} ({format_share(totals[i] / total)})" for i in top)
+            + f"; the top {min(10, len(one))} of {format_value(len(one))} account for {format_share(top_ten)}."
+        )
+    return facts
+
+
+def _joined_facts(relationship, many, one, limit=JOIN_FACT_LIMIT):
+    """
+    Facts about the referencing rows broken down by the key file's
+    dimensions, from the joined frame of the matched rows
+    """
+    measures, _, _ = column_roles(many)
+    _, dimensions, _ = column_roles(one)
+    # Keys with gaps are floats, which column_roles takes for measures
+    measures = [m for m in measures if m != relationship.foreign.name and not _ID_NAME.search(str(m))]
+    facts = _entity_facts(relationship, many, one, measures)
+    positions = relationship.positions[relationship.matched]
+    joined = {f"{relationship.foreign.file_label}.{m}": many[m].to_numpy()[relationship.matched] for m in measures}
+    key_columns = set()
+    for dim in dimensions:
+        if dim == relationship.key.name:
+            continue
+        label = f"{relationship.key.file_label}.{dim}"
+        joined[label] = one[dim].to_numpy()[positions]
+        key_columns.add(label)
+    if key_columns:
+        # Facts about the referencing file alone are already in its own context
+        computed = compute_facts(pd.DataFrame(joined), limit=4 * limit)
+        facts += [fact["text"] for fact in computed if key_columns & set(fact["columns"])]
+    return facts[:limit]
+
+
+def discover_relationships(frames, filenames):
+    """
+    Foreign keys between uploaded files, with facts computed over the joins.
+
+    Each file's possible key columns (text, or numbers named like ids) get a
+    MinHash signature of their distinct values. A column whose values are
+    estimated to be mostly contained in a unique column of another file is
+    checked exactly through a hash index on that unique column, and kept if
+    JOIN_MIN_CONTAINMENT of its rows match (both ways for one-to-one); of
+    several keys the one named most alike wins, then the best matched. frames and filenames are keyed alike; returns
+    [{"from", "to", "match_rate", "summary", "facts"}], best matched first.
+    """
+    labels = _file_labels(filenames)
+    frames = {file_key: df.reset_index(drop=True) for file_key, df in frames.items()}
+    keys = {file_key: _key_columns(labels[file_key], df) for file_key, df in frames.items()}
+    relationships = []
+    for many_key, foreign_columns in keys.items():
+        for foreign in foreign_columns:
+            best = None
+            for one_key, key_columns in keys.items():
+                if one_key == many_key:
+                    continue
+                for key in key_columns:
+                    # One-to-one pairs are reported once, from the file listed first
+                    if not key.unique or (foreign.unique and (many_key, foreign.name) > (one_key, key.name)):
+                        continue
+                    if foreign.containment_in(key) < JOIN_MIN_CONTAINMENT - _ESTIMATE_SLACK:
+                        continue
+                    positions = np.full(len(frames[many_key]), -1, dtype=np.int64)
+                    positions[foreign.text.index.to_numpy()] = key.index().get_indexer(foreign.text.to_numpy())
+                    candidate = Relationship(foreign, key, positions)
+                    if candidate.matched.sum() < JOIN_MIN_CONTAINMENT * len(foreign.text):
+                        continue
+                    # Unique numbers sit inside any longer id range; one-to-one must hold both ways
+                    if foreign.unique and candidate.matched.sum() < JOIN_MIN_CONTAINMENT * key.distinct:
+                        continue
+                    # Every candidate left matches well enough, so the names decide between them
+                    rank = (_name_similarity(foreign, key), candidate.match_rate)
+                    if best is None or rank > best[0]:
+                        best = (rank, candidate, one_key)
+            if best is not None:
+                _, relationship, one_key = best
+                many, one = frames[many_key], frames[one_key]
+                relationships.append({
+                    "from": relationship.foreign.label,
+                    "to": relationship.key.label,
+                    "match_rate": round(relationship.match_rate, 4),
+                    "summary": relationship.describe(len(many), len(one)),
+                    "facts": _joined_facts(relationship, many, one),
+                })
+    relationships.sort(key=lambda r: r["match_rate"], reverse=True)
+    return relationships
+
+
+def format_relationships(relationships):
+    """Relationship summaries with their facts for a prompt"""
+    if not relationships:
+        return "(no relationships between the files were found)"
+    lines = []
+    for relationship in relationships:
+        lines.append(f"- {relationship['summary']}")
+        lines.extend(f"  {i}. {fact}" for i, fact in enumerate(relationship["facts"], 1))
+    return "\n".join(lines)
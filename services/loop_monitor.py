@@ -0,0 +1,77 @@
+import asyncio
+import collections
+import os
+import time
+
+# How often the monitor wakes up, and how many recent lag samples it keeps
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", 100))
+LOOP_LAG_WINDOW = int(os.getenv("LOOP_LAG_WINDOW", 600))
+# Lag above this counts as a stall: something blocked the loop
+LOOP_LAG_STALL_MS = float(os.getenv("LOOP_LAG_STALL_MS", 100))
+
+
+class LoopLagMonitor:
+    """
+    Event-loop lag: how much later than requested a periodic sleep wakes up.
+
+    Any synchronous work on the loop (parsing, serialization, a blocking SDK
+    call) delays every other request by the same amount, and shows up here.
+    """
+
+    def __init__(self, interval_ms=LOOP_LAG_INTERVAL_MS, window=LOOP_LAG_WINDOW, stall_ms=LOOP_LAG_STALL_MS):
+        self.interval_ms = interval_ms
+        self.stall_ms = stall_ms
+        self._recent = collections.deque(maxlen=window)
+        self._task = None
+        self.samples = 0
+        self.stalls = 0
+        self.max_lag_ms = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        interval = self.interval_ms / 1000
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag_ms = max(0.0, (time.perf_counter() - started - interval) * 1000)
+            self._recent.append(lag_ms)
+            self.samples += 1
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            if lag_ms >= self.stall_ms:
+                self.stalls += 1
+
+    def stats(self):
+        recent = sorted(self._recent)
+
+        def percentile(q):
+            return round(recent[min(len(recent) - 1, int(q * len(recent)))], 3) if recent else None
+
+        return {
+            "running": self._task is not None,
+            "interval_ms": self.interval_ms,
+            "samples": self.samples,
+            # Over the last LOOP_LAG_WINDOW samples
+            "recent_lag_ms": {
+                "p50": percentile(0.50),
+                "p99": percentile(0.99),
+                "max": round(recent[-1], 3) if recent else None,
+            },
+            "max_lag_ms": round(self.max_lag_ms, 3),
+            "stalls": self.stalls,
+        }
+
+
+loop_monitor = LoopLagMonitor()
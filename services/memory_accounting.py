@@ -0,0 +1,281 @@
+import os
+import sys
+import time
+import tracemalloc
+import types
+import numpy as np
+import pandas as pd
+from state import uploaded_df, uploaded_file_info, dataset_versions, chat_sessions, chat_summaries, session_last_seen
+from services.result_cache import result_cache
+from services.result_store import result_store
+from services.executor import execution_service
+from services.plan_cache import plan_cache
+from services.schema_registry import schema_registry
+from services.insight_cache import insight_cache
+from services.frame_append import frame_appender
+from services.rollup import rollup_cubes
+
+# Frames kept per allocation traceback; > 0 starts tracemalloc at startup (it slows allocation down)
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", 0))
+# What an eviction can drop for a session, and the reported structures each one frees:
+# the uploaded frame with its cached and stored results, and the /deeper-insights-csv chats
+EVICTABLE = {
+    "uploads": ("uploaded_df", "file_info", "append_buffer", "rollup_cube", "result_cache", "result_store", "exported_frame"),
+    "chats": ("chat_frames", "chat_context", "chat_index", "chat_history"),
+}
+
+# Per-session structures held in this process's memory; the rest are files
+HEAP_STRUCTURES = ("uploaded_df", "file_info", "append_buffer", "rollup_cube", "chat_frames", "chat_context", "chat_index", "chat_history", "result_cache")
+FILE_STRUCTURES = ("result_store", "exported_frame")
+
+_NOT_DATA = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def deep_sizeof(obj, seen=None):
+    """
+    Approximate bytes held by obj and everything it references.
+
+    pandas objects are measured with memory_usage(deep=True), NumPy arrays by
+    their buffers, containers and plain objects recursively. Objects whose id
+    is already in seen are not counted again, so sharing one seen set across
+    calls counts shared data once.
+    """
+    seen = set() if seen is None else seen
+    total = 0
+    pending = [obj]
+    while pending:
+        item = pending.pop()
+        if id(item) in seen or isinstance(item, _NOT_DATA):
+            continue
+        seen.add(id(item))
+        if isinstance(item, pd.DataFrame):
+            total += int(item.memory_usage(deep=True, index=True).sum())
+        elif isinstance(item, (pd.Series, pd.Index)):
+            total += int(item.memory_usage(deep=True))
+        elif isinstance(item, np.ndarray):
+            total += sys.getsizeof(item) + (item.nbytes if item.base is None else 0)
+        else:
+            total += sys.getsizeof(item)
+            if isinstance(item, dict):
+                pending.extend(item.keys())
+                pending.extend(item.values())
+            elif isinstance(item, (list, tuple, set, frozenset)):
+                pending.extend(item)
+            elif hasattr(item, "__dict__"):
+                pending.append(vars(item))
+    return total
+
+
+def process_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _chat_sizes(entries, seen):
+    sizes = {"chat_frames": 0, "chat_context": 0, "chat_index": 0, "chat_history": 0}
+    for entry in entries:
+        sizes["chat_frames"] += deep_sizeof(entry.get("dataframes_raw"), seen)
+        sizes["chat_context"] += deep_sizeof(entry.get("dataframes_context"), seen)
+        sizes["chat_index"] += deep_sizeof(entry.get("row_indexes"), seen)
+        rest = {k: v for k, v in entry.items() if k not in ("dataframes_raw", "dataframes_context", "row_indexes")}
+        sizes["chat_history"] += deep_sizeof(rest, seen)
+    return sizes
+
+
+class MemoryAccountant:
+    """
+    Deep memory use of the per-session state and caches, and eviction from it.
+
+    Reports are computed on demand. Allocation growth comes from tracemalloc
+    snapshots: when tracing is on, each report is compared to the snapshot
+    taken by the previous one.
+    """
+
+    def __init__(self, trace_frames=MEMORY_TRACE_FRAMES):
+        self._snapshot = None
+        self._snapshot_at = None
+        self.evicted_sessions = 0
+        self.evicted_bytes = 0
+        if trace_frames > 0:
+            self.start_tracing(trace_frames)
+
+    def start_tracing(self, frames=1):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        tracemalloc.start(frames)
+        self._snapshot = self._snapshot_at = None
+
+    def stop_tracing(self):
+        tracemalloc.stop()
+        self._snapshot = self._snapshot_at = None
+
+    def snapshot(self):
+        """
+        Copies of the containers session_sizes() and report() walk, taken on
+        the event loop: requests mutate the live dicts, and iterating one in a
+        thread while it changes size raises. The copies are shallow down to
+        the data itself, which is measured in the thread.
+        """
+        return {
+            "frames": dict(uploaded_df),
+            "file_info": dict(uploaded_file_info),
+            "chats": {session_id: [dict(entry) for entry in entries] for session_id, entries in list(chat_sessions.items())},
+            "chat_summaries": dict(chat_summaries),
+            "per_structure": {
+                "append_buffer": frame_appender.session_bytes(),
+                "rollup_cube": rollup_cubes.session_bytes(),
+                "result_cache": result_cache.session_bytes(),
+                "result_store": result_store.session_bytes(),
+            },
+            "shared": {
+                "plan_cache": [(key, list(plans.plans.items()), plans._index) for key, plans in list(plan_cache._schemas.items())],
+                "schema_registry": (
+                    {schema_id: list(versions) for schema_id, versions in list(schema_registry._schemas.items())},
+                    {schema_id: dict(parsed) for schema_id, parsed in list(schema_registry._parsed.items())},
+                ),
+                "insight_cache": [(key, list(pool)) for key, pool in list(insight_cache._pools.items())],
+            },
+        }
+
+    def session_sizes(self, snapshot=None):
+        """{session_id: {structure: bytes}} for every session holding memory, files included"""
+        snapshot = snapshot or self.snapshot()
+        # Files are only stat'ed, which is safe from the thread
+        per_structure = {**snapshot["per_structure"], "exported_frame": execution_service.exported_bytes()}
+        seen = set()
+        sessions = {}
+        for session_id, df in snapshot["frames"].items():
+            sessions.setdefault(session_id, {})["uploaded_df"] = deep_sizeof(df, seen)
+        for session_id, info in snapshot["file_info"].items():
+            sessions.setdefault(session_id, {})["file_info"] = deep_sizeof(info, seen)
+        for session_id, entries in snapshot["chats"].items():
+            sessions.setdefault(session_id, {}).update(_chat_sizes(entries, seen))
+        for session_id, summary in snapshot["chat_summaries"].items():
+            sizes = sessions.setdefault(session_id, {})
+            sizes["chat_history"] = sizes.get("chat_history", 0) + deep_sizeof(summary, seen)
+        for structure, sizes in per_structure.items():
+            for session_id, size in sizes.items():
+                sessions.setdefault(session_id, {})[structure] = size
+        return sessions
+
+    def report(self, top=10, allocations=20, snapshot=None):
+        started = time.perf_counter()
+        snapshot = snapshot or self.snapshot()
+        sessions = self.session_sizes(snapshot)
+        structures = {}
+        for sizes in sessions.values():
+            for structure, size in sizes.items():
+                entry = structures.setdefault(structure, {"sessions": 0, "bytes": 0})
+                entry["sessions"] += 1
+                entry["bytes"] += size
+        shared = {name: deep_sizeof(contents) for name, contents in snapshot["shared"].items()}
+        tracked_heap = sum(structures.get(s, {}).get("bytes", 0) for s in HEAP_STRUCTURES) + sum(shared.values())
+        rss = process_rss_bytes()
+        now = time.time()
+        largest = sorted(sessions.items(), key=lambda item: sum(item[1].values()), reverse=True)[:top]
+        return {
+            "process": {
+                "rss_bytes": rss,
+                "tracked_heap_bytes": tracked_heap,
+                "untracked_bytes": rss - tracked_heap if rss is not None else None,
+                "tracked_file_bytes": sum(structures.get(s, {}).get("bytes", 0) for s in FILE_STRUCTURES),
+                "workers_rss_bytes": execution_service.workers_rss_bytes(),
+            },
+            "structures": structures,
+            "shared": shared,
+            "sessions": {
+                "count": len(sessions),
+                "largest": [
+                    {
+                        "session_id": session_id,
+                        "bytes": sum(sizes.values()),
+                        "structures": sizes,
+                        "idle_seconds": round(now - session_last_seen[session_id], 1) if session_id in session_last_seen else None,
+                    }
+                    for session_id, sizes in largest
+                ],
+            },
+            "allocations": self.allocation_growth(allocations),
+            "evictions": {"sessions": self.evicted_sessions, "bytes": self.evicted_bytes},
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    def allocation_growth(self, top=20):
+        """Source lines whose traced allocations grew most since the previous snapshot"""
+        if not tracemalloc.is_tracing():
+            return {"tracing": False}
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+        traced, peak = tracemalloc.get_traced_memory()
+        growth = []
+        if self._snapshot is not None:
+            for stat in snapshot.compare_to(self._snapshot, "lineno")[:top]:
+                frame = stat.traceback[0]
+                growth.append({
+                    "location": f"{frame.filename}:{frame.lineno}",
+                    "size_diff_bytes": stat.size_diff,
+                    "size_bytes": stat.size,
+                    "count_diff": stat.count_diff,
+                })
+        since = self._snapshot_at
+        self._snapshot, self._snapshot_at = snapshot, time.time()
+        return {
+            "tracing": True,
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": traced,
+            "peak_traced_bytes": peak,
+            "since": since,
+            "growth": growth,
+        }
+
+    def select_sessions(self, sessions, prefix=None, idle_seconds=None, min_bytes=None):
+        """Session ids from a session_sizes() result matching every given criterion"""
+        now = time.time()
+        selected = []
+        for session_id, sizes in sessions.items():
+            if prefix is not None and not session_id.startswith(prefix):
+                continue
+            if idle_seconds is not None and now - session_last_seen.get(session_id, 0) < idle_seconds:
+                continue
+            if min_bytes is not None and sum(sizes.values()) < min_bytes:
+                continue
+            selected.append(session_id)
+        return selected
+
+    def evictable_bytes(self, sizes, structures=tuple(EVICTABLE)):
+        """Bytes of one session's sizes that evicting structures would free"""
+        return sum(sizes.get(name, 0) for kind in structures for name in EVICTABLE[kind])
+
+    def evict(self, session_id, structures=tuple(EVICTABLE)):
+        """Drop a session's data; True if there was anything to drop"""
+        found = False
+        if "uploads" in structures:
+            found = uploaded_df.pop(session_id, None) is not None or found
+            uploaded_file_info.pop(session_id, None)
+            dataset_versions.pop(session_id, None)
+            result_cache.invalidate_session(session_id)
+            result_store.invalidate_session(session_id)
+            execution_service.forget_session(session_id)
+            frame_appender.forget_session(session_id)
+            rollup_cubes.forget_session(session_id)
+        if "chats" in structures:
+            found = chat_sessions.pop(session_id, None) is not None or found
+            chat_summaries.pop(session_id, None)
+        if session_id not in uploaded_df and session_id not in chat_sessions:
+            session_last_seen.pop(session_id, None)
+        if found:
+            self.evicted_sessions += 1
+        return found
+
+    def record_freed(self, freed_bytes):
+        self.evicted_bytes += freed_bytes
+
+
+memory_accountant = MemoryAccountant()
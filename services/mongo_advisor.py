@@ -0,0 +1,304 @@
+from services.mongo_query import MongoQueryParseError, Regex, load_schema, parse_mongo_query
+
+_EQUALITY_OPERATORS = {"$eq", "$in", "$all", "$elemMatch", "$size"}
+_RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte", "$ne", "$nin", "$exists", "$not", "$type", "$mod"}
+_LOGICAL_OPERATORS = {"$and", "$or", "$nor"}
+# Leading stages that still read collection documents as stored (and so can use indexes)
+_INDEX_STAGES = {"$match", "$sort", "$limit", "$skip"}
+
+
+def _index_keys(spec):
+    """Normalize one index description to [(field, direction), ...]"""
+    if isinstance(spec, dict):
+        if isinstance(spec.get("key"), dict):
+            spec = spec["key"]
+        elif isinstance(spec.get("keys"), (dict, list)):
+            spec = spec["keys"]
+        elif isinstance(spec.get("fields"), (dict, list)):
+            spec = spec["fields"]
+        if isinstance(spec, dict):
+            return [(str(name), direction) for name, direction in spec.items()]
+    if isinstance(spec, list):
+        keys = []
+        for item in spec:
+            if isinstance(item, str):
+                keys.append((item, 1))
+            elif isinstance(item, (list, tuple)) and item:
+                keys.append((str(item[0]), item[1] if len(item) > 1 else 1))
+        return keys
+    if isinstance(spec, str):
+        # Default index names, e.g. "status_1_created_at_-1"
+        parts = spec.split("_")
+        keys, name = [], []
+        for part in parts:
+            if part in ("1", "-1", "text", "2dsphere", "hashed") and name:
+                keys.append(("_".join(name), int(part) if part.lstrip("-").isdigit() else part))
+                name = []
+            else:
+                name.append(part)
+        return keys or [(spec, 1)]
+    return []
+
+
+def extract_indexes(db_schema):
+    """
+    Collection indexes described in a schema, as {collection: [[(field, direction), ...], ...]}.
+
+    Understands {"collections": {...}}, {name: {...}} and [{"name": ...}, ...]
+    layouts whose collection entries carry "indexes" in getIndexes() form,
+    as key documents, field lists or default index names. Collections
+    without an "indexes" entry are left out: nothing is known about them.
+    """
+    schema = load_schema(db_schema)
+    if isinstance(schema, dict) and isinstance(schema.get("collections"), (dict, list)):
+        schema = schema["collections"]
+    if isinstance(schema, list):
+        schema = {entry.get("name") or entry.get("collection"): entry for entry in schema if isinstance(entry, dict)}
+    if not isinstance(schema, dict):
+        return {}
+    indexes = {}
+    for name, entry in schema.items():
+        if name and isinstance(entry, dict) and isinstance(entry.get("indexes"), list):
+            keys = [_index_keys(spec) for spec in entry["indexes"]]
+            indexes[name] = [k for k in keys if k]
+    return indexes
+
+
+def _classify(condition):
+    if isinstance(condition, Regex):
+        return "regex"
+    if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+        if "$regex" in condition:
+            return "regex"
+        if set(condition) & _RANGE_OPERATORS and not set(condition) & _EQUALITY_OPERATORS:
+            return "range"
+    return "equality"
+
+
+def filter_fields(query_filter, fields=None):
+    """Map each field in a query filter to "equality", "range" or "regex" (the first use wins)"""
+    fields = {} if fields is None else fields
+    if not isinstance(query_filter, dict):
+        return fields
+    for key, condition in query_filter.items():
+        if key in _LOGICAL_OPERATORS and isinstance(condition, list):
+            for branch in condition:
+                filter_fields(branch, fields)
+        elif not key.startswith("$"):
+            fields.setdefault(key, _classify(condition))
+    return fields
+
+
+def _regexes(query_filter):
+    """(field, Regex) pairs in a filter, including {$regex: ...} conditions"""
+    found = []
+    if not isinstance(query_filter, dict):
+        return found
+    for key, condition in query_filter.items():
+        if key in _LOGICAL_OPERATORS and isinstance(condition, list):
+            for branch in condition:
+                found.extend(_regexes(branch))
+        elif isinstance(condition, Regex):
+            found.append((key, condition))
+        elif isinstance(condition, dict) and "$regex" in condition:
+            pattern = condition["$regex"]
+            if isinstance(pattern, Regex):
+                found.append((key, pattern))
+            else:
+                found.append((key, Regex(str(pattern), str(condition.get("$options", "")))))
+    return found
+
+
+def _suggested_index(fields, sort):
+    # Equality, Sort, Range: the field order that lets one index serve the whole query
+    keys = {name: 1 for name, kind in fields.items() if kind == "equality"}
+    for name, direction in sort.items():
+        keys.setdefault(name, direction)
+    for name, kind in fields.items():
+        keys.setdefault(name, 1)
+    return keys
+
+
+def _sort_supported(indexes, fields, sort):
+    """Whether an index returns documents in the sort order after the equality prefix"""
+    wanted = list(sort.items())
+    equality = {name for name, kind in fields.items() if kind == "equality"}
+    for keys in indexes:
+        position = 0
+        while position < len(keys) and keys[position][0] in equality and keys[position][0] not in sort:
+            position += 1
+        candidate = keys[position:position + len(wanted)]
+        if len(candidate) != len(wanted) or [k for k, _ in candidate] != [k for k, _ in wanted]:
+            continue
+        signs = [_sign(d) * _sign(w) for (_, d), (_, w) in zip(candidate, wanted)]
+        if all(sign == 1 for sign in signs) or all(sign == -1 for sign in signs):
+            return True
+    return False
+
+
+def _sign(direction):
+    try:
+        return -1 if float(direction) < 0 else 1
+    except (TypeError, ValueError):
+        return 0
+
+
+def _check_access(collection, query_filter, sort, indexes, advisories, stage=None):
+    """Advise on the index use of one filter plus sort against a collection"""
+    fields = filter_fields(query_filter)
+    where = f" in {stage}" if stage else ""
+    for name, regex in _regexes(query_filter):
+        if not regex.pattern.startswith("^") or "i" in regex.flags:
+            advisories.append({
+                "type": "unanchored_regex",
+                "severity": "warning",
+                "collection": collection,
+                "fields": [name],
+                "message": f"Regex /{regex.pattern}/{regex.flags} on '{name}'{where} is "
+                           + ("case-insensitive" if "i" in regex.flags and regex.pattern.startswith("^") else "not anchored with ^")
+                           + ", so an index on it cannot bound the scan and every entry is examined.",
+            })
+
+    if collection not in indexes or not (fields or sort):
+        return
+    # Every collection has the _id index
+    collection_indexes = [[("_id", 1)]] + indexes[collection]
+    usable = any(keys[0][0] in fields or (not fields and keys[0][0] in sort) for keys in collection_indexes)
+    sort_ok = not sort or _sort_supported(collection_indexes, fields, sort)
+    if usable and sort_ok:
+        return
+    problems = []
+    if not usable:
+        problems.append(f"no index starts with any of the filtered fields ({', '.join(fields)})" if fields
+                        else f"no index on the sort fields ({', '.join(sort)})")
+    if not sort_ok:
+        problems.append(f"no index provides the sort order ({', '.join(sort)}), so documents are sorted in memory")
+    advisories.append({
+        "type": "missing_index",
+        "severity": "warning",
+        "collection": collection,
+        "fields": list(dict.fromkeys([*fields, *sort])),
+        "suggested_index": _suggested_index(fields, sort),
+        "message": f"Query on '{collection}'{where}: " + "; ".join(problems) + ".",
+    })
+
+
+def _group_keys(group_id):
+    """Map _id and _id.<key> of a $group to the source field they group by; computed keys are left out"""
+    if isinstance(group_id, str) and group_id.startswith("$") and not group_id.startswith("$$"):
+        return {"_id": group_id[1:]}
+    if isinstance(group_id, dict):
+        return {
+            f"_id.{key}": expression[1:] for key, expression in group_id.items()
+            if isinstance(expression, str) and expression.startswith("$") and not expression.startswith("$$")
+        }
+    return {}
+
+
+def _check_match_after_group(collection, position, spec, group, advisories):
+    keys, outputs = group
+    fields = filter_fields(spec)
+    movable = {name: keys[name] for name in fields if name in keys}
+    missing = sorted(name for name in fields if name.split(".")[0] not in outputs)
+    if movable:
+        advisories.append({
+            "type": "match_after_group",
+            "severity": "warning",
+            "collection": collection,
+            "stage": position,
+            "fields": sorted(set(movable.values())),
+            "message": f"$match at stage {position} filters on the group key ("
+                       + ", ".join(f"{name} is ${source}" for name, source in movable.items())
+                       + "). Filter on the source fields before $group so fewer documents are grouped and an index can be used.",
+        })
+    if missing:
+        advisories.append({
+            "type": "match_on_missing_field",
+            "severity": "error",
+            "collection": collection,
+            "stage": position,
+            "fields": missing,
+            "message": f"$match at stage {position} filters on {', '.join(missing)}, which $group does not output, "
+                       "so it compares against missing fields and the result is always empty.",
+        })
+
+
+def _check_pipeline(collection, pipeline, indexes, advisories):
+    leading_match, leading_sort = {}, {}
+    reshaped = False
+    # (group key sources, output fields) of the last $group while only $match and $sort follow it
+    group = None
+    for position, stage in enumerate(pipeline):
+        if not isinstance(stage, dict) or len(stage) != 1:
+            continue
+        operator, spec = next(iter(stage.items()))
+        if operator == "$match" and not reshaped:
+            leading_match = {"$and": [leading_match, spec]} if leading_match else spec
+        elif operator == "$sort" and not reshaped and isinstance(spec, dict) and not leading_sort:
+            leading_sort = spec
+        elif operator == "$match" and group is not None:
+            _check_match_after_group(collection, position, spec, group, advisories)
+        if operator == "$group" and isinstance(spec, dict):
+            group = (_group_keys(spec.get("_id")), set(spec))
+        elif operator not in ("$match", "$sort"):
+            group = None
+        if operator == "$lookup" and isinstance(spec, dict):
+            _check_lookup(spec, position, indexes, advisories)
+        if operator not in _INDEX_STAGES:
+            reshaped = True
+    _check_access(collection, leading_match, leading_sort, indexes, advisories, stage="the leading $match")
+
+
+def _check_lookup(spec, position, indexes, advisories):
+    foreign = spec.get("from")
+    foreign_field = spec.get("foreignField")
+    if not foreign or not foreign_field or foreign_field == "_id":
+        return
+    foreign_indexes = indexes.get(foreign)
+    if foreign_indexes is None:
+        return
+    if not any(keys[0][0] == foreign_field for keys in foreign_indexes):
+        advisories.append({
+            "type": "lookup_without_index",
+            "severity": "warning",
+            "collection": foreign,
+            "stage": position,
+            "fields": [foreign_field],
+            "suggested_index": {foreign_field: 1},
+            "message": f"$lookup at stage {position} joins on '{foreign}.{foreign_field}', which has no index; "
+                       "every input document scans the whole foreign collection.",
+        })
+
+
+def analyze_query(query, db_schema=None):
+    """
+    Static index advisories for a parsed MongoQuery, without a database.
+
+    Checks filter and sort keys against the indexes in db_schema (a schema
+    string or a parsed schema), $match stages after $group that filter on the
+    group key or on fields $group drops, unanchored or case-insensitive
+    regexes and $lookup joins on unindexed foreign fields.
+    """
+    indexes = extract_indexes(db_schema)
+    advisories = []
+    if query.operation == "aggregate":
+        _check_pipeline(query.collection, query.pipeline, indexes, advisories)
+    else:
+        _check_access(query.collection, query.filter, query.sort, indexes, advisories)
+    if query.collection not in indexes:
+        advisories.append({
+            "type": "no_index_information",
+            "severity": "info",
+            "collection": query.collection,
+            "message": f"The schema lists no indexes for '{query.collection}', so index use was not checked.",
+        })
+    return advisories
+
+
+def advise(query_text, db_schema=None):
+    """Parse generated query text and return its advisories"""
+    try:
+        query = parse_mongo_query(query_text)
+    except MongoQueryParseError as e:
+        return [{"type": "unparsed_query", "severity": "info", "message": f"Query was not analyzed: {e}"}]
+    return analyze_query(query, db_schema)
@@ -0,0 +1,224 @@
+import os
+import time
+from services.mongo_query import Regex, ShellCall
+
+# Server-side execution of generated queries is off unless MONGO_URI is set
+MONGO_URI = os.getenv("MONGO_URI")
+# Database to query; defaults to the one named in MONGO_URI
+MONGO_DATABASE = os.getenv("MONGO_DATABASE")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 20))
+MONGO_QUERY_TIMEOUT_MS = int(os.getenv("MONGO_QUERY_TIMEOUT_MS", 15000))
+# Documents read per query at most
+MONGO_MAX_DOCUMENTS = int(os.getenv("MONGO_MAX_DOCUMENTS", 1000))
+
+ALLOWED_OPERATIONS = {"find", "findOne", "aggregate", "countDocuments", "count", "distinct", "estimatedDocumentCount"}
+ALLOWED_MODIFIERS = {"sort", "limit", "skip", "project"}
+# Stages and operators that write, or run server-side JavaScript
+FORBIDDEN_OPERATORS = {"$out", "$merge", "$where", "$function", "$accumulator", "$eval"}
+# Stages that read server state (operations, sessions, storage and index statistics) instead of documents
+ADMIN_STAGES = {"$currentOp", "$listSessions", "$listLocalSessions", "$collStats", "$indexStats",
+                "$planCacheStats", "$listSearchIndexes", "$shardedDataDistribution"}
+# Stages that read another collection, named by "from" (or, for $unionWith, "coll" or a plain string)
+_FOREIGN_STAGES = {"$lookup", "$graphLookup", "$unionWith"}
+
+
+class MongoExecutionError(Exception):
+    """A generated query could not be run on the server"""
+
+
+class UnsafeQueryError(MongoExecutionError):
+    pass
+
+
+def _check_collection(name):
+    if isinstance(name, str) and name.startswith("system."):
+        raise UnsafeQueryError("System collections cannot be queried")
+
+
+def _check_foreign(spec):
+    """The collection a $lookup, $graphLookup or $unionWith reads must be named by a plain string"""
+    name = spec.get("from", spec.get("coll")) if isinstance(spec, dict) else spec
+    # Without one the stage reads only its own pipeline ($documents)
+    if name is None:
+        return
+    if not isinstance(name, str):
+        # {db: ..., coll: ...} would reach other databases and their system collections
+        raise UnsafeQueryError("Foreign collections must be named by a string")
+    _check_collection(name)
+
+
+def _check_value(value):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key in FORBIDDEN_OPERATORS:
+                raise UnsafeQueryError(f"Operator {key} is not allowed")
+            if key in ADMIN_STAGES:
+                raise UnsafeQueryError(f"Stage {key} is not allowed")
+            if key in _FOREIGN_STAGES:
+                _check_foreign(item)
+            _check_value(item)
+    elif isinstance(value, list):
+        for item in value:
+            _check_value(item)
+    elif isinstance(value, ShellCall) and value.name != "ObjectId":
+        raise UnsafeQueryError(f"{value.name}() is not allowed")
+
+
+def validate_read_query(query):
+    """Raise UnsafeQueryError unless the parsed query is a read-only find/aggregate-style call"""
+    if query.operation not in ALLOWED_OPERATIONS:
+        raise UnsafeQueryError(f"Only read queries can be run; '{query.operation}' is not allowed")
+    _check_collection(query.collection)
+    for name, args in query.modifiers:
+        if name not in ALLOWED_MODIFIERS:
+            raise UnsafeQueryError(f"Cursor method '{name}' is not allowed")
+        _check_value(args)
+    _check_value(query.arguments)
+
+
+def to_bson(value):
+    """Replace parsed shell values (regex literals, ObjectId(...)) with their BSON types"""
+    if isinstance(value, dict):
+        return {key: to_bson(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_bson(item) for item in value]
+    if isinstance(value, Regex):
+        from bson.regex import Regex as BsonRegex
+        return BsonRegex(value.pattern, value.flags)
+    if isinstance(value, ShellCall):
+        from bson import ObjectId
+        return ObjectId(*value.args)
+    return value
+
+
+class MongoExecutor:
+    """
+    Runs validated read-only queries through one pooled async Mongo client.
+
+    The client is created at startup from MONGO_URI; tests and local setups
+    can pass any object with the same collection API, such as
+    tests/mongo_fake.InMemoryMongoClient, to use_client instead.
+    """
+
+    def __init__(self, uri=MONGO_URI, database=MONGO_DATABASE, max_documents=MONGO_MAX_DOCUMENTS,
+                 timeout_ms=MONGO_QUERY_TIMEOUT_MS):
+        self.uri = uri
+        self.database_name = database
+        self.max_documents = max_documents
+        self.timeout_ms = timeout_ms
+        self._client = None
+        self._owns_client = False
+        self.queries = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self):
+        return self._client is not None
+
+    async def start(self):
+        if self._client is not None or not self.uri:
+            return
+        from pymongo import AsyncMongoClient
+        self._client = AsyncMongoClient(
+            self.uri,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            serverSelectionTimeoutMS=self.timeout_ms,
+            appname="lorem-ask-mongo",
+        )
+        self._owns_client = True
+
+    def use_client(self, client, database=None):
+        self._client = client
+        self._owns_client = False
+        if database is not None:
+            self.database_name = database
+
+    async def close(self):
+        if self._client is not None and self._owns_client:
+            await self._client.close()
+        self._client = None
+
+    def _database(self):
+        if self.database_name:
+            return self._client[self.database_name]
+        return self._client.get_default_database()
+
+    async def stream(self, query):
+        """
+        Validate the parsed query and yield its result documents as the cursor returns them.
+
+        At most max_documents + 1 documents are read, so callers can tell
+        that a result was cut off.
+        """
+        if not self.enabled:
+            raise MongoExecutionError("Server-side execution is not configured (MONGO_URI)")
+        try:
+            validate_read_query(query)
+        except UnsafeQueryError:
+            self.rejected += 1
+            raise
+        self.queries += 1
+        collection = self._database()[query.collection]
+        query_filter = to_bson(query.filter)
+        cap = self.max_documents + 1
+
+        if query.operation == "find":
+            cursor = collection.find(query_filter, to_bson(query.projection), max_time_ms=self.timeout_ms)
+            if query.sort:
+                cursor = cursor.sort(list(query.sort.items()))
+            if query.skip:
+                cursor = cursor.skip(int(query.skip))
+            cursor = cursor.limit(min(int(query.limit), cap) if query.limit else cap)
+            async for document in cursor:
+                yield document
+        elif query.operation == "aggregate":
+            pipeline = to_bson(query.pipeline) + [{"$limit": cap}]
+            cursor = await collection.aggregate(pipeline, maxTimeMS=self.timeout_ms)
+            async for document in cursor:
+                yield document
+        elif query.operation == "findOne":
+            document = await collection.find_one(query_filter, to_bson(query.projection), max_time_ms=self.timeout_ms)
+            if document is not None:
+                yield document
+        elif query.operation in ("countDocuments", "count"):
+            yield {"count": await collection.count_documents(query_filter, maxTimeMS=self.timeout_ms)}
+        elif query.operation == "estimatedDocumentCount":
+            yield {"count": await collection.estimated_document_count(maxTimeMS=self.timeout_ms)}
+        elif query.operation == "distinct":
+            field = query.arguments[0] if query.arguments else None
+            if not isinstance(field, str):
+                raise MongoExecutionError("distinct needs a field name")
+            values = await collection.distinct(field, query_filter, maxTimeMS=self.timeout_ms)
+            for value in values[:cap]:
+                yield {field: value}
+
+    async def run(self, query, consume):
+        """
+        Stream the query's documents into consume(documents) and return what it returns,
+        plus execution details (documents read, whether the result was cut off, time).
+        """
+        start = time.perf_counter()
+        state = {"documents": 0, "truncated": False}
+
+        async def capped():
+            async for document in self.stream(query):
+                if state["documents"] >= self.max_documents:
+                    state["truncated"] = True
+                    break
+                state["documents"] += 1
+                yield document
+
+        documents = capped()
+        try:
+            result = await consume(documents)
+        finally:
+            # consume may stop early; close the cursor instead of leaving it to the GC
+            await documents.aclose()
+        state["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return result, state
+
+    def stats(self):
+        return {"enabled": self.enabled, "queries": self.queries, "rejected": self.rejected}
+
+
+mongo_executor = MongoExecutor()
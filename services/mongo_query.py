@@ -0,0 +1,330 @@
+import datetime
+import json
+import re
+from dataclasses import dataclass, field
+
+# Methods that only read; everything else (insertOne, updateMany, drop, ...) writes
+READ_OPERATIONS = {"find", "findOne", "aggregate", "countDocuments", "count", "distinct", "estimatedDocumentCount"}
+# Chained cursor methods that do not change which documents are read
+_IGNORED_MODIFIERS = {"toArray", "pretty", "explain", "itcount", "hint", "comment", "maxTimeMS", "allowDiskUse"}
+
+_IDENTIFIER = re.compile(r"[A-Za-z_$][\w$]*")
+_NUMBER = re.compile(r"-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+
+
+class MongoQueryParseError(ValueError):
+    """The text is not a single MongoDB shell query this parser understands"""
+
+
+@dataclass
+class Regex:
+    """A /pattern/flags literal or {$regex: ...} value"""
+    pattern: str
+    flags: str = ""
+
+
+@dataclass
+class ShellCall:
+    """A shell helper call kept as-is, e.g. ObjectId("...")"""
+    name: str
+    args: list = field(default_factory=list)
+
+
+@dataclass
+class MongoQuery:
+    collection: str
+    operation: str
+    arguments: list = field(default_factory=list)
+    # Chained cursor methods in order, e.g. [("sort", [{"a": -1}]), ("limit", [10])]
+    modifiers: list = field(default_factory=list)
+
+    @property
+    def is_read_only(self):
+        return self.operation in READ_OPERATIONS
+
+    @property
+    def filter(self):
+        if self.operation == "aggregate":
+            return {}
+        position = 1 if self.operation == "distinct" else 0
+        value = self.arguments[position] if len(self.arguments) > position else {}
+        return value if isinstance(value, dict) else {}
+
+    @property
+    def pipeline(self):
+        if self.operation != "aggregate" or not self.arguments:
+            return []
+        pipeline = self.arguments[0]
+        return pipeline if isinstance(pipeline, list) else [pipeline]
+
+    @property
+    def projection(self):
+        projection = self._modifier("project")
+        if projection is None and self.operation in ("find", "findOne") and len(self.arguments) > 1:
+            projection = self.arguments[1]
+        return projection if isinstance(projection, dict) else None
+
+    @property
+    def sort(self):
+        sort = self._modifier("sort")
+        options = self.arguments[2] if self.operation == "find" and len(self.arguments) > 2 else {}
+        if sort is None and isinstance(options, dict):
+            sort = options.get("sort")
+        return sort if isinstance(sort, dict) else {}
+
+    @property
+    def limit(self):
+        return self._modifier("limit")
+
+    @property
+    def skip(self):
+        return self._modifier("skip")
+
+    def _modifier(self, name):
+        for modifier, args in self.modifiers:
+            if modifier == name and args:
+                return args[0]
+        return None
+
+
+class _Parser:
+    """Recursive-descent parser for the JavaScript subset used in shell queries"""
+
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+
+    def error(self, message):
+        raise MongoQueryParseError(f"{message} at position {self.pos}")
+
+    def skip(self):
+        while self.pos < len(self.text):
+            if self.text[self.pos].isspace():
+                self.pos += 1
+            elif self.text.startswith("//", self.pos):
+                end = self.text.find("\n", self.pos)
+                self.pos = len(self.text) if end < 0 else end
+            elif self.text.startswith("/*", self.pos):
+                end = self.text.find("*/", self.pos + 2)
+                if end < 0:
+                    self.error("Unterminated comment")
+                self.pos = end + 2
+            else:
+                break
+
+    def peek(self):
+        self.skip()
+        return self.text[self.pos] if self.pos < len(self.text) else ""
+
+    def accept(self, char):
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, char):
+        if not self.accept(char):
+            self.error(f"Expected '{char}'")
+
+    def at_end(self):
+        return self.peek() == ""
+
+    def identifier(self):
+        self.skip()
+        match = _IDENTIFIER.match(self.text, self.pos)
+        if not match:
+            self.error("Expected a name")
+        self.pos = match.end()
+        return match.group()
+
+    def string(self):
+        quote = self.text[self.pos]
+        self.pos += 1
+        chars = []
+        while self.pos < len(self.text):
+            char = self.text[self.pos]
+            if char == "\\" and self.pos + 1 < len(self.text):
+                escaped = self.text[self.pos + 1]
+                chars.append({"n": "\n", "t": "\t", "r": "\r"}.get(escaped, escaped))
+                self.pos += 2
+                continue
+            self.pos += 1
+            if char == quote:
+                return "".join(chars)
+            chars.append(char)
+        self.error("Unterminated string")
+
+    def regex(self):
+        start = self.pos = self.pos + 1
+        in_class = False
+        while self.pos < len(self.text):
+            char = self.text[self.pos]
+            if char == "\\":
+                self.pos += 2
+                continue
+            if char == "[":
+                in_class = True
+            elif char == "]":
+                in_class = False
+            elif char == "/" and not in_class:
+                pattern = self.text[start:self.pos]
+                self.pos += 1
+                flags = re.match(r"[a-z]*", self.text[self.pos:]).group()
+                self.pos += len(flags)
+                return Regex(pattern, flags)
+            self.pos += 1
+        self.error("Unterminated regular expression")
+
+    def value(self):
+        char = self.peek()
+        if not char:
+            self.error("Unexpected end of query")
+        if char == "{":
+            return self.object()
+        if char == "[":
+            return self.array()
+        if char in "\"'":
+            return self.string()
+        if char == "/":
+            return self.regex()
+        number = _NUMBER.match(self.text, self.pos)
+        if number:
+            self.pos = number.end()
+            text = number.group()
+            return float(text) if any(c in text for c in ".eE") else int(text)
+        name = self.identifier()
+        if name == "new":
+            name = self.identifier()
+        if self.accept("("):
+            return _shell_call(name, self.arguments())
+        constants = {"true": True, "false": False, "null": None, "undefined": None,
+                     "NaN": float("nan"), "Infinity": float("inf")}
+        if name in constants:
+            return constants[name]
+        self.error(f"Unsupported expression '{name}'")
+
+    def object(self):
+        self.expect("{")
+        result = {}
+        while not self.accept("}"):
+            char = self.peek()
+            if char and char in "\"'":
+                key = self.string()
+            elif _NUMBER.match(self.text, self.pos):
+                key = _NUMBER.match(self.text, self.pos).group()
+                self.pos += len(key)
+            else:
+                key = self.identifier()
+            self.expect(":")
+            result[key] = self.value()
+            if not self.accept(","):
+                self.expect("}")
+                break
+        return result
+
+    def array(self):
+        self.expect("[")
+        result = []
+        while not self.accept("]"):
+            result.append(self.value())
+            if not self.accept(","):
+                self.expect("]")
+                break
+        return result
+
+    def arguments(self):
+        # The opening parenthesis has been consumed
+        result = []
+        while not self.accept(")"):
+            result.append(self.value())
+            if not self.accept(","):
+                self.expect(")")
+                break
+        return result
+
+
+def _shell_call(name, args):
+    if name in ("ISODate", "Date"):
+        if not args:
+            return datetime.datetime.now(datetime.timezone.utc)
+        if isinstance(args[0], (int, float)):
+            return datetime.datetime.fromtimestamp(args[0] / 1000, tz=datetime.timezone.utc)
+        try:
+            return datetime.datetime.fromisoformat(str(args[0]).replace("Z", "+00:00"))
+        except ValueError:
+            raise MongoQueryParseError(f"Invalid date {args[0]!r}")
+    if name in ("NumberInt", "NumberLong") and args:
+        return int(args[0])
+    if name in ("NumberDecimal", "Number") and args:
+        return float(args[0])
+    if name == "RegExp" and args:
+        return Regex(str(args[0]), str(args[1]) if len(args) > 1 else "")
+    return ShellCall(name, args)
+
+
+def parse_shell_value(text):
+    """Parse a single shell value (object, array, string, ...) such as a schema document"""
+    parser = _Parser(text)
+    value = parser.value()
+    if not parser.at_end():
+        parser.error("Unexpected text after the value")
+    return value
+
+
+def load_schema(db_schema):
+    """Parse a schema given as JSON or shell-style text; None if it is free text"""
+    if isinstance(db_schema, (dict, list)):
+        return db_schema
+    if not db_schema:
+        return None
+    try:
+        return json.loads(db_schema)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return parse_shell_value(db_schema)
+    except MongoQueryParseError:
+        return None
+
+
+def parse_mongo_query(text):
+    """
+    Parse one shell query such as db.orders.find({...}).sort({...}).limit(10)
+    or db.getCollection("orders").aggregate([...]) into a MongoQuery.
+    """
+    parser = _Parser(text.strip().rstrip(";"))
+    if parser.identifier() != "db":
+        parser.error("Query must start with 'db'")
+
+    names = []
+    if parser.accept("["):
+        if parser.peek() not in ("\"", "'"):
+            parser.error("Expected a collection name")
+        names.append(parser.string())
+        parser.expect("]")
+    while parser.accept("."):
+        name = parser.identifier()
+        if parser.accept("("):
+            if name == "getCollection" and not names:
+                args = parser.arguments()
+                if not args or not isinstance(args[0], str):
+                    parser.error("getCollection needs a collection name")
+                names.append(args[0])
+                continue
+            if not names:
+                parser.error("Missing collection name")
+            query = MongoQuery(collection=".".join(names), operation=name, arguments=parser.arguments())
+            break
+        names.append(name)
+    else:
+        parser.error("Expected a collection method call")
+
+    while parser.accept("."):
+        name = parser.identifier()
+        parser.expect("(")
+        args = parser.arguments()
+        if name not in _IGNORED_MODIFIERS:
+            query.modifiers.append((name, args))
+    if not parser.at_end():
+        parser.error("Unexpected text after the query")
+    return query
@@ -0,0 +1,174 @@
+import asyncio
+import os
+import re
+from collections import OrderedDict
+from services.singleflight import normalize_question
+
+# Plans kept per schema fingerprint, least recently used evicted first
+PLAN_CACHE_MAX_PER_SCHEMA = int(os.getenv("PLAN_CACHE_MAX_PER_SCHEMA", 500))
+# Schema fingerprints kept, each with its plans and TF-IDF index; least recently used evicted first
+PLAN_CACHE_MAX_SCHEMAS = int(os.getenv("PLAN_CACHE_MAX_SCHEMAS", 200))
+# Cosine similarity needed to reuse the plan of a differently worded question;
+# 0 turns similarity matching off and only exact (normalized) matches are reused
+PLAN_CACHE_SIMILARITY = float(os.getenv("PLAN_CACHE_SIMILARITY", 0.9))
+
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+# Words that flip the meaning of otherwise near-identical questions
+_DIRECTION_WORDS = {
+    "top", "bottom", "highest", "lowest", "most", "least", "max", "maximum", "min", "minimum",
+    "best", "worst", "first", "last", "largest", "smallest", "ascending", "descending",
+    "increase", "decrease", "above", "below", "not", "without", "average", "mean", "median",
+    "sum", "total", "count", "number",
+}
+
+
+def _fit_index(questions):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    vectorizer = TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True)
+    return questions, vectorizer, vectorizer.fit_transform(questions)
+
+
+class _SchemaPlans:
+    """Plans for one schema plus a TF-IDF index over their questions, refitted on the first lookup after a change"""
+
+    def __init__(self):
+        self.plans = OrderedDict()
+        self._index = None
+        self._generation = 0
+
+    def invalidate_index(self):
+        self._index = None
+        self._generation += 1
+
+    async def index(self):
+        if self._index is None and self.plans:
+            generation = self._generation
+            # Fitting takes tens of milliseconds for hundreds of plans; keep it off the event loop
+            index = await asyncio.to_thread(_fit_index, list(self.plans))
+            if generation != self._generation:
+                # Plans changed during the fit; use it for this lookup only
+                return index
+            self._index = index
+        return self._index
+
+
+class PlanCache:
+    """
+    Generated pandas code shared across sessions whose frames have the same schema.
+
+    Plans are keyed by schema fingerprint (exact column names and dtypes, so
+    frames that differ only in a column name never share code) and by the
+    normalized English question. Only code that executed successfully is
+    stored. Differently worded questions can reuse a plan when their TF-IDF
+    cosine similarity passes PLAN_CACHE_SIMILARITY and they mention the same
+    numbers, ordering words and columns of the frame. At most max_schemas
+    fingerprints are kept, the least recently used dropped first.
+    """
+
+    def __init__(self, max_per_schema=PLAN_CACHE_MAX_PER_SCHEMA, similarity=PLAN_CACHE_SIMILARITY,
+                 max_schemas=PLAN_CACHE_MAX_SCHEMAS):
+        self.max_per_schema = max_per_schema
+        self.max_schemas = max_schemas
+        self.similarity = similarity
+        self._schemas = OrderedDict()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.discarded = 0
+        self.evicted_schemas = 0
+
+    async def lookup(self, schema_key, question, columns=()):
+        """Return (cached question, code) for a reusable plan, or None"""
+        plans = self._schemas.get(schema_key)
+        normalized = normalize_question(question)
+        if plans is None:
+            self.misses += 1
+            return None
+        self._schemas.move_to_end(schema_key)
+
+        if normalized in plans.plans:
+            plans.plans.move_to_end(normalized)
+            self.exact_hits += 1
+            return normalized, plans.plans[normalized]
+
+        match = await self._similar(plans, normalized, columns) if self.similarity > 0 else None
+        if match is None:
+            self.misses += 1
+            return None
+        self.similar_hits += 1
+        plans.plans.move_to_end(match)
+        return match, plans.plans[match]
+
+    def store(self, schema_key, question, code):
+        plans = self._schemas.setdefault(schema_key, _SchemaPlans())
+        self._schemas.move_to_end(schema_key)
+        while len(self._schemas) > self.max_schemas:
+            self._schemas.popitem(last=False)
+            self.evicted_schemas += 1
+        normalized = normalize_question(question)
+        plans.plans[normalized] = code
+        plans.plans.move_to_end(normalized)
+        while len(plans.plans) > self.max_per_schema:
+            plans.plans.popitem(last=False)
+        plans.invalidate_index()
+
+    def discard(self, schema_key, question):
+        plans = self._schemas.get(schema_key)
+        if plans is not None and plans.plans.pop(normalize_question(question), None) is not None:
+            plans.invalidate_index()
+            self.discarded += 1
+
+    async def _similar(self, plans, normalized, columns):
+        try:
+            index = await plans.index()
+        except ImportError:
+            return None
+        if index is None:
+            return None
+        questions, vectorizer, matrix = index
+        query = vectorizer.transform([normalized])
+        if query.nnz == 0:
+            return None
+        # Rows are L2-normalized, so the dot product is the cosine similarity
+        scores = (matrix @ query.T).toarray().ravel()
+        for position in scores.argsort()[::-1]:
+            if scores[position] < self.similarity:
+                break
+            candidate = questions[position]
+            # A plan fitted into the index may have been evicted or discarded since
+            if candidate in plans.plans and _same_parameters(candidate, normalized, columns):
+                return candidate
+        return None
+
+    def stats(self):
+        return {
+            "schemas": len(self._schemas),
+            "max_schemas": self.max_schemas,
+            "evicted_schemas": self.evicted_schemas,
+            "plans": sum(len(plans.plans) for plans in self._schemas.values()),
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "discarded": self.discarded,
+        }
+
+
+def _same_parameters(a, b, columns):
+    """Similar wording is not enough: numbers, direction words and referenced columns must match too"""
+    if _NUMBER.findall(a) != _NUMBER.findall(b):
+        return False
+    if _DIRECTION_WORDS.intersection(a.split()) != _DIRECTION_WORDS.intersection(b.split()):
+        return False
+    return _mentioned_columns(a, columns) == _mentioned_columns(b, columns)
+
+
+def _mentioned_columns(question, columns):
+    mentioned = set()
+    for column in columns:
+        name = str(column).lower()
+        if name in question or name.replace("_", " ") in question:
+            mentioned.add(name)
+    return mentioned
+
+
+plan_cache = PlanCache()
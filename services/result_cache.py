@@ -0,0 +1,131 @@
+import ast
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+import pandas as pd
+from utility.serialization import dumps
+
+# Upper bound on the serialized size of all cached results, across sessions
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+
+def code_fingerprint(code):
+    """Hash the code's AST so formatting and comment differences share a key"""
+    try:
+        normalized = ast.dump(ast.parse(code))
+    except SyntaxError:
+        normalized = code.strip()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def frame_content_hash(df):
+    """Hash the frame's labels, dtypes and values"""
+    digest = hashlib.sha1()
+    digest.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Serialized /ask results keyed by (session, dataset content hash, code AST),
+    plus an optional variant for requests that shape the same result
+    differently (e.g. a chart point budget).
+
+    Entries are evicted least-recently-used first once their total serialized
+    size passes max_bytes. Because the key includes the content hash, a result
+    computed against older data can never be returned; uploads also drop the
+    session's entries right away to free the space.
+    """
+
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._content_hashes = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def dataset_hash(self, session_id, version, df):
+        """Content hash of the session's frame, computed once per dataset version"""
+        key = (session_id, version)
+        if key not in self._content_hashes:
+            try:
+                content_hash = await asyncio.to_thread(frame_content_hash, df)
+            except TypeError:
+                # Unhashable cell values (lists, dicts); fall back to the version
+                content_hash = f"version-{version}"
+            self._content_hashes = {k: v for k, v in self._content_hashes.items() if k[0] != session_id}
+            self._content_hashes[key] = content_hash
+        return self._content_hashes[key]
+
+    async def advance_dataset_hash(self, session_id, version, previous_version, rows):
+        """
+        Drop the session's results and derive the content hash of a version made
+        by appending rows to previous_version from its hash, without rehashing
+        the old rows (it is computed in full on first use if unknown)
+        """
+        previous = self._content_hashes.get((session_id, previous_version))
+        self.invalidate_session(session_id)
+        if previous is None:
+            return
+        try:
+            rows_hash = await asyncio.to_thread(frame_content_hash, rows)
+        except TypeError:
+            return
+        self._content_hashes[(session_id, version)] = hashlib.sha1(f"{previous}+{rows_hash}".encode("utf-8")).hexdigest()
+
+    def get(self, session_id, data_hash, code, variant=None):
+        key = (session_id, data_hash, code_fingerprint(code), variant)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, session_id, data_hash, code, value, variant=None):
+        key = (session_id, data_hash, code_fingerprint(code), variant)
+        size = len(dumps(value))
+        if size > self.max_bytes:
+            return
+        self._discard(key)
+        self._entries[key] = (value, size)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+            self.evictions += 1
+
+    def invalidate_session(self, session_id):
+        for key in [k for k in self._entries if k[0] == session_id]:
+            self._discard(key)
+        self._content_hashes = {k: v for k, v in self._content_hashes.items() if k[0] != session_id}
+
+    def session_bytes(self):
+        """Serialized size of the cached results of each session"""
+        sizes = {}
+        for key, (_, size) in self._entries.items():
+            sizes[key[0]] = sizes.get(key[0], 0) + size
+        return sizes
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+result_cache = ResultCache()
@@ -0,0 +1,196 @@
+import io
+import os
+import shutil
+import tempfile
+import uuid
+from collections import OrderedDict
+
+# Full /ask results are kept as Arrow files on disk, not in server memory
+RESULT_STORE_DIR = os.getenv("RESULT_STORE_DIR", os.path.join(tempfile.gettempdir(), f"lorem-results-{os.getpid()}"))
+RESULT_STORE_MAX_BYTES = int(os.getenv("RESULT_STORE_MAX_BYTES", 1024 * 1024 * 1024))
+RESULT_PAGE_SIZE = 50
+RESULT_MAX_PAGE_SIZE = 1000
+EXPORT_FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "csv": ("text/csv", "csv"),
+}
+
+
+def write_result(result, path):
+    """
+    Write a DataFrame or Series result to an Arrow file.
+
+    Runs wherever the result lives (usually an execution worker) so the full
+    result never has to cross the worker pipe. Returns metadata, or None if
+    the result is not tabular or Arrow cannot represent it.
+    """
+    import pandas as pd
+    if isinstance(result, pd.Series):
+        frame, kind = result.to_frame(name=str(result.name) if result.name is not None else "value"), "series"
+    elif isinstance(result, pd.DataFrame):
+        frame, kind = result, "dataframe"
+    else:
+        return None
+    try:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        if not all(isinstance(col, str) for col in frame.columns):
+            frame = frame.rename(columns=str)
+        table = pa.Table.from_pandas(frame, preserve_index=kind == "series" or None)
+        feather.write_feather(table, path, compression="uncompressed")
+    except Exception:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+    return {"rows": len(frame), "columns": [str(col) for col in frame.columns], "kind": kind,
+            "bytes": os.path.getsize(path)}
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after each batch"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ResultStore:
+    """
+    Full results behind the truncated /ask response, addressed by handle id.
+
+    Handles are evicted least-recently-used first once the files exceed
+    max_bytes, and a session's handles are dropped when its data changes,
+    the same policy as the result cache.
+    """
+
+    def __init__(self, directory=RESULT_STORE_DIR, max_bytes=RESULT_STORE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._handles = OrderedDict()
+        self.total_bytes = 0
+        self.evictions = 0
+
+    def new_path(self):
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"{uuid.uuid4().hex}.arrow")
+
+    def register(self, session_id, path, stored):
+        """Track a written result file and return its public handle"""
+        handle_id = os.path.splitext(os.path.basename(path))[0]
+        self._handles[handle_id] = {"session_id": session_id, "path": path, **stored}
+        self.total_bytes += stored["bytes"]
+        while self.total_bytes > self.max_bytes and len(self._handles) > 1:
+            evicted_id = next(iter(self._handles))
+            self._remove(evicted_id)
+            self.evictions += 1
+        return self.describe(handle_id)
+
+    def describe(self, handle_id, cursor=0, page_size=RESULT_PAGE_SIZE, entry=None):
+        """Public handle; pass the entry when it was resolved earlier, as it may have been evicted since"""
+        entry = entry or self._handles[handle_id]
+        next_offset = cursor + page_size
+        return {
+            "id": handle_id,
+            "result_type": entry["kind"],
+            "total_rows": entry["rows"],
+            "columns": entry["columns"],
+            "page_size": page_size,
+            "next_cursor": str(next_offset) if next_offset < entry["rows"] else None,
+        }
+
+    def has(self, handle_id):
+        return handle_id in self._handles
+
+    def get(self, session_id, handle_id):
+        entry = self._handles.get(handle_id)
+        if entry is None or entry["session_id"] != session_id:
+            return None
+        self._handles.move_to_end(handle_id)
+        return entry
+
+    def read_page(self, entry, offset, limit):
+        """Materialize only the requested slice of the stored result"""
+        return self._open(entry).slice(offset, limit).to_pandas()
+
+    def stream(self, entry, export_format, batch_rows=65536):
+        """Yield the stored result encoded as Arrow IPC, Parquet or CSV, one batch at a time"""
+        import pyarrow as pa
+        table = self._open(entry)
+        if entry["kind"] == "dataframe":
+            # Drop pandas index metadata so exports contain only the result columns
+            table = table.replace_schema_metadata(None)
+        sink = _ChunkSink()
+        if export_format == "arrow":
+            writer = pa.ipc.new_stream(sink, table.schema)
+        elif export_format == "parquet":
+            import pyarrow.parquet as pq
+            writer = pq.ParquetWriter(sink, table.schema)
+        else:
+            import pyarrow.csv as pacsv
+            writer = pacsv.CSVWriter(sink, table.schema)
+        try:
+            for batch in table.to_batches(max_chunksize=batch_rows):
+                writer.write_batch(batch)
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+        finally:
+            writer.close()
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+
+    def invalidate_session(self, session_id):
+        for handle_id in [h for h, entry in self._handles.items() if entry["session_id"] == session_id]:
+            self._remove(handle_id)
+
+    def session_bytes(self):
+        """Bytes on disk of the stored results of each session"""
+        sizes = {}
+        for entry in self._handles.values():
+            sizes[entry["session_id"]] = sizes.get(entry["session_id"], 0) + entry["bytes"]
+        return sizes
+
+    def clear(self):
+        self._handles.clear()
+        self.total_bytes = 0
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _open(self, entry):
+        import pyarrow.feather as feather
+        return feather.read_table(entry["path"], memory_map=True)
+
+    def _remove(self, handle_id):
+        entry = self._handles.pop(handle_id, None)
+        if entry is None:
+            return
+        self.total_bytes -= entry["bytes"]
+        try:
+            os.remove(entry["path"])
+        except OSError:
+            pass
+
+    def stats(self):
+        return {
+            "handles": len(self._handles),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+result_store = ResultStore()
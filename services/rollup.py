@@ -0,0 +1,345 @@
+import ast
+import asyncio
+import logging
+import os
+import time
+from itertools import combinations
+import numpy as np
+import pandas as pd
+from pandas.api import types as ptypes
+from services.facts import column_roles
+
+# "0" skips building rollup cubes after upload; /ask then always runs the generated code
+ROLLUP_CUBE = os.getenv("ROLLUP_CUBE", "1") != "0"
+# Frames with fewer rows are scanned quickly enough; no cube is built for them
+ROLLUP_MIN_ROWS = int(os.getenv("ROLLUP_MIN_ROWS", 10_000))
+# Columns grouped by at once, and distinct values a column may have to be grouped by
+ROLLUP_MAX_GROUP_COLUMNS = int(os.getenv("ROLLUP_MAX_GROUP_COLUMNS", 2))
+ROLLUP_MAX_CARDINALITY = int(os.getenv("ROLLUP_MAX_CARDINALITY", 1000))
+ROLLUP_MAX_DIMENSIONS = int(os.getenv("ROLLUP_MAX_DIMENSIONS", 8))
+# Groups stored per cube over all column combinations; the smallest combinations are kept first
+ROLLUP_MAX_CELLS = int(os.getenv("ROLLUP_MAX_CELLS", 200_000))
+
+# Stored per measure and group. Means are stored, not derived from sum and
+# count, so every answer is exactly what pandas computes from the rows
+AGGREGATES = ("sum", "count", "min", "max", "mean")
+# Methods applied to the aggregated result, with literal arguments only
+_POST_METHODS = {"reset_index", "sort_values", "sort_index", "head", "tail", "nlargest", "nsmallest",
+                 "round", "rename", "to_frame", "abs"}
+_MODULES = {"pandas", "numpy"}
+
+logger = logging.getLogger(__name__)
+
+
+class _Unsupported(Exception):
+    """Code the cube cannot answer exactly as pandas would"""
+
+
+def _dimensions(df):
+    """Columns to group by: plain (not float or categorical) columns with few distinct values, fewest first"""
+    candidates = []
+    for name in df.columns:
+        dtype = df[name].dtype
+        if not isinstance(dtype, np.dtype) or ptypes.is_float_dtype(dtype):
+            continue
+        distinct = df[name].nunique()
+        if 2 <= distinct <= ROLLUP_MAX_CARDINALITY:
+            candidates.append((distinct, name))
+    candidates.sort(key=lambda item: item[0])
+    return [(name, distinct) for distinct, name in candidates[:ROLLUP_MAX_DIMENSIONS]]
+
+
+class Cuboid:
+    """Aggregates of every measure per group of one column combination, as pandas groupby computes them"""
+
+    def __init__(self, df, keys, measures):
+        self.keys = keys
+        grouped = df.groupby(list(keys))
+        self.measures = [m for m in measures if m not in keys]
+        self.table = grouped[self.measures].agg(list(AGGREGATES)) if self.measures else None
+        self.size = grouped.size()
+
+    @property
+    def cells(self):
+        return len(self.size)
+
+    def nbytes(self):
+        table = int(self.table.memory_usage(deep=True).sum()) if self.table is not None else 0
+        return table + int(self.size.memory_usage(deep=True))
+
+    def aggregate(self, by, column, func):
+        """One aggregate as a Series indexed like df.groupby(by), named column"""
+        if func == "size":
+            values = self.size.copy()
+        elif column in self.measures and func in AGGREGATES:
+            values = self.table[(column, func)].copy()
+        else:
+            raise _Unsupported(f"{func} of {column} is not in the cube")
+        values.name = column
+        if list(by) != list(self.keys):
+            values = values.reorder_levels(list(by)).sort_index()
+        return values
+
+
+class RollupCube:
+    """A session frame's cuboids for one dataset version, keyed by their set of group-by columns"""
+
+    def __init__(self, df, version):
+        self.version = version
+        self.rows = len(df)
+        measures, _, _ = column_roles(df)
+        dimensions = _dimensions(df)
+        combos = []
+        for size in range(1, ROLLUP_MAX_GROUP_COLUMNS + 1):
+            for combo in combinations(dimensions, size):
+                # Upper bound on the number of groups
+                estimate = min(int(np.prod([distinct for _, distinct in combo], dtype=np.float64)), len(df))
+                combos.append((estimate, tuple(name for name, _ in combo)))
+        combos.sort(key=lambda item: item[0])
+        self.cuboids = {}
+        cells = 0
+        for estimate, keys in combos:
+            if cells + estimate > ROLLUP_MAX_CELLS:
+                continue
+            cuboid = Cuboid(df, keys, measures)
+            self.cuboids[frozenset(keys)] = cuboid
+            cells += cuboid.cells
+        self.cells = cells
+
+    def nbytes(self):
+        return sum(cuboid.nbytes() for cuboid in self.cuboids.values())
+
+    def cuboid(self, by):
+        cuboid = self.cuboids.get(frozenset(by))
+        if cuboid is None or len(set(by)) != len(by):
+            raise _Unsupported(f"no cuboid for {by}")
+        return cuboid
+
+
+def _literal(node):
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, SyntaxError, TypeError):
+        raise _Unsupported("non-literal argument")
+
+
+def _chain(node):
+    """(root, steps) of a method chain such as df.groupby(...)['x'].sum().head(5), steps in call order"""
+    steps = []
+    while True:
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            steps.append(("call", node.func.attr, node.args, node.keywords))
+            node = node.func.value
+        elif isinstance(node, ast.Subscript):
+            steps.append(("select", _literal(node.slice)))
+            node = node.value
+        else:
+            return node, steps[::-1]
+
+
+def _query_expression(code):
+    """The expression of single-assignment code (imports of pandas or numpy aside)"""
+    tree = ast.parse(code)
+    body = [s for s in tree.body
+            if not (isinstance(s, (ast.Import, ast.ImportFrom)) and all(
+                (alias.name if isinstance(s, ast.Import) else s.module or "").split(".")[0] in _MODULES for alias in s.names))]
+    if len(body) != 1 or not isinstance(body[0], ast.Assign) or len(body[0].targets) != 1 \
+            or not isinstance(body[0].targets[0], ast.Name) or body[0].targets[0].id == "df":
+        raise _Unsupported("not a single assignment")
+    return body[0].value
+
+
+def _group_by(args, keywords):
+    if len(args) != 1:
+        raise _Unsupported("groupby without one by argument")
+    by = _literal(args[0])
+    by = [by] if isinstance(by, str) else by
+    if not isinstance(by, list) or not by or not all(isinstance(key, str) for key in by):
+        raise _Unsupported("groupby by is not column names")
+    options = {kw.arg: _literal(kw.value) for kw in keywords}
+    as_index = options.pop("as_index", True)
+    # Defaults only: the cube is sorted and drops missing keys like groupby does by default
+    if options.get("sort", True) is not True or options.get("dropna", True) is not True or set(options) - {"sort", "dropna", "observed"}:
+        raise _Unsupported("groupby options")
+    return by, as_index
+
+
+def _aggregate(cuboid, by, selection, method, args, keywords):
+    """Result of df.groupby(by)[selection].<method>(*args) from the cuboid"""
+    if method in AGGREGATES or method == "size":
+        if args or keywords:
+            raise _Unsupported("aggregate arguments")
+        if method == "size":
+            values = cuboid.aggregate(by, None, "size")
+            values.name = selection if isinstance(selection, str) else None
+            return values
+        if isinstance(selection, str):
+            return cuboid.aggregate(by, selection, method)
+        if isinstance(selection, list):
+            return pd.concat([cuboid.aggregate(by, column, method) for column in selection], axis=1)
+        raise _Unsupported("aggregate over every column")
+    if method != "agg":
+        raise _Unsupported(f"groupby method {method}")
+    if keywords and not args and selection is None:
+        # Named aggregation: agg(total=("sales", "sum"))
+        columns = {}
+        for kw in keywords:
+            spec = _literal(kw.value)
+            if kw.arg is None or not (isinstance(spec, tuple) and len(spec) == 2 and all(isinstance(s, str) for s in spec)):
+                raise _Unsupported("named aggregation")
+            columns[kw.arg] = cuboid.aggregate(by, spec[0], spec[1])
+        return pd.DataFrame(columns)
+    if len(args) != 1 or keywords:
+        raise _Unsupported("agg arguments")
+    spec = _literal(args[0])
+    if isinstance(spec, str) and isinstance(selection, str):
+        return cuboid.aggregate(by, selection, spec)
+    if isinstance(spec, list) and isinstance(selection, str) and all(isinstance(s, str) for s in spec):
+        frame = pd.concat([cuboid.aggregate(by, selection, func) for func in spec], axis=1)
+        frame.columns = spec
+        return frame
+    if isinstance(spec, dict) and selection is None and all(isinstance(v, str) for v in spec.values()):
+        return pd.concat([cuboid.aggregate(by, column, func) for column, func in spec.items()], axis=1)
+    raise _Unsupported("agg specification")
+
+
+def answer_from_cube(cube, code):
+    """
+    What code returns when run on the frame, computed from the cube, or None.
+
+    Answers code that is a single assignment of
+    df.groupby(columns)[selection].<sum|count|min|max|mean|size|agg>(...)
+    followed by literal-argument calls such as reset_index, sort_values,
+    head or round. Nothing from the code is executed: the chain is read
+    from its syntax tree and replayed on the cube's aggregates.
+    """
+    try:
+        root, steps = _chain(_query_expression(code))
+        if not (isinstance(root, ast.Name) and root.id == "df") or not steps or steps[0][:2] != ("call", "groupby"):
+            return None
+        by, as_index = _group_by(*steps[0][2:])
+        cuboid = cube.cuboid(by)
+        position = 1
+        selection = None
+        if position < len(steps) and steps[position][0] == "select":
+            selection = steps[position][1]
+            if not (isinstance(selection, str) or (isinstance(selection, list) and all(isinstance(c, str) for c in selection))):
+                return None
+            position += 1
+        if position >= len(steps) or steps[position][0] != "call":
+            return None
+        _, method, args, keywords = steps[position]
+        result = _aggregate(cuboid, by, selection, method, args, keywords)
+        if not as_index:
+            result = result.reset_index(name="size") if method == "size" else result.reset_index()
+        for step in steps[position + 1:]:
+            if step[0] != "call" or step[1] not in _POST_METHODS:
+                return None
+            _, method, args, keywords = step
+            result = getattr(result, method)(*[_literal(a) for a in args], **{kw.arg: _literal(kw.value) for kw in keywords if kw.arg})
+        return result if isinstance(result, (pd.DataFrame, pd.Series)) else None
+    except (_Unsupported, SyntaxError, KeyError, TypeError, ValueError):
+        return None
+
+
+class RollupCubes:
+    """
+    Rollup cubes of the uploaded session frames, and /ask answers read from them.
+
+    After an upload or append, a cube of sum, count, min, max and mean of
+    every measure per group of each combination of up to
+    ROLLUP_MAX_GROUP_COLUMNS low-cardinality columns is built in the
+    background, within ROLLUP_MAX_CELLS groups. Until it is ready, and for
+    any code it cannot answer exactly, the generated code runs as usual.
+    """
+
+    def __init__(self, enabled=ROLLUP_CUBE):
+        self.enabled = enabled
+        self._cubes = {}
+        self._tasks = set()
+        self.builds = 0
+        self.build_seconds = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.answer_seconds = 0.0
+        self.executions = 0
+        self.exec_seconds = 0.0
+
+    def schedule(self, session_id, version, df):
+        """Build the cube of this version of the session frame in the background"""
+        if not self.enabled or len(df) < ROLLUP_MIN_ROWS:
+            self._cubes.pop(session_id, None)
+            return
+        task = asyncio.get_running_loop().create_task(self._build(session_id, version, df))
+        # The loop only keeps weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _build(self, session_id, version, df):
+        start = time.perf_counter()
+        try:
+            cube = await asyncio.to_thread(RollupCube, df, version)
+        except Exception as e:
+            logger.warning("Building the rollup cube failed: %s", e, extra={"session_id": session_id})
+            return
+        self.builds += 1
+        self.build_seconds += time.perf_counter() - start
+        current = self._cubes.get(session_id)
+        # A build for an older version may finish last
+        if current is None or current.version < version:
+            self._cubes[session_id] = cube
+        logger.info("Rollup cube built", extra={"session_id": session_id, "cuboids": len(cube.cuboids), "cells": cube.cells,
+                                                "ms": round(1000 * (time.perf_counter() - start), 1)})
+
+    async def answer(self, session_id, version, code):
+        """The result of code computed from the session's cube for this version, or None"""
+        cube = self._cubes.get(session_id)
+        if cube is None or cube.version != version:
+            self.misses += 1
+            return None
+        start = time.perf_counter()
+        result = await asyncio.to_thread(answer_from_cube, cube, code)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.answer_seconds += time.perf_counter() - start
+        return result
+
+    def record_execution(self, seconds):
+        """Time of code run on the frame, for comparison with cube answers"""
+        self.executions += 1
+        self.exec_seconds += seconds
+
+    def forget_session(self, session_id):
+        self._cubes.pop(session_id, None)
+
+    def session_bytes(self):
+        return {session_id: cube.nbytes() for session_id, cube in list(self._cubes.items())}
+
+    async def close(self):
+        """Cancel builds still running"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self):
+        answered = self.hits + self.misses
+        mean_answer = self.answer_seconds / self.hits if self.hits else None
+        mean_exec = self.exec_seconds / self.executions if self.executions else None
+        return {
+            "enabled": self.enabled,
+            "cubes": len(self._cubes),
+            "cells": sum(cube.cells for cube in list(self._cubes.values())),
+            "builds": self.builds,
+            "mean_build_ms": round(1000 * self.build_seconds / self.builds, 1) if self.builds else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / answered, 4) if answered else None,
+            "mean_answer_ms": round(1000 * mean_answer, 2) if mean_answer is not None else None,
+            "mean_exec_ms": round(1000 * mean_exec, 2) if mean_exec is not None else None,
+            "speedup": round(mean_exec / mean_answer, 1) if mean_answer and mean_exec else None,
+        }
+
+
+rollup_cubes = RollupCubes()
@@ -0,0 +1,112 @@
+import os
+import re
+import numpy as np
+from pandas.api import types as ptypes
+from utility.serialization import frame_to_records
+
+# Rows and columns of a file put in a chat prompt, however large the file is
+ROW_INDEX_TOP_K = int(os.getenv("ROW_INDEX_TOP_K", 20))
+ROW_INDEX_MAX_COLUMNS = int(os.getenv("ROW_INDEX_MAX_COLUMNS", 12))
+
+_TOKEN_PATTERN = r"(?u)\b\w+\b"
+_TOKEN = re.compile(_TOKEN_PATTERN)
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+
+
+def _is_text(series):
+    return (ptypes.is_object_dtype(series.dtype) or ptypes.is_string_dtype(series.dtype)
+            or ptypes.is_bool_dtype(series.dtype) or str(series.dtype) == "category")
+
+
+def _row_texts(df, positions):
+    """Each row's values in the given columns as one space-separated string, built column by column"""
+    text = None
+    for position in positions:
+        column = df.iloc[:, position]
+        values = column.astype(str).where(column.notna(), "")
+        text = values if text is None else text + " " + values
+    return text.tolist()
+
+
+class RowIndex:
+    """
+    Index over one frame's rows for picking the ones a chat question is about.
+
+    Text columns go into a TF-IDF matrix; numbers in the question are matched
+    exactly against the numeric columns, and such a match outranks any text
+    score. Built once per file at upload (in a worker thread); a question is
+    then answered from the ROW_INDEX_TOP_K best rows, restricted to the
+    columns it names or matched on, so the prompt stays the same size as the
+    file grows.
+    """
+
+    def __init__(self, df):
+        self.rows = len(df)
+        self._text_positions = [p for p in range(df.shape[1]) if _is_text(df.iloc[:, p])]
+        self._numeric_positions = [
+            p for p in range(df.shape[1])
+            if ptypes.is_numeric_dtype(df.iloc[:, p].dtype) and not ptypes.is_bool_dtype(df.iloc[:, p].dtype)
+        ]
+        self._vectorizer = None
+        self._matrix = None
+        if self._text_positions and self.rows:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            vectorizer = TfidfVectorizer(token_pattern=_TOKEN_PATTERN, stop_words="english", sublinear_tf=True, dtype=np.float32)
+            try:
+                self._matrix = vectorizer.fit_transform(_row_texts(df, self._text_positions)).tocsr()
+                self._vectorizer = vectorizer
+            except ValueError:
+                # Only stop words or empty values: nothing to index
+                pass
+
+    def search(self, df, question, k=ROW_INDEX_TOP_K):
+        """Row positions of the best matches, best first; only rows sharing a term or number with the question"""
+        scores = np.zeros(self.rows, dtype=np.float32)
+        if self._vectorizer is not None:
+            query = self._vectorizer.transform([question])
+            if query.nnz:
+                scores += (self._matrix @ query.T).toarray().ravel()
+        numbers = [float(n) for n in _NUMBER.findall(question)]
+        if numbers and self._numeric_positions:
+            values = df.iloc[:, self._numeric_positions].to_numpy(dtype=np.float64, na_value=np.nan)
+            # Every exact number match counts more than the best possible text score (cosine <= 1)
+            scores += np.isin(values, numbers).sum(axis=1) * 1.5
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > k:
+            matched = matched[np.argpartition(scores[matched], -k)[-k:]]
+        return matched[np.argsort(-scores[matched], kind="stable")]
+
+    def retrieve(self, df, question, k=ROW_INDEX_TOP_K, max_columns=ROW_INDEX_MAX_COLUMNS):
+        """Prompt-ready rows and columns of df relevant to question"""
+        positions = self.search(df, question, k)
+        selection = "best matches for the question"
+        if len(positions) == 0:
+            # Nothing in the question occurs in the data: show rows spread over the whole file
+            positions = np.unique(np.linspace(0, max(len(df) - 1, 0), min(k, len(df))).astype(np.int64))
+            selection = "evenly spaced rows (no row matched the question)"
+        rows = df.iloc[positions]
+        columns = self.relevant_columns(rows, question, max_columns)
+        return {
+            "selection": selection,
+            "row_numbers": [int(p) for p in positions],
+            "columns": [str(c) for c in columns],
+            "rows": frame_to_records(rows.loc[:, columns]),
+        }
+
+    def relevant_columns(self, rows, question, max_columns=ROW_INDEX_MAX_COLUMNS):
+        """Columns named in the question or matched by it in rows, then the rest in file order, up to max_columns"""
+        if rows.shape[1] <= max_columns:
+            return list(rows.columns)
+        terms = set(_TOKEN.findall(question.lower()))
+        if self._vectorizer is not None:
+            terms -= self._vectorizer.get_stop_words()
+        named, matched = [], []
+        for position, column in enumerate(rows.columns):
+            if terms & set(_TOKEN.findall(str(column).lower().replace("_", " "))):
+                named.append(column)
+            elif any(terms & set(_TOKEN.findall(value.lower())) for value in rows.iloc[:, position].astype(str)):
+                matched.append(column)
+        chosen = (named + matched)[:max_columns]
+        rest = [column for column in rows.columns if column not in chosen]
+        chosen += rest[:max_columns - len(chosen)]
+        return [column for column in rows.columns if column in chosen]
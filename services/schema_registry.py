@@ -0,0 +1,317 @@
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+from collections import OrderedDict
+from services.mongo_query import load_schema
+
+# Older versions kept per schema id; the newest is always kept
+SCHEMA_VERSIONS_KEPT = int(os.getenv("SCHEMA_VERSIONS_KEPT", 5))
+# Schema ids kept; the least recently used are dropped beyond this
+SCHEMA_MAX_IDS = int(os.getenv("SCHEMA_MAX_IDS", 1000))
+# Schema ids whose newest version is also kept decoded, most recently read first
+SCHEMA_DECODED_KEPT = int(os.getenv("SCHEMA_DECODED_KEPT", 100))
+# Upper bounds on what a pruned schema sends to the model
+SCHEMA_MAX_COLLECTIONS = int(os.getenv("SCHEMA_MAX_COLLECTIONS", 6))
+SCHEMA_MAX_FIELDS = int(os.getenv("SCHEMA_MAX_FIELDS", 30))
+# Combined keyword + TF-IDF score a collection needs to be included
+SCHEMA_MIN_RELEVANCE = float(os.getenv("SCHEMA_MIN_RELEVANCE", 0.15))
+
+_META_KEYS = {"name", "collection", "indexes", "description", "fields", "properties", "relationships",
+              "bsonType", "required", "validator", "count", "options"}
+_WORD = re.compile(r"[a-z0-9]+")
+_CAMEL = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+_STOPWORDS = {"the", "a", "an", "of", "in", "on", "for", "to", "by", "and", "or", "with", "what", "which",
+              "how", "many", "much", "is", "are", "was", "were", "show", "me", "list", "give", "find", "all",
+              "each", "per", "from", "that", "this", "these", "those", "their", "last", "top", "get"}
+
+
+def normalize_schema(db_schema):
+    """
+    Schema as {collection: {"fields": {name: type}, ...other keys}}, or None.
+
+    Accepts {"collections": ...}, {name: {...}} and [{"name": ...}] layouts with
+    fields given as a "fields" map or list, JSON-schema "properties", or as
+    the collection entry's own keys.
+    """
+    schema = load_schema(db_schema)
+    if isinstance(schema, dict) and isinstance(schema.get("collections"), (dict, list)):
+        schema = schema["collections"]
+    if isinstance(schema, list):
+        schema = {entry.get("name") or entry.get("collection"): entry for entry in schema if isinstance(entry, dict)}
+    if not isinstance(schema, dict) or not schema:
+        return None
+    collections = {}
+    for name, entry in schema.items():
+        if not name or not isinstance(entry, dict):
+            return None
+        if isinstance(entry.get("$jsonSchema"), dict):
+            entry = entry["$jsonSchema"]
+        fields = entry.get("fields", entry.get("properties"))
+        if isinstance(fields, list):
+            fields = {str(item.get("name")) if isinstance(item, dict) else str(item):
+                      item.get("type") if isinstance(item, dict) else None for item in fields}
+        elif not isinstance(fields, dict):
+            fields = {key: value for key, value in entry.items() if key not in _META_KEYS}
+        collections[str(name)] = {
+            **{key: value for key, value in entry.items() if key in _META_KEYS - {"fields", "properties", "name", "collection"}},
+            "fields": fields,
+        }
+    return collections
+
+
+def _words(text):
+    words = []
+    for word in _WORD.findall(_CAMEL.sub(" ", str(text)).replace("_", " ").replace(".", " ").lower()):
+        if word in _STOPWORDS:
+            continue
+        words.append(word[:-1] if len(word) > 3 and word.endswith("s") else word)
+    return words
+
+
+def _document(name, entry):
+    parts = [name, *entry["fields"]]
+    if isinstance(entry.get("description"), str):
+        parts.append(entry["description"])
+    return " ".join(" ".join(_words(part)) for part in parts)
+
+
+class _SchemaIndex:
+    """TF-IDF character n-gram vectors over collection names, fields and descriptions"""
+
+    def __init__(self, collections):
+        self.names = list(collections)
+        self.vectorizer = None
+        self.matrix = None
+        try:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+        except ImportError:
+            return
+        documents = [_document(name, collections[name]) for name in self.names]
+        self.vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 5), sublinear_tf=True)
+        self.matrix = self.vectorizer.fit_transform(documents)
+
+    def scores(self, question):
+        if self.vectorizer is None:
+            return {}
+        query = self.vectorizer.transform([" ".join(_words(question))])
+        return dict(zip(self.names, (self.matrix @ query.T).toarray().ravel()))
+
+
+def _reference_target(field, names):
+    # customer_id / customerId -> "customers" or "customer"
+    match = re.match(r"(.+?)_?(?:id|Id|ID)$", field)
+    if not match or field == "_id":
+        return None
+    base = "".join(_words(match.group(1)))
+    for name in names:
+        if "".join(_words(name)) == base:
+            return name
+    return None
+
+
+def _prune_fields(entry, question_words):
+    fields = entry["fields"]
+    if len(fields) <= SCHEMA_MAX_FIELDS:
+        return dict(fields), 0
+    index_fields = set()
+    for spec in entry.get("indexes") or []:
+        keys = spec.get("key", spec) if isinstance(spec, dict) else spec
+        index_fields.update(keys if isinstance(keys, (dict, list)) else [])
+    words = set(question_words)
+    ranked = sorted(
+        fields,
+        key=lambda f: (
+            f != "_id",
+            not words.intersection(_words(f)),
+            f not in index_fields and not re.search(r"(_id|Id)$", f),
+        )
+    )
+    kept = set(ranked[:SCHEMA_MAX_FIELDS])
+    return {name: value for name, value in fields.items() if name in kept}, len(fields) - len(kept)
+
+
+def prune_schema(collections, question, index=None):
+    """
+    Keep the collections and fields relevant to the question.
+
+    Collections are scored by keyword overlap with their name and field
+    names plus TF-IDF similarity; the best SCHEMA_MAX_COLLECTIONS that pass
+    SCHEMA_MIN_RELEVANCE are kept (at least one), together with collections
+    their *_id fields refer to. Large collections keep the fields named in
+    the question, _id, reference and indexed fields. Returns the pruned
+    {"collections": ...} document and a report.
+    """
+    index = index or _SchemaIndex(collections)
+    question_words = _words(question)
+    words = set(question_words)
+    similarity = index.scores(question)
+    scores = {}
+    for name, entry in collections.items():
+        name_words = set(_words(name))
+        keyword = 3.0 * len(words & name_words) / max(len(name_words), 1)
+        keyword += sum(1 for field in entry["fields"] if words.intersection(_words(field)))
+        scores[name] = keyword + 2.0 * float(similarity.get(name, 0.0))
+
+    ranked = sorted(collections, key=lambda name: scores[name], reverse=True)
+    selected = [name for name in ranked if scores[name] >= SCHEMA_MIN_RELEVANCE][:SCHEMA_MAX_COLLECTIONS] or ranked[:1]
+    for name in list(selected):
+        for field in collections[name]["fields"]:
+            target = _reference_target(field, collections)
+            if target and target not in selected and len(selected) < SCHEMA_MAX_COLLECTIONS:
+                selected.append(target)
+
+    pruned, omitted_fields = {}, 0
+    for name in selected:
+        fields, omitted = _prune_fields(collections[name], question_words)
+        pruned[name] = {**collections[name], "fields": fields}
+        if omitted:
+            pruned[name]["omitted_fields"] = omitted
+        omitted_fields += omitted
+    report = {
+        "collections_used": selected,
+        "collections_total": len(collections),
+        "fields_omitted": omitted_fields,
+    }
+    return {"collections": pruned}, report
+
+
+class SchemaRegistry:
+    """
+    Mongo schemas registered once per session or tenant id.
+
+    Every distinct schema text becomes a new version; versions are stored
+    zlib-compressed and the newest SCHEMA_VERSIONS_KEPT are kept. At most
+    max_ids ids are kept, dropping the least recently used. The newest
+    version of the decoded_kept most recently read ids is also kept decoded,
+    with its parsed form and relevance index for prompt pruning, so a
+    request for a schema in use decompresses nothing.
+    """
+
+    def __init__(self, versions_kept=SCHEMA_VERSIONS_KEPT, max_ids=SCHEMA_MAX_IDS, decoded_kept=SCHEMA_DECODED_KEPT):
+        self.versions_kept = versions_kept
+        self.max_ids = max_ids
+        self.decoded_kept = decoded_kept
+        self._schemas = OrderedDict()
+        self._parsed = OrderedDict()
+        self.evicted = 0
+
+    def register(self, schema_id, db_schema, context=""):
+        digest = hashlib.sha1(f"{db_schema}\0{context}".encode("utf-8")).hexdigest()
+        versions = self._schemas.setdefault(schema_id, [])
+        self._schemas.move_to_end(schema_id)
+        if versions and versions[-1]["digest"] == digest:
+            return self._describe(schema_id)
+        payload = json.dumps({"db_schema": db_schema, "context": context}).encode("utf-8")
+        entry = {
+            "version": versions[-1]["version"] + 1 if versions else 1,
+            "digest": digest,
+            "data": zlib.compress(payload, 9),
+            "original_bytes": len(payload),
+            "registered_at": time.time(),
+        }
+        versions.append(entry)
+        del versions[:-self.versions_kept]
+        while len(self._schemas) > self.max_ids:
+            evicted_id, _ = self._schemas.popitem(last=False)
+            self._parsed.pop(evicted_id, None)
+            self.evicted += 1
+        self._keep_decoded(schema_id, {
+            "version": entry["version"],
+            "payload": {"db_schema": db_schema, "context": context},
+            "collections": normalize_schema(db_schema),
+            "index": None,
+        })
+        return self._describe(schema_id)
+
+    def get(self, schema_id, version=None):
+        """{"version", "db_schema", "context"} for a version (default newest), or None"""
+        newest = self._newest(schema_id)
+        if newest is not None and version in (None, newest["version"]):
+            return {"version": newest["version"], **newest["payload"]}
+        entry = self._entry(schema_id, version)
+        if entry is None:
+            return None
+        payload = json.loads(zlib.decompress(entry["data"]))
+        return {"version": entry["version"], **payload}
+
+    def relevant_schema(self, schema_id, question):
+        """Pruned schema text for the question, the context, the version and a pruning report"""
+        newest = self._newest(schema_id)
+        if newest is None:
+            return None
+        payload, collections = newest["payload"], newest["collections"]
+        if not collections:
+            return payload["db_schema"], payload["context"], newest["version"], None
+        if newest["index"] is None:
+            newest["index"] = _SchemaIndex(collections)
+        pruned, report = prune_schema(collections, question, newest["index"])
+        return json.dumps(pruned, default=str), payload["context"], newest["version"], report
+
+    def describe(self, schema_id):
+        versions = self._schemas.get(schema_id)
+        if not versions:
+            return None
+        return {**self._describe(schema_id), "versions": [v["version"] for v in versions]}
+
+    def delete(self, schema_id):
+        self._parsed.pop(schema_id, None)
+        return self._schemas.pop(schema_id, None) is not None
+
+    def _entry(self, schema_id, version):
+        versions = self._schemas.get(schema_id) or []
+        if versions:
+            self._schemas.move_to_end(schema_id)
+        if version is None:
+            return versions[-1] if versions else None
+        return next((v for v in versions if v["version"] == version), None)
+
+    def _newest(self, schema_id):
+        """{"version", "payload", "collections", "index"} of the newest version, decoded once"""
+        entry = self._entry(schema_id, None)
+        if entry is None:
+            return None
+        newest = self._parsed.get(schema_id)
+        if newest is None or newest["version"] != entry["version"]:
+            payload = json.loads(zlib.decompress(entry["data"]))
+            newest = {
+                "version": entry["version"],
+                "payload": payload,
+                "collections": normalize_schema(payload["db_schema"]),
+                "index": None,
+            }
+        self._keep_decoded(schema_id, newest)
+        return newest
+
+    def _keep_decoded(self, schema_id, newest):
+        self._parsed[schema_id] = newest
+        self._parsed.move_to_end(schema_id)
+        while len(self._parsed) > self.decoded_kept:
+            self._parsed.popitem(last=False)
+
+    def _describe(self, schema_id):
+        entry = self._entry(schema_id, None)
+        collections = self._newest(schema_id)["collections"]
+        return {
+            "schema_id": schema_id,
+            "version": entry["version"],
+            "collections": len(collections) if collections else None,
+            "original_bytes": entry["original_bytes"],
+            "stored_bytes": len(entry["data"]),
+        }
+
+    def stats(self):
+        versions = [v for entries in self._schemas.values() for v in entries]
+        return {
+            "schemas": len(self._schemas),
+            "decoded": len(self._parsed),
+            "evicted": self.evicted,
+            "versions": len(versions),
+            "stored_bytes": sum(len(v["data"]) for v in versions),
+            "original_bytes": sum(v["original_bytes"] for v in versions),
+        }
+
+
+schema_registry = SchemaRegistry()
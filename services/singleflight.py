@@ -0,0 +1,75 @@
+import asyncio
+import re
+
+
+def normalize_question(question):
+    """Normalize a free-text question so trivially different duplicates share a key"""
+    question = re.sub(r"\s+", " ", (question or "").strip().lower())
+    return question.rstrip(" ?!.")
+
+
+class _Flight:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls.
+
+    The first caller for a key starts the computation in its own task;
+    callers that arrive with the same key while it is still running await
+    that task too. Every caller awaits it through asyncio.shield, so a caller
+    that is cancelled (e.g. a disconnecting client, leader or duplicate)
+    leaves the others waiting; the task is cancelled only when no caller is
+    left. Results are not cached once the call completes.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._inflight = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def run(self, key, func):
+        self.calls += 1
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.get_running_loop().create_task(func()))
+            self._inflight[key] = flight
+            flight.task.add_done_callback(lambda task: self._finished(key, flight))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Every caller is gone; nobody needs the result
+                flight.task.cancel()
+                self.abandoned += 1
+
+    def _finished(self, key, flight):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        if not flight.task.cancelled():
+            # Mark retrieved so an exception nobody else awaited is not logged
+            flight.task.exception()
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+            "in_flight": len(self._inflight),
+        }
+
+
+ask_flight = SingleFlight("ask")
+summarize_flight = SingleFlight("summarize")
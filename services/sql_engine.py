@@ -0,0 +1,96 @@
+import asyncio
+import os
+import re
+from services.executor import execution_service
+
+# Name the session frame is registered under for generated SQL
+SQL_TABLE = "data"
+SQL_THREADS = int(os.getenv("SQL_THREADS", os.cpu_count() or 4))
+SQL_MEMORY_LIMIT = os.getenv("SQL_MEMORY_LIMIT", "2GB")
+SQL_TIMEOUT_SECONDS = float(os.getenv("SQL_TIMEOUT_SECONDS", 30))
+
+_FORBIDDEN = re.compile(
+    r"\b(insert|update|delete|merge|create|drop|alter|copy|attach|detach|install|load|pragma|set|reset|"
+    r"export|import|call|checkpoint|vacuum|use|grant|revoke)\b",
+    re.IGNORECASE
+)
+_FILE_FUNCTIONS = re.compile(r"\b(read_\w+|glob|sniff_csv|parquet_\w+|getenv)\s*\(", re.IGNORECASE)
+
+
+class SQLExecutionError(Exception):
+    pass
+
+
+def _strip_literals(sql):
+    sql = re.sub(r"'(?:[^']|'')*'", "''", sql)
+    sql = re.sub(r'"(?:[^"]|"")*"', '""', sql)
+    sql = re.sub(r"--[^\n]*", " ", sql)
+    return re.sub(r"/\*.*?\*/", " ", sql, flags=re.DOTALL)
+
+
+def validate_sql(sql: str) -> bool:
+    """Allow a single read-only SELECT/WITH statement"""
+    body = _strip_literals(sql).strip().rstrip(";").strip()
+    if not body or ";" in body:
+        return False
+    if not re.match(r"^(select|with)\b", body, re.IGNORECASE):
+        return False
+    return not (_FORBIDDEN.search(body) or _FILE_FUNCTIONS.search(body))
+
+
+class _Query:
+    """A DuckDB connection for one query, which another thread can interrupt"""
+
+    def __init__(self):
+        import duckdb
+        # External access off: generated SQL can read the registered frame and nothing else
+        self.connection = duckdb.connect(config={
+            "enable_external_access": False,
+            "threads": SQL_THREADS,
+            "memory_limit": SQL_MEMORY_LIMIT,
+        })
+        self.interrupted = False
+
+    def run(self, sql, open_source):
+        try:
+            source = open_source()
+            if self.interrupted:
+                raise SQLExecutionError("Query was interrupted before it started")
+            self.connection.register(SQL_TABLE, source)
+            return self.connection.execute(sql).df()
+        finally:
+            self.connection.close()
+
+    def interrupt(self):
+        """Stop the running query; run() then closes the connection in its own thread"""
+        self.interrupted = True
+        self.connection.interrupt()
+
+
+def _open_source(frame_path, df):
+    if frame_path.endswith(".arrow"):
+        import pyarrow.feather as feather
+        # A memory-mapped Arrow table is scanned in parallel with projection,
+        # filter and limit pushdown, without copying the session frame
+        return feather.read_table(frame_path, memory_map=True)
+    return df
+
+
+async def run_sql(sql, session_id, version, df):
+    """Run a validated query against the session frame on DuckDB, off the event loop"""
+    frame_path = await execution_service.frame_file(session_id, version, df)
+    query = None
+    try:
+        query = await asyncio.to_thread(_Query)
+        return await asyncio.wait_for(
+            asyncio.to_thread(query.run, sql, lambda: _open_source(frame_path, df)),
+            timeout=SQL_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        # wait_for only stops waiting; the query would keep its thread, CPU and memory
+        query.interrupt()
+        raise SQLExecutionError(f"Query exceeded the {SQL_TIMEOUT_SECONDS:g} second time limit")
+    except SQLExecutionError:
+        raise
+    except Exception as e:
+        raise SQLExecutionError(str(e))
@@ -1,2 +1,34 @@
-uploaded_df = {}
-uploaded_file_info = {}
\ No newline at end of file
+import itertools
+import time
+
+uploaded_df = {}
+uploaded_file_info = {}
+
+# /deeper-insights-csv analyses and chat history per session, including the
+# parsed frames ("dataframes_raw") and their profiles ("dataframes_context")
+chat_sessions = {}
+
+# Running summary of each chat session's older exchanges:
+# {"summary": text, "folded": exchanges it covers, "updated": time.time()}
+chat_summaries = {}
+
+# time.time() of each session's last upload, question or chat message
+session_last_seen = {}
+
+# Monotonic version of the dataset stored for each session. Anything that
+# caches work derived from a session's data keys on this value so a re-upload
+# invalidates it.
+dataset_versions = {}
+_version_counter = itertools.count(1)
+
+
+def bump_dataset_version(session_id):
+    """Mark the session's data as changed and return the new version"""
+    dataset_versions[session_id] = next(_version_counter)
+    return dataset_versions[session_id]
+
+
+def touch_session(session_id):
+    """Record activity on a session, for idle-session eviction"""
+    if session_id:
+        session_last_seen[session_id] = time.time()
@@ -0,0 +1,331 @@
+import copy
+import re
+
+# Stages the stand-in can run; others raise NotImplementedError
+SUPPORTED_STAGES = {"$match", "$project", "$sort", "$skip", "$limit", "$group", "$count"}
+
+
+def _path(document, path):
+    """(found, value) at a dotted path; lists are searched for the rest of the path"""
+    value = document
+    for part in path.split("."):
+        if isinstance(value, list) and not part.isdigit():
+            found = [item for item in (_path(element, part) for element in value if isinstance(element, dict)) if item[0]]
+            if not found:
+                return False, None
+            value = [item[1] for item in found]
+            continue
+        if isinstance(value, list):
+            index = int(part)
+            if index >= len(value):
+                return False, None
+            value = value[index]
+        elif isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            return False, None
+    return True, value
+
+
+def _candidates(value):
+    """A field value and, for arrays, each element, as Mongo compares them"""
+    return [value, *value] if isinstance(value, list) else [value]
+
+
+def _compiled(pattern, options=""):
+    if hasattr(pattern, "try_compile"):
+        return pattern.try_compile()
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    flags = re.IGNORECASE if "i" in options else 0
+    flags |= re.MULTILINE if "m" in options else 0
+    return re.compile(pattern, flags)
+
+
+def _compare(left, right, test):
+    try:
+        return test(left, right)
+    except TypeError:
+        # Mongo compares across types by type order; such pairs never match a range query
+        return False
+
+
+def _condition(found, value, condition):
+    if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+        return all(_operator(found, value, operator, argument, condition) for operator, argument in condition.items())
+    if hasattr(condition, "try_compile") or isinstance(condition, re.Pattern):
+        return found and any(isinstance(v, str) and _compiled(condition).search(v) for v in _candidates(value))
+    if condition is None:
+        return not found or value is None
+    # An array field matches its whole value or any of its elements
+    return found and condition in _candidates(value)
+
+
+def _operator(found, value, operator, argument, condition):
+    values = _candidates(value) if found else []
+    if operator == "$eq":
+        return _condition(found, value, argument)
+    if operator == "$ne":
+        return not _condition(found, value, argument)
+    if operator in ("$gt", "$gte", "$lt", "$lte"):
+        test = {"$gt": lambda a, b: a > b, "$gte": lambda a, b: a >= b,
+                "$lt": lambda a, b: a < b, "$lte": lambda a, b: a <= b}[operator]
+        return any(v is not None and _compare(v, argument, test) for v in values)
+    if operator == "$in":
+        return any(_condition(found, value, item) for item in argument)
+    if operator == "$nin":
+        return not any(_condition(found, value, item) for item in argument)
+    if operator == "$exists":
+        return found == bool(argument)
+    if operator == "$regex":
+        regex = _compiled(argument, condition.get("$options", ""))
+        return any(isinstance(v, str) and regex.search(v) for v in values)
+    if operator == "$options":
+        return True
+    if operator == "$not":
+        return not _condition(found, value, argument)
+    if operator == "$size":
+        return found and isinstance(value, list) and len(value) == argument
+    if operator == "$elemMatch":
+        return found and isinstance(value, list) and any(
+            matches(item, argument) if isinstance(item, dict) else _condition(True, item, argument) for item in value)
+    raise NotImplementedError(f"Query operator {operator} is not supported by the in-memory stand-in")
+
+
+def matches(document, query_filter):
+    """Whether a document matches a query filter"""
+    for key, condition in (query_filter or {}).items():
+        if key == "$and":
+            if not all(matches(document, branch) for branch in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(document, branch) for branch in condition):
+                return False
+        elif key == "$nor":
+            if any(matches(document, branch) for branch in condition):
+                return False
+        elif key.startswith("$"):
+            raise NotImplementedError(f"Query operator {key} is not supported by the in-memory stand-in")
+        elif not _condition(*_path(document, key), condition):
+            return False
+    return True
+
+
+def _expression(document, expression):
+    """Value of an aggregation expression: "$field" paths and literals"""
+    if isinstance(expression, str) and expression.startswith("$"):
+        return _path(document, expression[1:])[1]
+    if isinstance(expression, dict):
+        if len(expression) == 1 and next(iter(expression)).startswith("$"):
+            raise NotImplementedError(f"Expression {next(iter(expression))} is not supported by the in-memory stand-in")
+        return {key: _expression(document, item) for key, item in expression.items()}
+    return expression
+
+
+def _project(document, projection):
+    if not projection:
+        return document
+    include = {key for key, value in projection.items() if value not in (0, False) and key != "_id"}
+    if include:
+        projected = {}
+        for key in include:
+            value = projection[key]
+            if value in (1, True):
+                found, item = _path(document, key)
+                if found:
+                    projected[key] = item
+            else:
+                projected[key] = _expression(document, value)
+    else:
+        excluded = {key for key, value in projection.items() if value in (0, False)}
+        projected = {key: item for key, item in document.items() if key not in excluded}
+    if projection.get("_id", 1) not in (0, False) and "_id" in document:
+        projected = {"_id": document["_id"], **projected}
+    return projected
+
+
+def _sort_key(value):
+    # Missing and null sort first, then numbers, then text, as in Mongo's type order
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, repr(value))
+
+
+def _sorted(documents, sort):
+    documents = list(documents)
+    for field, direction in reversed(list(sort)):
+        documents.sort(key=lambda document: _sort_key(_path(document, field)[1]), reverse=direction in (-1, "desc", "descending"))
+    return documents
+
+
+def _group(documents, spec):
+    groups = {}
+    for document in documents:
+        key = _expression(document, spec.get("_id"))
+        groups.setdefault(repr(key), (key, []))[1].append(document)
+    results = []
+    for key, members in groups.values():
+        result = {"_id": key}
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            (operator, argument), = accumulator.items()
+            values = [_expression(document, argument) for document in members]
+            numbers = [v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+            present = [v for v in values if v is not None]
+            if operator == "$sum":
+                result[field] = sum(numbers)
+            elif operator == "$avg":
+                result[field] = sum(numbers) / len(numbers) if numbers else None
+            elif operator == "$min":
+                result[field] = min(present, key=_sort_key) if present else None
+            elif operator == "$max":
+                result[field] = max(present, key=_sort_key) if present else None
+            elif operator == "$first":
+                result[field] = values[0]
+            elif operator == "$last":
+                result[field] = values[-1]
+            elif operator == "$push":
+                result[field] = values
+            elif operator == "$count":
+                result[field] = len(members)
+            else:
+                raise NotImplementedError(f"Accumulator {operator} is not supported by the in-memory stand-in")
+        results.append(result)
+    return results
+
+
+def run_pipeline(documents, pipeline):
+    """Run the supported aggregation stages over documents"""
+    for stage in pipeline:
+        (operator, spec), = stage.items()
+        if operator not in SUPPORTED_STAGES:
+            raise NotImplementedError(f"Stage {operator} is not supported by the in-memory stand-in")
+        if operator == "$match":
+            documents = [document for document in documents if matches(document, spec)]
+        elif operator == "$project":
+            documents = [_project(document, spec) for document in documents]
+        elif operator == "$sort":
+            documents = _sorted(documents, spec.items())
+        elif operator == "$skip":
+            documents = documents[int(spec):]
+        elif operator == "$limit":
+            documents = documents[:int(spec)]
+        elif operator == "$group":
+            documents = _group(documents, spec)
+        elif operator == "$count":
+            documents = [{spec: len(documents)}] if documents else []
+    return documents
+
+
+class InMemoryCursor:
+    """An async cursor over a list of documents, with the find cursor modifiers"""
+
+    def __init__(self, documents):
+        self._documents = documents
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = key_or_list if isinstance(key_or_list, list) else [(key_or_list, direction or 1)]
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def _results(self):
+        documents = _sorted(self._documents, self._sort) if self._sort else list(self._documents)
+        documents = documents[self._skip:]
+        return documents[:self._limit] if self._limit else documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self._results():
+            yield copy.deepcopy(document)
+
+
+class InMemoryCollection:
+    def __init__(self, name, documents=None):
+        self.name = name
+        self.documents = list(documents or [])
+
+    def insert_many(self, documents):
+        self.documents.extend(documents)
+
+    def find(self, query_filter=None, projection=None, **kwargs):
+        return InMemoryCursor([_project(d, projection) for d in self.documents if matches(d, query_filter)])
+
+    async def find_one(self, query_filter=None, projection=None, **kwargs):
+        for document in self.documents:
+            if matches(document, query_filter):
+                return copy.deepcopy(_project(document, projection))
+        return None
+
+    async def aggregate(self, pipeline, **kwargs):
+        return InMemoryCursor(run_pipeline(self.documents, pipeline))
+
+    async def count_documents(self, query_filter, **kwargs):
+        return sum(1 for document in self.documents if matches(document, query_filter))
+
+    async def estimated_document_count(self, **kwargs):
+        return len(self.documents)
+
+    async def distinct(self, field, query_filter=None, **kwargs):
+        values = []
+        for document in self.documents:
+            found, value = _path(document, field)
+            if found and matches(document, query_filter):
+                for item in (value if isinstance(value, list) else [value]):
+                    if item not in values:
+                        values.append(item)
+        return values
+
+
+class InMemoryDatabase:
+    def __init__(self, name):
+        self.name = name
+        self._collections = {}
+
+    def __getitem__(self, name):
+        return self._collections.setdefault(name, InMemoryCollection(name))
+
+
+class InMemoryMongoClient:
+    """
+    In-process stand-in for the async Mongo client, for tests that run
+    without a server: mongo_executor.use_client(InMemoryMongoClient(...)).
+
+    Supports the calls MongoExecutor makes, query filters with the common
+    comparison, set, regex and logical operators, and the pipeline stages in
+    SUPPORTED_STAGES with field-path expressions. Anything else raises
+    NotImplementedError rather than returning a wrong answer.
+    """
+
+    def __init__(self, data=None, default_database="test"):
+        """data: {database: {collection: [documents]}}"""
+        self.default_database = default_database
+        self._databases = {}
+        for database, collections in (data or {}).items():
+            for collection, documents in collections.items():
+                self[database][collection].insert_many(documents)
+
+    def __getitem__(self, name):
+        return self._databases.setdefault(name, InMemoryDatabase(name))
+
+    def get_default_database(self):
+        return self[self.default_database]
+
+    async def close(self):
+        pass
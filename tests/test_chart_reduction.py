@@ -0,0 +1,139 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.chart_reduction import OTHER_LABEL, lttb_indices, reduce_for_chart
+
+
+def breakdown(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "product": [f"p{i}" for i in range(rows)],
+        "sales": rng.random(rows) * 100,
+        "price": rng.random(rows) * 10,
+    })
+
+
+def test_lttb_keeps_the_ends_and_the_peaks():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50)
+    y[437] = 25.0
+    y[802] = -25.0
+    kept = lttb_indices(x, y, 50)
+    assert len(kept) == 50
+    assert kept[0] == 0 and kept[-1] == 999
+    assert (np.diff(kept) > 0).all()
+    assert {437, 802} <= set(kept)
+
+
+@pytest.mark.parametrize("threshold", [2, 10, 20])
+def test_lttb_returns_every_point_when_there_is_nothing_to_drop(threshold):
+    x = np.arange(10, dtype=np.float64)
+    assert list(lttb_indices(x, x, threshold)) == list(range(10))
+
+
+def test_time_series_is_downsampled_with_lttb():
+    index = pd.date_range("2024-01-01", periods=2000, freq="h", name="hour")
+    series = pd.Series(np.cos(np.arange(2000) / 40), index=index, name="load")
+    series.iloc[1234] = 9.0
+    reduced, report = reduce_for_chart(series, 100)
+    assert report["method"] == "lttb" and report["x"] == "hour" and report["points"] == len(reduced) == 100
+    assert reduced.index.is_monotonic_increasing
+    assert reduced.max() == 9.0
+
+
+def test_frame_with_a_date_column_is_downsampled_with_lttb():
+    frame = pd.DataFrame({
+        "day": pd.date_range("2020-01-01", periods=500).strftime("%Y-%m-%d"),
+        "visits": np.arange(500) % 37,
+    })
+    reduced, report = reduce_for_chart(frame, 60)
+    assert report["method"] == "lttb" and report["x"] == "day" and report["y"] == "visits"
+    assert len(reduced) == 60 and list(reduced.columns) == ["day", "visits"]
+
+
+def test_raw_values_become_a_histogram():
+    values = pd.Series(np.random.default_rng(1).normal(size=5000), name="score")
+    reduced, report = reduce_for_chart(values, 40)
+    assert report["method"] == "histogram" and report["column"] == "score"
+    assert len(reduced) <= 40 and reduced["count"].sum() == 5000
+
+
+def test_breakdown_keeps_the_top_k_and_sums_only_the_value_into_other():
+    frame = breakdown(300)
+    reduced, report = reduce_for_chart(frame, 10)
+    assert report["method"] == "top_k" and report["label"] == "product" and report["value"] == "sales"
+    assert len(reduced) == 10 and report["other_rows"] == 291
+    assert list(reduced["product"].iloc[:9]) == list(frame.nlargest(9, "sales")["product"])
+    other = reduced.iloc[-1]
+    assert other["product"] == OTHER_LABEL
+    assert other["sales"] == pytest.approx(frame["sales"].sum() - reduced["sales"].iloc[:9].sum())
+    assert pd.isna(other["price"])
+
+
+def test_duplicate_index_labels_do_not_duplicate_rows():
+    # pd.concat keeps both frames' row labels, so every label appears twice
+    frame = pd.concat([breakdown(200, seed=2), breakdown(200, seed=3)])
+    frame["product"] = [f"p{i}" for i in range(400)]
+    assert frame.index.has_duplicates
+    reduced, report = reduce_for_chart(frame, 25)
+    assert report["method"] == "top_k" and len(reduced) == 25
+    assert reduced["product"].is_unique
+    assert reduced["sales"].sum() == pytest.approx(frame["sales"].sum())
+
+
+def test_duplicate_labels_in_a_series_index_are_kept_apart():
+    series = pd.Series(np.arange(100, dtype=float), index=[f"c{i % 10}" for i in range(100)], name="amount")
+    reduced, report = reduce_for_chart(series, 8)
+    assert report["method"] == "top_k" and len(reduced) == 8
+    assert list(reduced.iloc[:7]) == [99.0, 98.0, 97.0, 96.0, 95.0, 94.0, 93.0]
+    assert reduced.index[-1] == OTHER_LABEL and reduced.sum() == pytest.approx(series.sum())
+
+
+def test_grouped_series_uses_the_group_labels_as_categories():
+    rng = np.random.default_rng(4)
+    frame = pd.DataFrame({
+        "region": rng.choice(["north", "south", "east"], 3000),
+        "store": rng.integers(0, 100, 3000),
+        "sales": rng.random(3000),
+    })
+    grouped = frame.groupby(["region", "store"])["sales"].sum()
+    reduced, report = reduce_for_chart(grouped, 12)
+    assert report["method"] == "top_k" and len(reduced) == 12
+    top = grouped.sort_values(ascending=False).index[0]
+    assert reduced.index[0] == f"{top[0]}, {top[1]}"
+    assert reduced.sum() == pytest.approx(grouped.sum())
+
+
+def test_grouped_frame_moves_the_group_labels_into_a_column():
+    frame = breakdown(500).rename(columns={"product": "sku"})
+    grouped = frame.groupby("sku").agg(total=("sales", "sum"), avg_price=("price", "mean"))
+    reduced, report = reduce_for_chart(grouped, 20)
+    assert report["method"] == "top_k" and report["label"] == "sku" and report["value"] == "total"
+    assert list(reduced.columns) == ["sku", "total", "avg_price"] and len(reduced) == 20
+    assert reduced["sku"].iloc[0] == grouped["total"].idxmax()
+    assert reduced["sku"].iloc[-1] == OTHER_LABEL
+
+
+def test_unsorted_numeric_index_is_not_used_as_an_axis():
+    series = pd.Series(np.arange(300, dtype=float), index=pd.Index(np.arange(300)[::-1] * 3, name="bucket"))
+    reduced, report = reduce_for_chart(series, 30)
+    assert report["method"] != "lttb" and len(reduced) <= 30
+
+
+def test_results_that_fit_are_returned_as_they_are():
+    frame = breakdown(5)
+    reduced, report = reduce_for_chart(frame, 10)
+    assert reduced is frame and report == {"method": "none", "original_points": 5, "points": 5}
+
+
+def test_other_shapes_are_truncated():
+    frame = pd.DataFrame({"a": ["x"] * 50, "b": ["y"] * 50, "n": range(50)})
+    reduced, report = reduce_for_chart(frame, 10)
+    assert report["method"] == "truncate" and len(reduced) == 10
+    assert reduce_for_chart([1, 2, 3], 2) == ([1, 2, 3], None)
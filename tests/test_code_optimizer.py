@@ -0,0 +1,96 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.code_optimizer import optimize_code
+
+FRAME = pd.DataFrame({
+    "region": ["EU", "US", "EU", "US", "APAC"],
+    "sales": [10.0, 40.0, 25.0, 5.0, 30.0],
+    "units": [1, 4, 2, 1, 3],
+})
+
+
+def evaluate(code):
+    namespace = {"df": FRAME.copy(), "pd": pd}
+    exec(code, namespace)
+    return namespace["result"]
+
+
+def assert_same(left, right):
+    if isinstance(left, (pd.DataFrame, pd.Series)):
+        assert left.equals(right), f"{left}\n!=\n{right}"
+    else:
+        assert left == right
+
+
+@pytest.mark.parametrize("code, rewritten", [
+    ("result = df.sort_values('sales', ascending=False).head(3)", "df.nlargest(3, 'sales')"),
+    ("result = df.sort_values(by='sales').head(2)", "df.nsmallest(2, 'sales')"),
+    ("result = df['sales'].sort_values(ascending=False).head()", "df['sales'].nlargest(5)"),
+    ("result = df.apply(lambda row: row['sales'] * row['units'], axis=1)", "df['sales'] * df['units']"),
+    ("result = df['sales'].apply(lambda v: v / 2 + 1)", "df['sales'] / 2 + 1"),
+    ("result = df['units'].apply(lambda v: v ** 2)", "df['units'] ** 2"),
+    (
+        "result = {}\nfor key, group in df.groupby('region'):\n    result[key] = group['sales'].sum()",
+        "result.update(df.groupby('region')['sales'].agg('sum').to_dict())",
+    ),
+    (
+        "result = []\nfor name, group in df.groupby('region'):\n"
+        "    result.append({'region': name, 'total': group['sales'].sum(), 'orders': len(group)})",
+        "agg(**{'total': ('sales', 'sum'), 'orders': ('region', 'size')})",
+    ),
+])
+def test_rewrites_fire_and_keep_the_result(code, rewritten):
+    optimized = optimize_code(code)
+    assert optimized.changed
+    assert rewritten in optimized.code
+    assert_same(evaluate(optimized.code), evaluate(code))
+
+
+@pytest.mark.parametrize("code", [
+    # Ties and extra sort options behave differently in nlargest
+    "result = df.sort_values('sales', ascending=False, kind='mergesort').head(3)",
+    "result = df.sort_values('sales', ascending=[True, False]).head(3)",
+    "result = df.sort_values('sales').head(n)",
+    # Division by a column can raise in the lambda but not in NumPy
+    "result = df.apply(lambda row: row['sales'] / row['units'], axis=1)",
+    "result = df['sales'].apply(lambda v: 100 / v)",
+    "result = df['sales'].apply(lambda v: v ** 0.5)",
+    # Calls and names the lambda closes over are not plain arithmetic
+    "result = df['sales'].apply(lambda v: round(v))",
+    "result = df['sales'].apply(lambda v: v * rate)",
+    "result = df['sales'].apply(lambda v: 1)",
+    "result = df.sample(3).apply(lambda row: row['sales'] * 2, axis=1)",
+    # Loops that do more than collect one aggregate per group
+    "result = {}\nfor key, group in df.groupby('region'):\n    result[key] = group['sales'].sum() * 2",
+    "result = {}\nfor key, group in df.groupby(['region', 'units']):\n    result[key] = group['sales'].sum()",
+    "result = {}\nfor key, group in df.groupby('region'):\n    print(key)\n    result[key] = group['sales'].sum()",
+    "result = []\nfor name, group in df.groupby('region'):\n    result.append({'total': group['sales'].sum()})",
+])
+def test_rewrites_do_not_fire(code):
+    optimized = optimize_code(code)
+    assert not optimized.changed
+    assert optimized.code == code
+
+
+def test_unparseable_code_is_returned_unchanged():
+    optimized = optimize_code("result = df[")
+    assert optimized.code == "result = df[" and not optimized.changed and not optimized.warnings
+
+
+@pytest.mark.parametrize("code, warning", [
+    ("for _, row in df.iterrows():\n    print(row)", "iterrows() iterates rows in Python"),
+    ("result = df.apply(lambda row: str(row['sales']), axis=1)", "row-wise apply(axis=1) could not be vectorized"),
+    ("for i in range(len(df)):\n    print(i)", "index loop over range(len(...)) iterates rows in Python"),
+    (
+        "for key, group in df.groupby('region'):\n    print(key)",
+        "Python loop over groupby() could not be rewritten as groupby().agg()",
+    ),
+])
+def test_slow_patterns_left_in_place_are_reported(code, warning):
+    assert warning in optimize_code(code).warnings
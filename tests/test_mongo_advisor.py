@@ -0,0 +1,126 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.mongo_advisor import advise, extract_indexes
+
+SCHEMA = json.dumps({"collections": {
+    "orders": {
+        "fields": {"status": "string", "customer_id": "objectId", "created_at": "date", "amount": "double"},
+        "indexes": [
+            {"key": {"_id": 1}, "name": "_id_"},
+            {"key": {"status": 1, "created_at": -1}, "name": "status_1_created_at_-1"},
+            {"key": {"customer_id": 1}, "name": "customer_id_1"},
+        ],
+    },
+    "customers": {"fields": {"name": "string", "email": "string"}, "indexes": ["email_1"]},
+    "events": {"fields": {"kind": "string"}},
+}})
+
+
+def types(advisories):
+    return [advisory["type"] for advisory in advisories]
+
+
+def test_indexes_are_read_from_every_layout():
+    assert extract_indexes(SCHEMA) == {
+        "orders": [[("_id", 1)], [("status", 1), ("created_at", -1)], [("customer_id", 1)]],
+        "customers": [[("email", 1)]],
+    }
+    assert extract_indexes([{"name": "a", "indexes": [["x", ["y", -1]], "z_1_w_-1"]}]) == {
+        "a": [[("x", 1), ("y", -1)], [("z", 1), ("w", -1)]],
+    }
+
+
+@pytest.mark.parametrize("text", [
+    'db.orders.find({status: "A"})',
+    'db.orders.find({status: "A"}).sort({created_at: -1})',
+    'db.orders.find({status: "A"}).sort({created_at: 1})',
+    'db.orders.find({customer_id: 7, amount: {$gt: 10}})',
+    'db.orders.find({_id: 3})',
+    'db.orders.find({}).sort({status: 1})',
+    'db.orders.aggregate([{$match: {status: "A"}}, {$sort: {created_at: -1}}, {$group: {_id: "$customer_id", n: {$sum: 1}}}])',
+    'db.orders.aggregate([{$lookup: {from: "customers", localField: "email", foreignField: "email", as: "c"}}])',
+    'db.customers.find({email: /^ann@/})',
+])
+def test_queries_served_by_an_index_get_no_advice(text):
+    assert advise(text, SCHEMA) == []
+
+
+def test_filter_without_an_index_gets_an_esr_suggestion():
+    advisories = advise('db.orders.find({amount: {$gt: 100}, status: "A", region: "EU"}).sort({created_at: -1})', SCHEMA)
+    # status_1_created_at_-1 serves the equality on status and the sort; the rest is filtered from it
+    assert advisories == []
+    advisories = advise('db.orders.find({amount: {$gt: 100}, region: "EU"}).sort({created_at: -1})', SCHEMA)
+    assert types(advisories) == ["missing_index"]
+    advisory = advisories[0]
+    assert advisory["collection"] == "orders" and advisory["severity"] == "warning"
+    # Equality first, then the sort, then the range
+    assert list(advisory["suggested_index"].items()) == [("region", 1), ("created_at", -1), ("amount", 1)]
+
+
+def test_sort_an_index_cannot_provide_is_reported():
+    advisories = advise('db.orders.find({status: "A"}).sort({amount: -1})', SCHEMA)
+    assert types(advisories) == ["missing_index"]
+    assert "sorted in memory" in advisories[0]["message"]
+    assert list(advisories[0]["suggested_index"].items()) == [("status", 1), ("amount", -1)]
+
+
+def test_mixed_sort_directions_must_match_the_index():
+    advisories = advise('db.orders.find({}).sort({status: 1, created_at: 1})', SCHEMA)
+    assert types(advisories) == ["missing_index"]
+    assert advise('db.orders.find({}).sort({status: -1, created_at: 1})', SCHEMA) == []
+
+
+def test_only_the_leading_match_of_a_pipeline_is_checked_against_indexes():
+    advisories = advise(
+        'db.orders.aggregate([{$match: {amount: {$gt: 5}}}, {$project: {status: 1}}, {$match: {kind: "x"}}])', SCHEMA)
+    assert types(advisories) == ["missing_index"]
+    assert advisories[0]["fields"] == ["amount"]
+
+
+def test_match_after_group_on_the_group_key_and_on_dropped_fields():
+    advisories = advise(
+        'db.orders.aggregate([{$group: {_id: "$status", total: {$sum: "$amount"}}}, '
+        '{$match: {_id: "A", amount: {$gt: 1}}}])', SCHEMA)
+    moved, missing = advisories
+    assert moved["type"] == "match_after_group" and moved["fields"] == ["status"] and moved["stage"] == 1
+    assert missing["type"] == "match_on_missing_field" and missing["fields"] == ["amount"]
+    assert missing["severity"] == "error"
+
+
+@pytest.mark.parametrize("text, flagged", [
+    ('db.customers.find({email: /gmail/})', True),
+    ('db.customers.find({email: /^ann/i})', True),
+    ('db.customers.find({email: {$regex: "example.com$"}})', True),
+    ('db.customers.find({$or: [{email: /^a/}, {name: /smith/}]})', True),
+    ('db.customers.find({email: /^ann/})', False),
+])
+def test_unanchored_and_case_insensitive_regexes(text, flagged):
+    assert ("unanchored_regex" in types(advise(text, SCHEMA))) == flagged
+
+
+def test_lookup_on_an_unindexed_foreign_field():
+    advisories = advise(
+        'db.orders.aggregate([{$match: {status: "A"}}, '
+        '{$lookup: {from: "customers", localField: "customer_id", foreignField: "name", as: "c"}}])', SCHEMA)
+    assert types(advisories) == ["lookup_without_index"]
+    assert advisories[0]["collection"] == "customers" and advisories[0]["suggested_index"] == {"name": 1}
+    # Joins on _id and on collections without index information are not flagged
+    assert advise('db.orders.aggregate([{$lookup: {from: "customers", localField: "customer_id", '
+                  'foreignField: "_id", as: "c"}}])', SCHEMA) == []
+    assert advise('db.orders.aggregate([{$lookup: {from: "events", localField: "kind", '
+                  'foreignField: "kind", as: "e"}}])', SCHEMA) == []
+
+
+def test_collections_without_indexes_are_not_guessed_at():
+    assert types(advise('db.events.find({kind: "click"}).sort({ts: -1})', SCHEMA)) == ["no_index_information"]
+    assert types(advise('db.orders.find({amount: 1})')) == ["no_index_information"]
+
+
+def test_unparsed_query_is_reported_not_raised():
+    assert types(advise("db.orders.find({status: ", SCHEMA)) == ["unparsed_query"]
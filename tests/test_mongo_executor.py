@@ -0,0 +1,79 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mongo_fake import InMemoryMongoClient
+from services.mongo_executor import MongoExecutor, UnsafeQueryError
+from services.mongo_query import parse_mongo_query
+
+ORDERS = [
+    {"_id": 1, "status": "A", "region": "EU", "amount": 50, "customer": {"name": "Ann"}},
+    {"_id": 2, "status": "B", "region": "EU", "amount": 20, "customer": {"name": "Bob"}},
+    {"_id": 3, "status": "A", "region": "US", "amount": 70, "customer": {"name": "Cy"}},
+    {"_id": 4, "status": "A", "region": "US", "amount": 10, "customer": {"name": "Di"}},
+]
+
+
+def make_executor(max_documents=100):
+    executor = MongoExecutor(uri=None, max_documents=max_documents)
+    executor.use_client(InMemoryMongoClient({"shop": {"orders": ORDERS}}), database="shop")
+    return executor
+
+
+def run(executor, text):
+    async def collect(documents):
+        return [document async for document in documents]
+    return asyncio.run(executor.run(parse_mongo_query(text), collect))
+
+
+def test_find_with_filter_sort_and_limit():
+    documents, details = run(make_executor(), 'db.orders.find({status: "A", amount: {$gte: 20}}).sort({amount: -1}).limit(5)')
+    assert [d["_id"] for d in documents] == [3, 1]
+    assert details["documents"] == 2 and not details["truncated"]
+
+
+def test_aggregate_group_and_sort():
+    documents, _ = run(make_executor(), (
+        'db.orders.aggregate([{$match: {status: "A"}}, '
+        '{$group: {_id: "$region", total: {$sum: "$amount"}}}, {$sort: {total: -1}}])'
+    ))
+    assert documents == [{"_id": "US", "total": 80}, {"_id": "EU", "total": 50}]
+
+
+def test_count_distinct_and_nested_fields():
+    executor = make_executor()
+    assert run(executor, 'db.orders.countDocuments({region: "EU"})')[0] == [{"count": 2}]
+    assert run(executor, 'db.orders.distinct("region")')[0] == [{"region": "EU"}, {"region": "US"}]
+    assert run(executor, 'db.orders.findOne({"customer.name": /^C/})')[0][0]["_id"] == 3
+
+
+def test_results_are_cut_at_max_documents():
+    documents, details = run(make_executor(max_documents=3), "db.orders.find({})")
+    assert len(documents) == 3 and details["truncated"]
+
+
+@pytest.mark.parametrize("text", [
+    'db.orders.deleteMany({})',
+    'db.system.users.find({})',
+    'db.orders.aggregate([{$lookup: {from: "system.users", localField: "a", foreignField: "b", as: "u"}}])',
+    'db.orders.aggregate([{$graphLookup: {from: "system.roles", startWith: "$a", connectFromField: "a", connectToField: "b", as: "r"}}])',
+    'db.orders.aggregate([{$unionWith: "system.profile"}])',
+    'db.orders.aggregate([{$unionWith: {coll: "system.profile", pipeline: []}}])',
+    'db.orders.aggregate([{$lookup: {from: {db: "admin", coll: "system.users"}, localField: "a", foreignField: "b", as: "u"}}])',
+    'db.orders.aggregate([{$unionWith: {coll: {db: "admin", coll: "system.users"}, pipeline: []}}])',
+    'db.orders.aggregate([{$facet: {x: [{$lookup: {from: "system.users", pipeline: [], as: "u"}}]}}])',
+    'db.orders.aggregate([{$currentOp: {}}])',
+    'db.orders.aggregate([{$listSessions: {}}])',
+    'db.orders.aggregate([{$collStats: {storageStats: {}}}])',
+    'db.orders.aggregate([{$out: "copy"}])',
+    'db.orders.find({$where: "sleep(100)"})',
+])
+def test_unsafe_queries_are_rejected(text):
+    executor = make_executor()
+    with pytest.raises(UnsafeQueryError):
+        run(executor, text)
+    assert executor.rejected == 1 and executor.queries == 0
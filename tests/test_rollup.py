@@ -0,0 +1,94 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.rollup import RollupCube, answer_from_cube
+
+
+def make_frame(rows=3000):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "region": rng.choice(["north", "south", "east", "west"], rows),
+        "channel": rng.choice(["online", "store", "partner"], rows),
+        "product": rng.integers(0, 40, rows),
+        "sales": rng.random(rows) * 1000,
+        "units": rng.integers(1, 50, rows),
+    })
+    df.loc[rng.random(rows) < 0.05, "sales"] = np.nan
+    return df
+
+
+FRAME = make_frame()
+CUBE = RollupCube(FRAME, version=1)
+
+
+def evaluate(code):
+    namespace = {"df": FRAME.copy(), "pd": pd, "np": np}
+    exec(code, namespace)
+    return namespace["result"]
+
+
+@pytest.mark.parametrize("code", [
+    "result = df.groupby('region')['sales'].sum()",
+    "result = df.groupby('region')['sales'].mean()",
+    "result = df.groupby('channel')['units'].agg(['sum', 'min', 'max'])",
+    "result = df.groupby('channel').size()",
+    "result = df.groupby('channel', as_index=False).size()",
+    "result = df.groupby(['region', 'channel'])['sales'].count()",
+    "result = df.groupby(['channel', 'region'])['units'].max()",
+    "result = df.groupby('region')[['sales', 'units']].sum()",
+    "result = df.groupby('region').agg({'sales': 'mean', 'units': 'sum'})",
+    "result = df.groupby('product').agg(total=('sales', 'sum'), orders=('units', 'count')).nlargest(5, 'total')",
+    "result = df.groupby('region')['sales'].sum().reset_index().sort_values('sales', ascending=False).head(3)",
+    "result = df.groupby('region', as_index=False)['sales'].agg('min')",
+    "result = df.groupby('region')['sales'].mean().round(2)",
+    "import pandas as pd\nresult = df.groupby('region')['units'].sum().sort_index(ascending=False)",
+])
+def test_group_by_queries_are_answered_exactly(code):
+    answer = answer_from_cube(CUBE, code)
+    assert answer is not None
+    expected = evaluate(code)
+    assert answer.equals(expected), f"{answer}\n!=\n{expected}"
+
+
+@pytest.mark.parametrize("code", [
+    # Aggregates the cube does not store
+    "result = df.groupby('region')['sales'].median()",
+    "result = df.groupby('region')['sales'].std()",
+    "result = df.groupby('region')['sales'].agg(lambda s: s.max() - s.min())",
+    "result = df.groupby('region').sum()",
+    # Group-by options whose result differs from the stored groups
+    "result = df.groupby('region', sort=False)['sales'].sum()",
+    "result = df.groupby('region', dropna=False)['sales'].sum()",
+    # Columns and combinations without a cuboid
+    "result = df.groupby('sales')['units'].sum()",
+    "result = df.groupby(['region', 'channel', 'product'])['sales'].sum()",
+    "result = df.groupby(['region', 'region'])['sales'].sum()",
+    "result = df.groupby('region')['channel'].max()",
+    "result = df.groupby(df['units'] > 10)['sales'].sum()",
+    # Anything but one assignment of a group-by chain on df
+    "result = df[df['units'] > 10].groupby('region')['sales'].sum()",
+    "df = df.groupby('region')['sales'].sum()",
+    "x = 1\nresult = df.groupby('region')['sales'].sum()",
+    "import os\nresult = df.groupby('region')['sales'].sum()",
+    "result = df.groupby('region')['sales'].sum().apply(str)",
+    "result = df.groupby('region')['sales'].sum().head(n)",
+    "result = other.groupby('region')['sales'].sum()",
+    "result = df.groupby('region')",
+    "result = df.groupby(",
+])
+def test_other_queries_are_declined(code):
+    assert answer_from_cube(CUBE, code) is None
+
+
+def test_cube_groups_by_the_low_cardinality_columns():
+    assert CUBE.rows == len(FRAME) and CUBE.version == 1
+    assert frozenset({"region", "channel"}) in CUBE.cuboids
+    assert not any("sales" in keys for keys in CUBE.cuboids)
+    assert CUBE.cells == sum(cuboid.cells for cuboid in CUBE.cuboids.values())
+    assert CUBE.nbytes() > 0
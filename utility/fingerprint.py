@@ -0,0 +1,38 @@
+import bisect
+import hashlib
+import numpy as np
+from pandas.api import types as ptypes
+
+# Rows read for the value profile in profile_fingerprint; it only needs to be coarse
+PROFILE_SAMPLE_ROWS = 10000
+# Upper bounds of the distinct-value buckets in the profile
+_CARDINALITY_BUCKETS = (1, 10, 50, 1000)
+
+
+def schema_fingerprint(df):
+    """Hash a frame's column names and dtypes, in order"""
+    schema = [(str(col), str(dtype)) for col, dtype in df.dtypes.items()]
+    return hashlib.sha1(repr(schema).encode("utf-8")).hexdigest()
+
+
+def profile_fingerprint(df):
+    """
+    Hash a frame's schema plus a coarse profile of its values.
+
+    Per column: a bucket of its number of distinct values, whether it has
+    nulls and, for numbers, the sign and order of magnitude of the median,
+    all read from the first PROFILE_SAMPLE_ROWS rows. Frames whose values
+    look alike share a fingerprint; a column that turns from a handful of
+    categories into free text, or from units into millions, does not.
+    """
+    sample = df.head(PROFILE_SAMPLE_ROWS)
+    profile = []
+    for position, (col, dtype) in enumerate(df.dtypes.items()):
+        values = sample.iloc[:, position]
+        entry = [str(col), str(dtype), bisect.bisect_left(_CARDINALITY_BUCKETS, values.nunique()), bool(values.isna().any())]
+        if ptypes.is_numeric_dtype(dtype) and not ptypes.is_bool_dtype(dtype):
+            median = float(values.median()) if values.notna().any() else 0.0
+            magnitude = int(np.floor(np.log10(abs(median)))) if np.isfinite(median) and median != 0 else None
+            entry += [int(np.sign(median)) if np.isfinite(median) else None, magnitude]
+        profile.append(tuple(entry))
+    return hashlib.sha1(repr(profile).encode("utf-8")).hexdigest()
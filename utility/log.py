@@ -0,0 +1,171 @@
+import contextvars
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+import uuid
+import orjson
+from starlette.datastructures import MutableHeaders
+
+# Id of the request being handled, taken from X-Request-ID or generated; "-" outside requests
+request_id = contextvars.ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else on a record came in through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+def _truncate(value, limit):
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]}... [{len(value) - limit} more chars]"
+    return value
+
+
+class QueueLogHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to the background writer without formatting them.
+
+    The caller only stamps the request id and cuts long string arguments and
+    extra fields to LOG_MAX_FIELD_CHARS; formatting and the write happen in the
+    writer thread. When the queue is full the record is dropped and counted
+    rather than blocking the request.
+    """
+
+    def __init__(self, log_queue, max_field_chars):
+        super().__init__(log_queue)
+        self.max_field_chars = max_field_chars
+        self.dropped = 0
+        self.truncated = 0
+
+    def prepare(self, record):
+        record.request_id = request_id.get()
+        limit = self.max_field_chars
+        if isinstance(record.msg, str) and len(record.msg) > limit:
+            record.msg = _truncate(record.msg, limit)
+            self.truncated += 1
+        if isinstance(record.args, tuple) and any(isinstance(a, str) and len(a) > limit for a in record.args):
+            record.args = tuple(_truncate(a, limit) for a in record.args)
+            self.truncated += 1
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and isinstance(value, str) and len(value) > limit:
+                setattr(record, key, _truncate(value, limit))
+                self.truncated += 1
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, request id, message and extra fields"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+    def formatTime(self, record, datefmt=None):
+        return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z"
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local runs, extra fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        extra = " ".join(f"{key}={value!r}" for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        return f"{line} {extra}" if extra else line
+
+
+_handler = None
+_listener = None
+
+
+def configure_logging():
+    """
+    Route application logs through a queue to a background writer thread.
+
+    Reads LOG_LEVEL (default INFO), LOG_LEVELS for per-logger levels such as
+    "routers.ask_mongo=DEBUG,services=WARNING", LOG_FORMAT ("json" or "text"),
+    LOG_MAX_FIELD_CHARS and LOG_QUEUE_SIZE. Called after .env is loaded.
+    """
+    global _handler, _listener
+    if _listener is not None:
+        return
+    root = logging.getLogger()
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    for item in os.getenv("LOG_LEVELS", "").split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(TextFormatter() if os.getenv("LOG_FORMAT", "json") == "text" else JsonFormatter())
+    _handler = QueueLogHandler(
+        queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", 10000))),
+        int(os.getenv("LOG_MAX_FIELD_CHARS", 2000))
+    )
+    root.addHandler(_handler)
+    _listener = logging.handlers.QueueListener(_handler.queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Write out queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def logging_stats():
+    if _handler is None:
+        return {"configured": False}
+    return {
+        "configured": True,
+        "queued": _handler.queue.qsize(),
+        "dropped": _handler.dropped,
+        "truncated": _handler.truncated,
+    }
+
+
+class RequestIdMiddleware:
+    """Give each HTTP request an id for its log records and return it in X-Request-ID"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        incoming = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")[:128]
+        rid = incoming or uuid.uuid4().hex
+        token = request_id.set(rid)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Request-ID", rid)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
@@ -0,0 +1,104 @@
+import datetime
+import decimal
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi.responses import JSONResponse
+from pandas.api import types as ptypes
+from utility.timing import stage
+
+_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    """Types orjson does not handle natively"""
+    if obj is pd.NA or obj is pd.NaT:
+        return None
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (pd.Timedelta, datetime.timedelta, pd.Period, pd.Interval)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, pd.DataFrame):
+        return frame_to_records(obj)
+    if isinstance(obj, pd.Series):
+        return series_to_dict(obj)
+    if type(obj).__module__.startswith("bson"):
+        # ObjectId, Decimal128, Int64 and friends from Mongo results
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content):
+    """Serialize to JSON bytes; NaN and infinities become null"""
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+def _datetime_strings(values):
+    # ISO 8601 strings for a datetime64 array, formatted in one NumPy call
+    values = values.astype("datetime64[ns]")
+    sub_second = (values[~np.isnat(values)].astype("int64") % 1_000_000_000 != 0).any()
+    strings = np.datetime_as_string(values, unit="us" if sub_second else "s").astype(object)
+    strings[np.isnat(values)] = None
+    return strings.tolist()
+
+
+def column_values(series):
+    """JSON-ready Python values for one column, converted with a single vectorized step"""
+    dtype = series.dtype
+    if ptypes.is_datetime64_dtype(dtype):
+        return _datetime_strings(series.to_numpy())
+    if isinstance(dtype, pd.DatetimeTZDtype):
+        return [None if ts is pd.NaT else ts.isoformat() for ts in series]
+    if ptypes.is_timedelta64_dtype(dtype) or isinstance(dtype, (pd.PeriodDtype, pd.IntervalDtype)):
+        return series.astype(str).where(series.notna(), None).tolist()
+    if isinstance(dtype, np.dtype) and dtype.kind == "f":
+        values = series.to_numpy()
+        missing = ~np.isfinite(values)
+        if not missing.any():
+            return values.tolist()
+        # None rather than NaN or inf: records also reach json.dumps and prompt text, which would write NaN
+        values = values.astype(object)
+        values[missing] = None
+        return values.tolist()
+    if isinstance(dtype, np.dtype) and dtype.kind in "biu":
+        return series.tolist()
+    # object, category and nullable extension dtypes: missing markers become None
+    values = series.astype(object)
+    missing = series.isna().to_numpy()
+    if missing.any():
+        values = values.where(~missing, None)
+    return values.tolist()
+
+
+def _labels(index):
+    if isinstance(index, pd.MultiIndex):
+        return [", ".join(map(str, key)) for key in index]
+    return column_values(index.to_series())
+
+
+def frame_to_records(df):
+    """Equivalent of df.replace({nan: None}).to_dict('records') plus sanitizing, column at a time"""
+    columns = [str(col) if not isinstance(col, str) else col for col in df.columns]
+    if not columns:
+        return [{} for _ in range(len(df))]
+    values = [column_values(df.iloc[:, position]) for position in range(len(columns))]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def series_to_dict(series):
+    """Equivalent of series.replace({nan: None}).to_dict() plus sanitizing, with JSON-safe keys"""
+    return dict(zip(_labels(series.index), column_values(series)))
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson, understanding NumPy and pandas values"""
+
+    def render(self, content) -> bytes:
+        with stage("render"):
+            return dumps(content)
@@ -0,0 +1,127 @@
+import contextlib
+import contextvars
+import logging
+import os
+import time
+from starlette.datastructures import MutableHeaders
+
+# Set SERVER_TIMING=0 to stop sending the Server-Timing header
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") != "0"
+# "otlp", "console" or "none"; OTLP is the default when an OTLP endpoint is configured
+OTEL_TRACES_EXPORTER = os.getenv(
+    "OTEL_TRACES_EXPORTER",
+    "otlp" if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT") or os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT") else "none"
+)
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "loremhacktimus")
+
+logger = logging.getLogger(__name__)
+
+# Stages recorded for the request being handled, as [(name, milliseconds), ...]
+_stages = contextvars.ContextVar("request_stages", default=None)
+_tracer = None
+_provider = None
+
+
+@contextlib.contextmanager
+def stage(name, **attributes):
+    """
+    Time a named stage of the current request.
+
+    The duration is added to the request's Server-Timing header and
+    debug timings and, with tracing configured, the stage is also an
+    OpenTelemetry span under the request span.
+    """
+    span = _tracer.start_as_current_span(name, attributes=attributes) if _tracer else contextlib.nullcontext()
+    start = time.perf_counter()
+    with span:
+        try:
+            yield
+        finally:
+            record(name, (time.perf_counter() - start) * 1000)
+
+
+def record(name, milliseconds):
+    stages = _stages.get()
+    if stages is not None:
+        stages.append((name, milliseconds))
+
+
+def timings():
+    """Stages recorded so far for the current request, in the order they finished"""
+    return [{"stage": name, "ms": round(ms, 3)} for name, ms in _stages.get() or []]
+
+
+def server_timing_header(stages, total_ms):
+    """Server-Timing value with repeated stages (e.g. several translations) summed"""
+    totals, counts = {}, {}
+    for name, ms in stages:
+        totals[name] = totals.get(name, 0.0) + ms
+        counts[name] = counts.get(name, 0) + 1
+    metrics = [
+        f'{name};dur={ms:.1f}' + (f';desc="{counts[name]} calls"' if counts[name] > 1 else "")
+        for name, ms in totals.items()
+    ]
+    metrics.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(metrics)
+
+
+class ServerTimingMiddleware:
+    """Collect the stages of each HTTP request and report them in a Server-Timing header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stages = []
+        token = _stages.set(stages)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and SERVER_TIMING:
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing_header(stages, (time.perf_counter() - start) * 1000))
+                # Lets browser pages on other origins read the header too
+                headers.append("Timing-Allow-Origin", "*")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _stages.reset(token)
+
+
+def configure_tracing(app):
+    """Export request and stage spans with OpenTelemetry, if an exporter is configured"""
+    global _tracer, _provider
+    if OTEL_TRACES_EXPORTER == "none" or os.getenv("OTEL_SDK_DISABLED", "").lower() == "true":
+        return False
+    try:
+        # Imported only when tracing is on; the SDK adds noticeably to startup
+        from opentelemetry import trace
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+        if OTEL_TRACES_EXPORTER == "console":
+            exporter = ConsoleSpanExporter()
+        else:
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+            exporter = OTLPSpanExporter()
+    except ImportError as e:
+        logger.warning("OpenTelemetry tracing disabled: %s", e)
+        return False
+    _provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+    _provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(_provider)
+    _tracer = trace.get_tracer("app.stages")
+    FastAPIInstrumentor.instrument_app(app, tracer_provider=_provider, excluded_urls="metrics")
+    return True
+
+
+def shutdown_tracing():
+    """Flush spans that are still buffered"""
+    if _provider is not None:
+        _provider.shutdown()
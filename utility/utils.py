@@ -1,15 +1,20 @@
+import asyncio
+import functools
+import importlib
 import json
+import logging
 import numpy as np
 import pandas as pd
 import os
 from fastapi import HTTPException
-import google.generativeai as genai
 import re
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class NpEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, np.integer):
@@ -55,14 +60,35 @@ def validate_code(code: str) -> bool:
     except SyntaxError:
         return False
 
+# Base URL of a Gemini-compatible REST endpoint, e.g. the load-test fake in loadtest/fake_gemini.py
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
+# Imported in the background after startup instead of at module load
+WARMUP_MODULES = (
+    "google.generativeai",
+    "sklearn.feature_extraction.text",
+    "duckdb",
+    "pyarrow.feather",
+    "pyarrow.parquet",
+)
+
+@functools.lru_cache(maxsize=8)
+def gemini_model(api_key, model_name='gemini-2.0-flash'):
+    """Gemini model for the key, created once; the SDK is only imported on first use"""
+    # Importing google.generativeai takes about a second, so it is not done at module load
+    import google.generativeai as genai
+    if GEMINI_API_ENDPOINT:
+        genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+    else:
+        genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name)
+
 def get_genai_client():
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         raise HTTPException(status_code=500, detail="GEMINI_API_KEY environment variable not set")
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        return model
+        return gemini_model(api_key, 'gemini-2.0-flash')
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to initialize Gemini client: {str(e)}")
 
@@ -71,8 +97,23 @@ def get_genai_client_thinkingmodel():
     if not api_key:
         raise HTTPException(status_code=500, detail="GEMINI_API_KEY environment variable not set")
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        return model
+        return gemini_model(api_key, 'gemini-2.0-flash')
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to initialize Gemini client: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to initialize Gemini client: {str(e)}")
+
+def warm_up():
+    """Import the heavy SDKs and create the Gemini client so the first request does not pay for it"""
+    for module in WARMUP_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+    if os.getenv("GEMINI_API_KEY"):
+        try:
+            gemini_model(os.getenv("GEMINI_API_KEY"), 'gemini-2.0-flash')
+        except Exception as e:
+            logger.warning("Gemini client warm-up failed: %s", e)
+
+async def generate_content_async(model, prompt, **kwargs):
+    """Run a blocking Gemini generate_content call without stalling the event loop"""
+    return await asyncio.to_thread(model.generate_content, prompt, **kwargs)